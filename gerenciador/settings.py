@@ -48,6 +48,7 @@ INSTALLED_APPS = [
     'steam',
 ]
 MIDDLEWARE = [
+    'usuarios.metricas.MetricasMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -56,9 +57,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'usuarios.consultas.InspetorConsultasMiddleware',
+    'usuarios.middleware.LoggingMiddleware',
     'usuarios.middleware.AuthenticationMiddleware',
     'usuarios.middleware.RateLimitMiddleware',
-    'usuarios.middleware.LoggingMiddleware',
 ]
 
 # CORS settings para React
@@ -75,7 +77,8 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # orjson se instalado, senão o JSONRenderer padrão
+        'usuarios.renderers.JSONRapidoRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
@@ -163,6 +166,30 @@ PASSWORD_REQUIRE_LOWERCASE = os.getenv('PASSWORD_REQUIRE_LOWERCASE', 'True').low
 PASSWORD_REQUIRE_NUMBERS = os.getenv('PASSWORD_REQUIRE_NUMBERS', 'True').lower() == 'true'
 PASSWORD_REQUIRE_SPECIAL = os.getenv('PASSWORD_REQUIRE_SPECIAL', 'True').lower() == 'true'
 
+# Perfil de hash de senhas (pbkdf2, scrypt ou argon2; argon2 requer argon2-cffi)
+# Use `manage.py benchmark_hashers` para escolher os parâmetros nesta máquina.
+PASSWORD_HASHER_PERFIL = os.getenv('PASSWORD_HASHER_PERFIL', 'pbkdf2')
+PASSWORD_HASHER_PERFIS = {
+    'pbkdf2': 'usuarios.hashers.PBKDF2Ajustado',
+    'scrypt': 'usuarios.hashers.ScryptAjustado',
+    'argon2': 'usuarios.hashers.Argon2Ajustado',
+}
+# O hasher do perfil vem primeiro; os demais continuam reconhecendo hashes antigos
+PASSWORD_HASHERS = [PASSWORD_HASHER_PERFIS[PASSWORD_HASHER_PERFIL]] + [
+    caminho for perfil, caminho in PASSWORD_HASHER_PERFIS.items() if perfil != PASSWORD_HASHER_PERFIL
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+PBKDF2_ITERACOES = int(os.getenv('PBKDF2_ITERACOES', 1000000))
+SCRYPT_WORK_FACTOR = int(os.getenv('SCRYPT_WORK_FACTOR', 2 ** 14))
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 102400))  # KiB
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 8))
+
+# Executor de hash de senhas (thread ou process)
+HASH_EXECUTOR_TIPO = os.getenv('HASH_EXECUTOR_TIPO', 'thread')
+HASH_EXECUTOR_TRABALHADORES = int(os.getenv('HASH_EXECUTOR_TRABALHADORES', os.cpu_count() or 2))
+HASH_EXECUTOR_MAX_PENDENTES = int(os.getenv('HASH_EXECUTOR_MAX_PENDENTES', 64))
+HASH_EXECUTOR_ESPERA = float(os.getenv('HASH_EXECUTOR_ESPERA', 5))  # segundos aguardando vaga
+
 # Configurações de sessão
 SESSION_COOKIE_AGE = int(os.getenv('SESSION_COOKIE_AGE', 3600))  # 1 hora
 SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', 'False').lower() == 'true'
@@ -196,6 +223,20 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        # Log de acesso da API: JSON em lotes gravados em segundo plano
+        'api_lote': {
+            'level': 'INFO',
+            'class': 'usuarios.logs.LoteJSONHandler',
+            'tamanho_lote': int(os.getenv('API_LOG_LOTE_TAMANHO', 100)),
+            'intervalo': float(os.getenv('API_LOG_LOTE_INTERVALO', 1.0)),
+        },
+    },
+    'loggers': {
+        'api_access': {
+            'handlers': ['api_lote'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
     'root': {
         'handlers': ['console'],
@@ -203,6 +244,20 @@ LOGGING = {
     },
 }
 
+# Inspetor de consultas (off, log ou raise); use log/raise só em desenvolvimento e testes
+QUERY_INSPECTOR_MODE = os.getenv('QUERY_INSPECTOR_MODE', 'log' if DEBUG else 'off')
+QUERY_INSPECTOR_REPETICOES = int(os.getenv('QUERY_INSPECTOR_REPETICOES', 3))
+
+# Configurações de métricas (Prometheus)
+METRICAS_ATIVAS = os.getenv('METRICAS_ATIVAS', 'True').lower() == 'true'
+# Diretório compartilhado pelos workers; vazio = só o processo atual
+METRICAS_DIRETORIO = os.getenv('METRICAS_DIRETORIO', '')
+METRICAS_INTERVALO_GRAVACAO = float(os.getenv('METRICAS_INTERVALO_GRAVACAO', 5))
+METRICAS_IPS_PERMITIDOS = os.getenv('METRICAS_IPS_PERMITIDOS', '127.0.0.1,::1').split(',')
+
+# Fração das respostas 2xx da API registradas no log de acesso (0 a 1)
+API_LOG_AMOSTRAGEM_2XX = float(os.getenv('API_LOG_AMOSTRAGEM_2XX', 1.0))
+
 # Configurações de cache
 CACHES = {
     'default': {
@@ -214,6 +269,37 @@ CACHES = {
 # Configurações de API
 API_RATE_LIMIT = int(os.getenv('API_RATE_LIMIT', 100))
 API_RATE_LIMIT_PERIOD = int(os.getenv('API_RATE_LIMIT_PERIOD', 3600))
+# Paginação por cursor (?limit=&cursor=) das listagens
+API_PAGINA_PADRAO = int(os.getenv('API_PAGINA_PADRAO', 50))
+API_PAGINA_MAXIMA = int(os.getenv('API_PAGINA_MAXIMA', 200))
+# Linhas lidas do banco e escritas por vez nas listagens com ?stream=1
+API_STREAM_LOTE = int(os.getenv('API_STREAM_LOTE', 500))
+# Máximo de contas por requisição em /api/streaming/lote/
+API_LOTE_MAXIMO = int(os.getenv('API_LOTE_MAXIMO', 500))
+
+# Cache do usuário logado entre requisições (segundos; 0 desativa)
+USUARIO_CACHE_TTL = int(os.getenv('USUARIO_CACHE_TTL', 0))
+
+# Cache da listagem de contas de streaming por usuário (segundos; 0 desativa).
+# As chaves usam a versão gravada no banco, então um cache local por processo também serve
+STREAMING_CACHE_TTL = int(os.getenv('STREAMING_CACHE_TTL', 300))
+
+# Configurações de importação de CSV
+# Em um thread após a resposta (True) ou dentro da própria requisição (False)
+IMPORTACAO_ASSINCRONA = os.getenv('IMPORTACAO_ASSINCRONA', 'True').lower() == 'true'
+# Linhas por lote (cada lote é um bulk_create em uma transação)
+IMPORTACAO_LOTE = int(os.getenv('IMPORTACAO_LOTE', 500))
+# Erros por linha guardados na importação (os demais só entram na contagem)
+IMPORTACAO_MAX_ERROS = int(os.getenv('IMPORTACAO_MAX_ERROS', 1000))
+# Diretório dos CSVs enviados, que têm senhas em claro: fora de MEDIA_ROOT, que é servido
+IMPORTACAO_DIRETORIO = os.getenv('IMPORTACAO_DIRETORIO', str(BASE_DIR / 'importacoes_privadas'))
+# Sem progresso por este tempo (segundos), a importação é dada como interrompida (recuperar_importacoes)
+IMPORTACAO_TEMPO_LIMITE = int(os.getenv('IMPORTACAO_TEMPO_LIMITE', 3600))
+
+# Configurações de hierarquia de usuários
+# 'fechamento' usa a tabela HierarquiaUsuario; 'cte' usa WITH RECURSIVE sem tabela extra.
+# Ao voltar de 'cte' para 'fechamento', rode `manage.py reconstruir_hierarquia`.
+HIERARQUIA_BACKEND = os.getenv('HIERARQUIA_BACKEND', 'fechamento')
 
 # Configurações de backup
 BACKUP_ENABLED = os.getenv('BACKUP_ENABLED', 'False').lower() == 'true'
@@ -2,42 +2,140 @@ from rest_framework import status
 from rest_framework.decorators import api_view, parser_classes
 from rest_framework.response import Response
 from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
-from functools import wraps
-from .models import ContaStreaming, CompartilhamentoStreaming, HistoricoAcesso
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import condition
+from .models import ContaStreaming, CompartilhamentoStreaming, HistoricoAcesso, ImportacaoStreaming
 from usuarios.models import Usuario
+from usuarios.autenticacao import require_login
+from usuarios.campos import CamposInvalidos
+from usuarios.fluxo import FORMATOS_EXPORTACAO, FluxoInvalido, pedido_em_fluxo, resposta_em_fluxo, resposta_exportacao
+from usuarios.consultas import orcamento_consultas
+from usuarios.paginacao import CursorInvalido, campos_anulaveis, expressoes_ordenacao, ler_limite, paginar_por_cursor
+from .busca import buscar
+from .resumo import resumo_de
+from .lote import (
+    DuplicadoConcorrente, atualizar_em_lote, criar_em_lote, desativar_em_lote, validar_alteracoes,
+)
+from . import cache_listagem
+from .serializacao import CAMPOS_CONTA, CAMPOS_CONTA_ATUALIZADA, CAMPOS_EXPORTACAO, CAMPOS_IMPORTACAO
+from .importacao import MapaInvalido, agendar, ler_mapa
+from usuarios.hashing import FilaHashCheia
+import hashlib
 import json
 
 
-# Decorator para verificar se usuário está logado
-def require_login(view_func):
-    @wraps(view_func)
-    def wrapper(request, *args, **kwargs):
-        usuario_id = request.session.get('usuario_logado_id')
-        if not usuario_id:
-            return JsonResponse({
-                'error': 'Usuário não autenticado',
-                'message': 'Faça login para acessar este recurso'
-            }, status=401)
-        
+# Ordenações aceitas em ?ordenar=; o id desempata para a paginação por cursor
+ORDENACOES = {
+    '-data_criacao': ('-data_criacao', '-id'),
+    'data_criacao': ('data_criacao', 'id'),
+    '-ultimo_acesso': ('-ultimo_acesso', '-id'),
+    'ultimo_acesso': ('ultimo_acesso', 'id'),
+    '-data_expiracao': ('-data_expiracao', '-id'),
+    'data_expiracao': ('data_expiracao', 'id'),
+    'nome': ('nome', 'id'),
+    '-nome': ('-nome', '-id'),
+}
+ESCOPOS = ['todos', 'proprios', 'compartilhados']
+
+
+def _filtros_listagem(request):
+    """
+    Lê os filtros e a ordenação da query string.
+    Retorna (filtros, ordenacao) ou levanta ValueError com a mensagem de erro.
+    """
+    plataforma = request.GET.get('plataforma') or None
+    if plataforma and plataforma not in dict(ContaStreaming.PLATAFORMAS_CHOICES):
+        raise ValueError('Plataforma inválida')
+    
+    status_conta = request.GET.get('status') or None
+    if status_conta and status_conta not in dict(ContaStreaming.STATUS_CHOICES):
+        raise ValueError('Status inválido')
+    
+    expira_antes = None
+    if request.GET.get('expira_antes'):
         try:
-            usuario = Usuario.objects.get(id=usuario_id, ativo=True)
-            request.usuario_logado = usuario
-        except Usuario.DoesNotExist:
-            request.session.flush()
-            return JsonResponse({
-                'error': 'Sessão inválida',
-                'message': 'Usuário não encontrado ou inativo'
-            }, status=401)
-        
-        return view_func(request, *args, **kwargs)
-    return wrapper
+            expira_antes = parse_date(request.GET['expira_antes'])
+        except ValueError:
+            expira_antes = None
+        if expira_antes is None:
+            raise ValueError('expira_antes deve estar no formato AAAA-MM-DD')
+    
+    escopo = request.GET.get('escopo', 'todos')
+    if escopo not in ESCOPOS:
+        raise ValueError(f'escopo deve ser um de: {", ".join(ESCOPOS)}')
+    
+    ordenar = request.GET.get('ordenar', '-data_criacao')
+    if ordenar not in ORDENACOES:
+        raise ValueError(f'ordenar deve ser um de: {", ".join(ORDENACOES)}')
+    
+    filtros = {
+        'plataforma': plataforma,
+        'status': status_conta,
+        'expira_antes': expira_antes,
+        'escopo': escopo,
+    }
+    return filtros, ORDENACOES[ordenar]
+
+
+def _versao_contas(request, pk=None):
+    """
+    (versão, data) da listagem do usuário no banco (ver cache_listagem),
+    trocada a cada alteração que ele veria: contas, compartilhamentos e
+    nome ou email dos proprietários. Lida uma vez por requisição. None
+    quando não se aplica: filtros inválidos, conta não visível ou escrita
+    sem If-Match/If-Unmodified-Since.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        # Na conta, If-Match permite atualização condicional (412 se mudou)
+        precondicao = 'HTTP_IF_MATCH' in request.META or 'HTTP_IF_UNMODIFIED_SINCE' in request.META
+        if pk is None or not precondicao:
+            return None
+    if not hasattr(request, '_versao_contas'):
+        usuario_logado = request.usuario_logado
+        versao = None
+        if pk is not None:
+            if ContaStreaming.objects.visiveis_para(usuario_logado).filter(pk=pk).exists():
+                versao = cache_listagem.versao_listagem(usuario_logado.id)
+        else:
+            try:
+                _filtros_listagem(request)
+                CAMPOS_CONTA.selecionar(request)
+                pedido_em_fluxo(request)
+                versao = cache_listagem.versao_listagem(usuario_logado.id)
+            except ValueError:
+                pass
+        request._versao_contas = versao
+    return request._versao_contas
 
 
+def _etag_contas(request, pk=None):
+    """ETag forte: a mesma versão com a mesma query string gera o mesmo corpo"""
+    versao = _versao_contas(request, pk)
+    if versao is None:
+        return None
+    chave = json.dumps([
+        request.usuario_logado.id,
+        versao[0],
+        pk,
+        request.GET.urlencode() if pk is None else '',
+    ])
+    return hashlib.sha256(chave.encode()).hexdigest()[:32]
+
+
+def _ultima_modificacao_contas(request, pk=None):
+    versao = _versao_contas(request, pk)
+    return versao[1] if versao is not None else None
+
+
+@orcamento_consultas(4, POST=8)
 @api_view(['GET', 'POST'])
 @parser_classes([JSONParser, MultiPartParser, FormParser])
 @require_login
+@condition(etag_func=_etag_contas, last_modified_func=_ultima_modificacao_contas)
 def streaming_list_create(request):
     """
     Lista todas as contas de streaming ou cria uma nova
@@ -45,54 +143,44 @@ def streaming_list_create(request):
     usuario_logado = request.usuario_logado
     
     if request.method == 'GET':
-        # Buscar contas do usuário e compartilhadas com ele
-        contas_proprias = ContaStreaming.objects.filter(
-            proprietario=usuario_logado, 
-            ativo=True
-        )
+        try:
+            filtros, ordenacao = _filtros_listagem(request)
+        except ValueError as e:
+            return Response({'erro': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            campos = CAMPOS_CONTA.selecionar(request)
+            em_fluxo = pedido_em_fluxo(request)
+        except (CamposInvalidos, FluxoInvalido) as e:
+            return Response({'erro': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        contas_compartilhadas = ContaStreaming.objects.filter(
-            compartilhado_com=usuario_logado,
-            ativo=True
+        # Respostas em fluxo não passam pelo cache
+        versao, _ = _versao_contas(request)
+        chave = None if em_fluxo else cache_listagem.chave_listagem(usuario_logado.id, versao, request)
+        corpo = cache_listagem.obter(chave)
+        if corpo is not None:
+            return Response(corpo)
+        
+        # Contas próprias e compartilhadas, com o nível de acesso, em uma consulta
+        contas = (
+            ContaStreaming.objects.listagem(usuario_logado, **filtros)
+            .order_by(*expressoes_ordenacao(ordenacao, anulaveis=campos_anulaveis(ContaStreaming, ordenacao)))
         )
+        contas = CAMPOS_CONTA.valores(contas, campos, extras=[campo.lstrip('-') for campo in ordenacao])
         
-        # Combinar as duas querysets
-        todas_contas = list(contas_proprias) + list(contas_compartilhadas)
+        if em_fluxo:
+            return resposta_em_fluxo(contas, lambda linha: CAMPOS_CONTA.serializar(linha, campos, usuario_logado))
         
-        data = []
-        for conta in todas_contas:
-            # Verificar se é proprietário ou compartilhado
-            is_proprietario = conta.proprietario == usuario_logado
-            
-            data.append({
-                'id': conta.id,
-                'nome': conta.nome,
-                'plataforma': conta.plataforma,
-                'plataforma_display': conta.get_plataforma_display(),
-                'email': conta.email,
-                'usuario': conta.usuario,
-                'foto': conta.foto.url if conta.foto else None,
-                'descricao': conta.descricao,
-                'status': conta.status,
-                'status_display': conta.get_status_display(),
-                'data_criacao': conta.data_criacao,
-                'data_expiracao': conta.data_expiracao,
-                'ultimo_acesso': conta.ultimo_acesso,
-                'proprietario': {
-                    'id': conta.proprietario.id,
-                    'nome': conta.proprietario.nome,
-                    'email': conta.proprietario.email,
-                },
-                'is_proprietario': is_proprietario,
-                'pode_editar': is_proprietario or conta.compartilhado_com.filter(
-                    id=usuario_logado.id
-                ).first().nivel_acesso in ['acesso', 'admin'] if not is_proprietario else True,
-                'pode_deletar': is_proprietario or conta.compartilhado_com.filter(
-                    id=usuario_logado.id
-                ).first().nivel_acesso == 'admin' if not is_proprietario else True,
-            })
+        try:
+            pagina = paginar_por_cursor(request, contas, ordenacao)
+        except CursorInvalido as e:
+            return Response({'erro': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response(data)
+        data = [CAMPOS_CONTA.serializar(linha, campos, usuario_logado) for linha in (pagina.itens if pagina else contas)]
+        corpo = pagina.envelope(data) if pagina else data
+        
+        cache_listagem.guardar(chave, corpo)
+        return Response(corpo)
     
     elif request.method == 'POST':
         # Pega os dados do request
@@ -103,7 +191,7 @@ def streaming_list_create(request):
         senha = request.data.get('senha')
         foto = request.FILES.get('foto')
         descricao = request.data.get('descricao', '')
-        status = request.data.get('status', 'ativo')
+        status_conta = request.data.get('status', 'ativo')
         data_expiracao = request.data.get('data_expiracao')
         
         # Validação básica
@@ -132,36 +220,21 @@ def streaming_list_create(request):
                 senha=senha,  # O modelo já faz o hash
                 foto=foto,
                 descricao=descricao,
-                status=status,
+                status=status_conta,
                 data_expiracao=data_expiracao,
                 proprietario=usuario_logado
             )
             conta.save()
             
-            return Response({
-                'id': conta.id,
-                'nome': conta.nome,
-                'plataforma': conta.plataforma,
-                'plataforma_display': conta.get_plataforma_display(),
-                'email': conta.email,
-                'usuario': conta.usuario,
-                'foto': conta.foto.url if conta.foto else None,
-                'descricao': conta.descricao,
-                'status': conta.status,
-                'status_display': conta.get_status_display(),
-                'data_criacao': conta.data_criacao,
-                'data_expiracao': conta.data_expiracao,
-                'proprietario': {
-                    'id': conta.proprietario.id,
-                    'nome': conta.proprietario.nome,
-                    'email': conta.proprietario.email,
-                },
-                'is_proprietario': True,
-                'pode_editar': True,
-                'pode_deletar': True,
-                'mensagem': 'Conta de streaming criada com sucesso'
-            }, status=status.HTTP_201_CREATED)
+            dados = CAMPOS_CONTA.de_objeto(conta, usuario_logado=usuario_logado)
+            dados['mensagem'] = 'Conta de streaming criada com sucesso'
+            return Response(dados, status=status.HTTP_201_CREATED)
             
+        except FilaHashCheia:
+            return Response({
+                'erro': 'Servidor ocupado',
+                'mensagem': 'Muitas operações de senha em andamento, tente novamente em instantes'
+            }, status=503, headers={'Retry-After': '1'})
         except Exception as e:
             return Response({
                 'erro': 'Erro ao criar conta de streaming',
@@ -169,63 +242,213 @@ def streaming_list_create(request):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _ids_lote(dados):
+    """Ids de {"ids": [...]} sem repetição, na ordem; levanta ValueError"""
+    ids = dados.get('ids') if isinstance(dados, dict) else None
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise ValueError('Envie ids como um array de inteiros')
+    if len(ids) > settings.API_LOTE_MAXIMO:
+        raise ValueError(f'O lote aceita no máximo {settings.API_LOTE_MAXIMO} contas')
+    return list(dict.fromkeys(ids))
+
+
+def _resposta_alteracao_lote(alteradas, negadas, chave):
+    if not alteradas:
+        codigo = status.HTTP_403_FORBIDDEN
+    elif negadas:
+        codigo = status.HTTP_207_MULTI_STATUS
+    else:
+        codigo = status.HTTP_200_OK
+    return Response({chave: alteradas, 'negadas': negadas}, status=codigo)
+
+
+@orcamento_consultas(7, PATCH=8, DELETE=7)
+@api_view(['POST', 'PATCH', 'DELETE'])
+@parser_classes([JSONParser])
+@require_login
+def streaming_lote(request):
+    """
+    Operações em lote:
+    POST: cria contas a partir de um array; responde 201 se todas foram
+    criadas, 207 se só parte e 400 se nenhuma, com o resultado de cada item.
+    PATCH: {"ids": [...], "alteracoes": {"status": ..., "data_expiracao": ...}}
+    DELETE: {"ids": [...]} (soft delete)
+    PATCH e DELETE informam os ids negados (sem permissão ou inexistentes).
+    """
+    usuario_logado = request.usuario_logado
+    
+    if request.method in ('PATCH', 'DELETE'):
+        try:
+            ids = _ids_lote(request.data)
+        except ValueError as e:
+            return Response({'erro': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if request.method == 'DELETE':
+            desativadas, negadas = desativar_em_lote(usuario_logado, ids)
+            return _resposta_alteracao_lote(desativadas, negadas, 'desativadas')
+        
+        campos, erros = validar_alteracoes(request.data.get('alteracoes'))
+        if erros:
+            return Response({'erro': 'Alterações inválidas', 'detalhes': erros}, status=status.HTTP_400_BAD_REQUEST)
+        atualizadas, negadas = atualizar_em_lote(usuario_logado, ids, campos)
+        return _resposta_alteracao_lote(atualizadas, negadas, 'atualizadas')
+    
+    itens = request.data
+    
+    if not isinstance(itens, list) or not itens:
+        return Response({
+            'erro': 'Envie um array de contas'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(itens) > settings.API_LOTE_MAXIMO:
+        return Response({
+            'erro': f'O lote aceita no máximo {settings.API_LOTE_MAXIMO} contas'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        resultados, contas = criar_em_lote(usuario_logado, itens)
+    except FilaHashCheia:
+        return Response({
+            'erro': 'Servidor ocupado',
+            'mensagem': 'Muitas operações de senha em andamento, tente novamente em instantes'
+        }, status=503, headers={'Retry-After': '1'})
+    except DuplicadoConcorrente as e:
+        return Response({'erro': str(e)}, status=status.HTTP_409_CONFLICT)
+    
+    for resultado in resultados:
+        if 'conta' in resultado:
+            resultado['conta'] = CAMPOS_CONTA.de_objeto(resultado['conta'], usuario_logado=usuario_logado)
+    
+    if len(contas) == len(itens):
+        codigo = status.HTTP_201_CREATED
+    elif contas:
+        codigo = status.HTTP_207_MULTI_STATUS
+    else:
+        codigo = status.HTTP_400_BAD_REQUEST
+    return Response({
+        'criadas': len(contas),
+        'falhas': len(itens) - len(contas),
+        'resultados': resultados,
+    }, status=codigo)
+
+
+@orcamento_consultas(3)
+@api_view(['GET'])
+@require_login
+def streaming_exportar(request):
+    """
+    Exporta as contas próprias e compartilhadas, sem senhas, em fluxo.
+    ?formato=ndjson (padrão) ou csv; ?gzip=1 compacta; aceita os mesmos
+    filtros, ordenação e ?fields= da listagem, mais o campo nivel_acesso.
+    Proprietário e nível de acesso vêm na mesma consulta; as linhas são
+    lidas em lotes com .iterator(), com memória constante.
+    """
+    usuario_logado = request.usuario_logado
+    
+    formato = request.GET.get('formato', 'ndjson')
+    if formato not in FORMATOS_EXPORTACAO:
+        return Response({
+            'erro': f'formato deve ser um de: {", ".join(FORMATOS_EXPORTACAO)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        filtros, ordenacao = _filtros_listagem(request)
+        campos = CAMPOS_EXPORTACAO.selecionar(request)
+    except ValueError as e:
+        return Response({'erro': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    contas = (
+        ContaStreaming.objects.listagem(usuario_logado, **filtros)
+        .order_by(*expressoes_ordenacao(ordenacao, anulaveis=campos_anulaveis(ContaStreaming, ordenacao)))
+    )
+    contas = CAMPOS_EXPORTACAO.valores(contas, campos, extras=[campo.lstrip('-') for campo in ordenacao])
+    return resposta_exportacao(
+        contas,
+        lambda linha: CAMPOS_EXPORTACAO.serializar(linha, campos, usuario_logado),
+        formato,
+        nome=f'contas-{timezone.localdate():%Y%m%d}',
+        compactar=request.GET.get('gzip') in ('1', 'true'),
+    )
+
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FormParser])
+@require_login
+def streaming_importacao_create(request):
+    """
+    Inicia a importação de um CSV (multipart: arquivo e mapa).
+    mapa é o nome de um mapa predefinido (padrao, bitwarden, lastpass,
+    chrome) ou JSON {"colunas": {campo: coluna}, "plataformas": {valor: chave}}.
+    Responde 202 com a importação; acompanhe em Location.
+    """
+    arquivo = request.FILES.get('arquivo')
+    if not arquivo:
+        return Response({
+            'erro': 'Envie o CSV no campo arquivo'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        mapa = ler_mapa(request.data.get('mapa'))
+    except MapaInvalido as e:
+        return Response({'erro': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Uploads grandes já chegam em arquivo temporário; save() copia aos pedaços
+    importacao = ImportacaoStreaming.objects.create(
+        usuario=request.usuario_logado,
+        arquivo=arquivo,
+        nome_arquivo=arquivo.name[:255],
+        tamanho_arquivo=arquivo.size,
+        mapa=mapa,
+    )
+    agendar(importacao)
+    
+    url = reverse('steam:streaming_importacao_detail', args=[importacao.id])
+    return Response(
+        CAMPOS_IMPORTACAO.de_objeto(importacao),
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': url},
+    )
+
+
+@orcamento_consultas(3)
+@api_view(['GET'])
+@require_login
+def streaming_importacao_detail(request, pk):
+    """Situação de uma importação: progresso, contagens e erros por linha"""
+    linha = get_object_or_404(
+        CAMPOS_IMPORTACAO.valores(ImportacaoStreaming.objects.filter(usuario=request.usuario_logado), CAMPOS_IMPORTACAO.todos),
+        pk=pk,
+    )
+    return Response(CAMPOS_IMPORTACAO.serializar(linha))
+
+
+@orcamento_consultas(5, PUT=8, DELETE=8)
 @api_view(['GET', 'PUT', 'DELETE'])
 @parser_classes([JSONParser, MultiPartParser, FormParser])
 @require_login
+@condition(etag_func=_etag_contas, last_modified_func=_ultima_modificacao_contas)
 def streaming_detail(request, pk):
     """
     Retorna, atualiza ou deleta uma conta de streaming específica
     """
     usuario_logado = request.usuario_logado
     
-    try:
-        conta = get_object_or_404(ContaStreaming, pk=pk, ativo=True)
-    except ContaStreaming.DoesNotExist:
-        return Response({
-            'erro': 'Conta de streaming não encontrada'
-        }, status=status.HTTP_404_NOT_FOUND)
-    
-    # Verificar se o usuário pode acessar esta conta
-    if not conta.pode_ser_acessada_por(usuario_logado):
+    conta = ContaStreaming.objects.visiveis_para(usuario_logado).filter(pk=pk).first()
+    if conta is None:
+        # Diferenciar conta inexistente de conta sem permissão
+        get_object_or_404(ContaStreaming, pk=pk, ativo=True)
         return Response({
             'erro': 'Você não tem permissão para acessar esta conta'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    is_proprietario = conta.proprietario == usuario_logado
-    compartilhamento = None
-    if not is_proprietario:
-        compartilhamento = conta.compartilhado_com.filter(id=usuario_logado.id).first()
+    is_proprietario, pode_editar, pode_deletar = conta.permissoes_para(usuario_logado)
     
     if request.method == 'GET':
-        data = {
-            'id': conta.id,
-            'nome': conta.nome,
-            'plataforma': conta.plataforma,
-            'plataforma_display': conta.get_plataforma_display(),
-            'email': conta.email,
-            'usuario': conta.usuario,
-            'senha': conta.get_senha_plana(),  # Senha descriptografada
-            'foto': conta.foto.url if conta.foto else None,
-            'descricao': conta.descricao,
-            'status': conta.status,
-            'status_display': conta.get_status_display(),
-            'data_criacao': conta.data_criacao,
-            'data_expiracao': conta.data_expiracao,
-            'ultimo_acesso': conta.ultimo_acesso,
-            'proprietario': {
-                'id': conta.proprietario.id,
-                'nome': conta.proprietario.nome,
-                'email': conta.proprietario.email,
-            },
-            'is_proprietario': is_proprietario,
-            'pode_editar': is_proprietario or (compartilhamento and compartilhamento.pode_editar()),
-            'pode_deletar': is_proprietario or (compartilhamento and compartilhamento.pode_deletar()),
-        }
+        data = CAMPOS_CONTA.de_objeto(conta, usuario_logado=usuario_logado)
+        data['senha'] = conta.get_senha_plana()
         return Response(data)
     
     elif request.method == 'PUT':
         # Verificar permissões de edição
-        if not is_proprietario and not (compartilhamento and compartilhamento.pode_editar()):
+        if not pode_editar:
             return Response({
                 'erro': 'Você não tem permissão para editar esta conta'
             }, status=status.HTTP_403_FORBIDDEN)
@@ -254,24 +477,13 @@ def streaming_detail(request, pk):
         
         conta.save()
         
-        return Response({
-            'id': conta.id,
-            'nome': conta.nome,
-            'plataforma': conta.plataforma,
-            'plataforma_display': conta.get_plataforma_display(),
-            'email': conta.email,
-            'usuario': conta.usuario,
-            'foto': conta.foto.url if conta.foto else None,
-            'descricao': conta.descricao,
-            'status': conta.status,
-            'status_display': conta.get_status_display(),
-            'data_expiracao': conta.data_expiracao,
-            'mensagem': 'Conta de streaming atualizada com sucesso'
-        })
+        dados = CAMPOS_CONTA.de_objeto(conta, CAMPOS_CONTA_ATUALIZADA)
+        dados['mensagem'] = 'Conta de streaming atualizada com sucesso'
+        return Response(dados)
     
     elif request.method == 'DELETE':
         # Verificar permissões de exclusão
-        if not is_proprietario and not (compartilhamento and compartilhamento.pode_deletar()):
+        if not pode_deletar:
             return Response({
                 'erro': 'Você não tem permissão para deletar esta conta'
             }, status=status.HTTP_403_FORBIDDEN)
@@ -285,6 +497,7 @@ def streaming_detail(request, pk):
         }, status=status.HTTP_204_NO_CONTENT)
 
 
+@orcamento_consultas(11)
 @api_view(['POST'])
 @parser_classes([JSONParser])
 @require_login
@@ -364,6 +577,7 @@ def streaming_compartilhar(request, pk):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@orcamento_consultas(12)
 @api_view(['DELETE'])
 @require_login
 def streaming_descompartilhar(request, pk, usuario_id):
@@ -406,6 +620,59 @@ def streaming_descompartilhar(request, pk, usuario_id):
     }, status=status.HTTP_204_NO_CONTENT)
 
 
+@orcamento_consultas(3)
+@api_view(['GET'])
+@require_login
+def streaming_resumo(request):
+    """
+    Resumo do cofre do usuário: contas ativas por plataforma e status,
+    expiradas e expirando em 7 e 30 dias, compartilhamentos recebidos e
+    feitos. Lido da tabela materializada, sem agregar as contas.
+    """
+    return Response(resumo_de(request.usuario_logado))
+
+
+@orcamento_consultas(3)
+@api_view(['GET'])
+@require_login
+def streaming_busca(request):
+    """
+    Busca textual nas contas visíveis ao usuário, ordenada por relevância.
+    Paginação por ?limit= e ?offset=; proximo/anterior trazem o offset vizinho.
+    """
+    usuario_logado = request.usuario_logado
+    
+    texto = request.GET.get('q', '').strip()
+    if not texto:
+        return Response({'erro': 'Informe o texto da busca em q'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        limite = ler_limite(request)
+        offset = int(request.GET.get('offset', 0))
+        if offset < 0:
+            raise ValueError
+    except CursorInvalido as e:
+        return Response({'erro': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except ValueError:
+        return Response({'erro': 'offset deve ser um inteiro não negativo'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    contas = buscar(ContaStreaming.objects.visiveis_para(usuario_logado), texto)
+    colunas = CAMPOS_CONTA.colunas(CAMPOS_CONTA.todos, extras=['relevancia'])
+    itens = list(contas.values(*colunas)[offset:offset + limite + 1])
+    
+    resultados = []
+    for linha in itens[:limite]:
+        dados = CAMPOS_CONTA.serializar(linha, usuario_logado=usuario_logado)
+        dados['relevancia'] = linha['relevancia']
+        resultados.append(dados)
+    
+    return Response({
+        'resultados': resultados,
+        'proximo': offset + limite if len(itens) > limite else None,
+        'anterior': max(0, offset - limite) if offset else None,
+    })
+
+
 @api_view(['GET'])
 @require_login
 def streaming_plataformas(request):
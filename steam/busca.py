@@ -0,0 +1,119 @@
+"""
+Busca textual nas contas de streaming
+
+Busca em nome, descrição, email e usuário:
+
+- SQLite: tabela virtual FTS5 (steam_contastreaming_fts) de conteúdo
+  externo, mantida por triggers criados na migração 0004; ordena por bm25.
+  Migrações que recriam a tabela no SQLite (AddField, AlterField) descartam
+  os triggers e precisam recriá-los (ver 0005); se alguma esquecer, o
+  post_migrate (garantir_triggers_sqlite) os recria ao fim do migrate.
+- PostgreSQL: índice GIN sobre to_tsvector da mesma concatenação de
+  colunas (EXPRESSAO_TSVECTOR); ordena por ts_rank.
+- Outros bancos: icontains, sem ranking.
+
+Cada termo da busca é tratado como prefixo e todos precisam aparecer.
+"""
+
+import importlib
+import logging
+import re
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+TABELA_FTS = 'steam_contastreaming_fts'
+CAMPOS = ('nome', 'descricao', 'email', 'usuario')
+TRIGGERS_FTS = tuple(f'{TABELA_FTS}_{sufixo}' for sufixo in ('ai', 'ad', 'au'))
+
+logger = logging.getLogger('busca')
+
+# Precisa ser idêntica à expressão do índice GIN da migração 0004
+EXPRESSAO_TSVECTOR = (
+    "to_tsvector('simple', "
+    + " || ' ' || ".join(f"coalesce({campo}, '')" for campo in CAMPOS)
+    + ")"
+)
+
+
+def garantir_triggers_sqlite(conexao):
+    """
+    Recria a busca textual do SQLite (tabela FTS5, triggers e índice) se
+    algum trigger tiver sumido. Não faz nada antes da migração 0004 ou em
+    outros bancos. Retorna os triggers que faltavam.
+    """
+    if conexao.vendor != 'sqlite':
+        return []
+    with conexao.cursor() as cursor:
+        cursor.execute(
+            f"SELECT name FROM sqlite_master WHERE name IN ({', '.join(['%s'] * (len(TRIGGERS_FTS) + 1))})",
+            [TABELA_FTS, *TRIGGERS_FTS],
+        )
+        existentes = {nome for nome, in cursor.fetchall()}
+    faltando = [trigger for trigger in TRIGGERS_FTS if trigger not in existentes]
+    if TABELA_FTS not in existentes or not faltando:
+        return []
+
+    logger.warning('Triggers da busca textual ausentes (%s); recriando e reindexando', ', '.join(faltando))
+    migracao = importlib.import_module('steam.migrations.0004_busca_textual')
+    with transaction.atomic(using=conexao.alias), conexao.cursor() as cursor:
+        for sql in migracao.SQLITE_REMOVER + migracao.SQLITE_CRIAR:
+            cursor.execute(sql)
+    return faltando
+
+
+def termos_busca(texto):
+    """Separa o texto em termos, sem pontuação"""
+    return re.findall(r'\w+', texto or '')
+
+
+def consulta_fts5(termos):
+    # Cada termo entre aspas (nada é interpretado como operador) e como prefixo
+    return ' '.join(f'"{termo}"*' for termo in termos)
+
+
+def consulta_tsquery(termos):
+    return ' & '.join(f'{termo}:*' for termo in termos)
+
+
+def buscar(contas, texto):
+    """
+    Filtra o queryset de contas pelo texto e anota relevancia
+    (menor = mais relevante). Retorna o queryset já ordenado.
+    """
+    termos = termos_busca(texto)
+    if not termos:
+        return contas.none()
+
+    tabela = contas.model._meta.db_table
+
+    if connection.vendor == 'sqlite':
+        consulta = consulta_fts5(termos)
+        encontrados = RawSQL(f'SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s', [consulta])
+        relevancia = RawSQL(
+            f'SELECT bm25({TABELA_FTS}) FROM {TABELA_FTS} '
+            f'WHERE {TABELA_FTS} MATCH %s AND rowid = "{tabela}"."id"',
+            [consulta],
+            output_field=FloatField(),
+        )
+        return contas.filter(id__in=encontrados).annotate(relevancia=relevancia).order_by('relevancia', '-id')
+
+    if connection.vendor == 'postgresql':
+        # Colunas qualificadas: o select_related do proprietário também tem nome e email
+        vetor = EXPRESSAO_TSVECTOR
+        for campo in CAMPOS:
+            vetor = vetor.replace(f'coalesce({campo},', f'coalesce("{tabela}"."{campo}",')
+        consulta = consulta_tsquery(termos)
+        return (
+            contas.filter(RawSQL(f"{vetor} @@ to_tsquery('simple', %s)", [consulta], output_field=BooleanField()))
+            .annotate(relevancia=RawSQL(
+                f"-ts_rank({vetor}, to_tsquery('simple', %s))", [consulta], output_field=FloatField()
+            ))
+            .order_by('relevancia', '-id')
+        )
+
+    filtro = Q()
+    for termo in termos:
+        filtro &= Q(nome__icontains=termo) | Q(descricao__icontains=termo) | Q(email__icontains=termo) | Q(usuario__icontains=termo)
+    return contas.filter(filtro).annotate(relevancia=Value(0.0, output_field=FloatField())).order_by('-data_criacao', '-id')
@@ -0,0 +1,76 @@
+"""
+Cache da listagem de contas de streaming por usuário
+
+Cada usuário tem uma versão (token aleatório) no banco, em VersaoListagem;
+a resposta de streaming_list_create fica no cache em uma chave com o
+usuário, a versão e a query string. Mudar uma conta ou um compartilhamento
+troca a versão de todos os usuários que a veem (signals.py), e as
+respostas antigas simplesmente deixam de ser lidas até expirarem.
+
+Como a versão é lida do banco, o cache pode ser local a cada processo
+(LocMemCache): uma alteração feita em um worker muda a chave em todos. A
+troca faz parte da transação da alteração; uma leitura que ainda viu a
+versão anterior guarda a resposta numa chave que ninguém mais lê. A mesma
+versão dá o ETag e o Last-Modified da API. Alterações em massa com
+QuerySet.update() não disparam sinais e precisam chamar invalidar_usuarios.
+"""
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from usuarios import metricas
+
+from .models import VersaoListagem
+
+
+def criar_versao(usuario_id):
+    """Versão no banco de um usuário novo"""
+    VersaoListagem.objects.create(usuario_id=usuario_id, versao=uuid.uuid4().hex, data_atualizacao=timezone.now())
+
+
+def versao_listagem(usuario_id):
+    """(versão, data da última alteração) da listagem do usuário, lidas do banco"""
+    linha = VersaoListagem.objects.filter(usuario_id=usuario_id).values_list('versao', 'data_atualizacao').first()
+    if linha is None:
+        versao, _ = VersaoListagem.objects.get_or_create(
+            usuario_id=usuario_id,
+            defaults={'versao': uuid.uuid4().hex, 'data_atualizacao': timezone.now()},
+        )
+        linha = (versao.versao, versao.data_atualizacao)
+    return linha
+
+
+def invalidar_usuarios(usuario_ids):
+    """Descarta a listagem em cache dos usuários dados"""
+    usuario_ids = {usuario_id for usuario_id in usuario_ids if usuario_id is not None}
+    if not usuario_ids:
+        return
+    VersaoListagem.objects.filter(usuario_id__in=usuario_ids).update(
+        versao=uuid.uuid4().hex, data_atualizacao=timezone.now()
+    )
+
+
+def chave_listagem(usuario_id, versao, request):
+    """Chave da resposta para o usuário, a versão e a query string; None se o cache está desativado"""
+    if not settings.STREAMING_CACHE_TTL:
+        return None
+    query = hashlib.sha256(request.GET.urlencode().encode()).hexdigest()[:16]
+    return f'contas_lista:{usuario_id}:{versao}:{query}'
+
+
+def obter(chave):
+    """Corpo da resposta em cache ou None; conta acertos e falhas"""
+    if chave is None:
+        return None
+    corpo = cache.get(chave)
+    metricas.incrementar('cache_listagem_contas_total', resultado='falha' if corpo is None else 'acerto')
+    return corpo
+
+
+def guardar(chave, corpo):
+    if chave is not None:
+        cache.set(chave, corpo, settings.STREAMING_CACHE_TTL)
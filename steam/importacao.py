@@ -0,0 +1,296 @@
+"""
+Importação de contas a partir de CSV exportado por outros gerenciadores
+
+O arquivo é lido linha a linha (csv.DictReader sobre um TextIOWrapper do
+arquivo binário), nunca inteiro em memória. Um mapa de colunas diz de
+qual coluna do CSV sai cada campo de ContaStreaming; o valor da
+plataforma (nome, chave ou URL) é convertido para PLATAFORMAS_CHOICES.
+As linhas são agrupadas em lotes de IMPORTACAO_LOTE e cada lote passa por
+lote.criar_em_lote (validação, duplicados e bulk_create em uma transação).
+Depois de cada lote o progresso e os erros por linha são gravados em
+ImportacaoStreaming, que o cliente consulta até a conclusão.
+
+O CSV tem senhas em claro: fica em IMPORTACAO_DIRETORIO (fora de
+MEDIA_ROOT) e é apagado ao final, dê certo ou não. Se o thread ou o
+processo morrer no meio, recuperar_interrompidas (comando
+recuperar_importacoes) marca a importação como falha e apaga o arquivo.
+"""
+
+import csv
+import io
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from usuarios.hashing import FilaHashCheia
+
+from .lote import DuplicadoConcorrente, criar_em_lote
+from .models import ContaStreaming, ImportacaoStreaming
+
+logger = logging.getLogger('importacao')
+
+# Campos de ContaStreaming que podem vir do CSV
+CAMPOS_IMPORTAVEIS = ('nome', 'plataforma', 'email', 'usuario', 'senha', 'descricao', 'status', 'data_expiracao')
+CAMPOS_OBRIGATORIOS = ('nome', 'email', 'senha')
+
+# Mapas dos formatos de exportação mais comuns ({campo: coluna do CSV})
+MAPAS_PREDEFINIDOS = {
+    'padrao': {campo: campo for campo in CAMPOS_IMPORTAVEIS},
+    'bitwarden': {
+        'nome': 'name', 'plataforma': 'login_uri', 'email': 'login_username',
+        'senha': 'login_password', 'descricao': 'notes',
+    },
+    'lastpass': {
+        'nome': 'name', 'plataforma': 'url', 'email': 'username',
+        'senha': 'password', 'descricao': 'extra',
+    },
+    'chrome': {
+        'nome': 'name', 'plataforma': 'url', 'email': 'username',
+        'senha': 'password', 'descricao': 'note',
+    },
+}
+
+# Valor do CSV (chave ou rótulo, em minúsculas) -> chave da plataforma
+_PLATAFORMAS = {
+    **{chave: chave for chave, _ in ContaStreaming.PLATAFORMAS_CHOICES},
+    **{str(rotulo).lower(): chave for chave, rotulo in ContaStreaming.PLATAFORMAS_CHOICES},
+}
+
+# Tentativas de um lote quando a fila de hash está cheia
+_TENTATIVAS_HASH = 5
+
+
+class MapaInvalido(ValueError):
+    """Mapa de colunas desconhecido ou mal formado"""
+
+
+class ArquivoInvalido(ValueError):
+    """CSV sem as colunas obrigatórias do mapa ou ilegível"""
+
+
+def ler_mapa(valor):
+    """
+    Normaliza o mapa enviado: nome de um mapa predefinido, JSON ou dict com
+    {"colunas": {campo: coluna}, "plataformas": {valor: chave}}.
+    Um dict sem "colunas" é tratado como o próprio mapa de colunas.
+    """
+    if not valor:
+        valor = 'padrao'
+    if isinstance(valor, str):
+        if valor in MAPAS_PREDEFINIDOS:
+            return {'colunas': dict(MAPAS_PREDEFINIDOS[valor]), 'plataformas': {}}
+        try:
+            valor = json.loads(valor)
+        except ValueError:
+            raise MapaInvalido(f'mapa deve ser JSON ou um de: {", ".join(MAPAS_PREDEFINIDOS)}')
+    if not isinstance(valor, dict):
+        raise MapaInvalido('mapa deve ser um objeto')
+
+    colunas = valor.get('colunas', valor)
+    plataformas = valor.get('plataformas', {}) if 'colunas' in valor else {}
+    if not isinstance(colunas, dict) or not isinstance(plataformas, dict):
+        raise MapaInvalido('colunas e plataformas devem ser objetos')
+
+    erros = [f'Campo desconhecido: {campo}' for campo in colunas if campo not in CAMPOS_IMPORTAVEIS]
+    erros += [f'Coluna do campo {campo} deve ser texto' for campo, col in colunas.items() if not isinstance(col, str) or not col]
+    erros += [f'Campo obrigatório sem coluna: {campo}' for campo in CAMPOS_OBRIGATORIOS if campo not in colunas]
+    erros += [f'Plataforma inválida: {chave}' for chave in plataformas.values() if chave not in _PLATAFORMAS.values()]
+    if erros:
+        raise MapaInvalido('; '.join(erros))
+    return {
+        'colunas': colunas,
+        'plataformas': {str(origem).strip().lower(): chave for origem, chave in plataformas.items()},
+    }
+
+
+def resolver_plataforma(valor, plataformas=None):
+    """
+    Chave de PLATAFORMAS_CHOICES para o valor do CSV: primeiro o mapa do
+    usuário, depois chave ou rótulo exatos, depois chave contida no valor
+    (ex.: https://www.netflix.com/login); senão 'outros'.
+    """
+    valor = (valor or '').strip().lower()
+    if not valor:
+        return 'outros'
+    if plataformas and valor in plataformas:
+        return plataformas[valor]
+    if valor in _PLATAFORMAS:
+        return _PLATAFORMAS[valor]
+    for chave, _ in ContaStreaming.PLATAFORMAS_CHOICES:
+        if chave in valor:
+            return chave
+    return 'outros'
+
+
+def _item(linha, colunas, plataformas):
+    """Linha do CSV -> item no formato de criar_em_lote"""
+    item = {}
+    for campo, coluna in colunas.items():
+        valor = (linha.get(coluna) or '').strip()
+        if valor:
+            item[campo] = valor
+    item['plataforma'] = resolver_plataforma(item.get('plataforma'), plataformas)
+    return item
+
+
+def _criar_lote(importacao, itens):
+    for tentativa in range(_TENTATIVAS_HASH):
+        try:
+            resultados, _ = criar_em_lote(importacao.usuario, itens)
+            return resultados
+        except FilaHashCheia:
+            if tentativa == _TENTATIVAS_HASH - 1:
+                raise
+            time.sleep(1)
+        except DuplicadoConcorrente as e:
+            return [{'indice': indice, 'status': 400, 'erros': [str(e)]} for indice in range(len(itens))]
+
+
+def _gravar_lote(importacao, linhas, itens, arquivo):
+    """Cria as contas do lote e grava o progresso"""
+    for numero, resultado in zip(linhas, _criar_lote(importacao, itens)):
+        if resultado['status'] == 201:
+            importacao.criadas += 1
+        else:
+            importacao.falhas += 1
+            if len(importacao.erros) < settings.IMPORTACAO_MAX_ERROS:
+                importacao.erros.append({'linha': numero, 'erros': resultado['erros']})
+    importacao.linhas_processadas += len(itens)
+    importacao.bytes_processados = min(arquivo.tell(), importacao.tamanho_arquivo or arquivo.tell())
+    importacao.save(update_fields=[
+        'criadas', 'falhas', 'erros', 'linhas_processadas', 'bytes_processados', 'data_atualizacao',
+    ])
+
+
+def processar(importacao, arquivo):
+    """
+    Importa o CSV do arquivo binário aberto em lotes de IMPORTACAO_LOTE.
+    Levanta ArquivoInvalido se faltar no cabeçalho alguma coluna do mapa.
+    """
+    mapa = importacao.mapa
+    colunas, plataformas = mapa['colunas'], mapa.get('plataformas', {})
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    try:
+        leitor = csv.DictReader(texto)
+        cabecalho = leitor.fieldnames or []
+        faltando = sorted({coluna for coluna in colunas.values() if coluna not in cabecalho})
+        if faltando:
+            raise ArquivoInvalido(f'Colunas ausentes no CSV: {", ".join(faltando)}')
+
+        tamanho_lote = settings.IMPORTACAO_LOTE
+        linhas, itens = [], []
+        try:
+            for linha in leitor:
+                linhas.append(leitor.line_num)
+                itens.append(_item(linha, colunas, plataformas))
+                if len(itens) >= tamanho_lote:
+                    _gravar_lote(importacao, linhas, itens, arquivo)
+                    linhas, itens = [], []
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ArquivoInvalido(f'CSV ilegível perto da linha {leitor.line_num}: {e}')
+        if itens:
+            _gravar_lote(importacao, linhas, itens, arquivo)
+    finally:
+        # Não fecha o arquivo, que pertence ao chamador
+        texto.detach()
+
+
+def executar_importacao(importacao, arquivo=None):
+    """
+    Processa a importação do início ao fim, registrando o status.
+    Sem arquivo, lê o CSV guardado na importação e o apaga ao final.
+    """
+    try:
+        importacao.status = 'processando'
+        importacao.save(update_fields=['status', 'data_atualizacao'])
+        try:
+            if arquivo is not None:
+                processar(importacao, arquivo)
+            else:
+                with importacao.arquivo.open('rb') as guardado:
+                    processar(importacao, guardado)
+        except ArquivoInvalido as e:
+            importacao.status, importacao.mensagem = 'falhou', str(e)
+        except Exception:
+            logger.exception('Falha na importação %s', importacao.id)
+            importacao.status, importacao.mensagem = 'falhou', 'Erro inesperado; as linhas já importadas foram mantidas'
+        else:
+            importacao.status = 'concluida'
+            importacao.bytes_processados = importacao.tamanho_arquivo
+    finally:
+        # Mesmo que a gravação do status falhe
+        if importacao.arquivo:
+            importacao.arquivo.delete(save=False)
+    importacao.data_conclusao = timezone.now()
+    importacao.save()
+    return importacao
+
+
+def recuperar_interrompidas(tempo_limite=None):
+    """
+    Marca como falhas as importações pendentes ou em processamento sem
+    progresso há mais de tempo_limite segundos (IMPORTACAO_TEMPO_LIMITE) e
+    apaga os CSVs delas, além de arquivos no diretório sem importação.
+    Devolve quantas importações foram marcadas.
+    """
+    if tempo_limite is None:
+        tempo_limite = settings.IMPORTACAO_TEMPO_LIMITE
+    agora = timezone.now()
+    limite = agora - timedelta(seconds=tempo_limite)
+    paradas = ImportacaoStreaming.objects.filter(
+        status__in=('pendente', 'processando'), data_atualizacao__lt=limite,
+    ).only('id', 'arquivo', 'data_atualizacao')
+
+    marcadas = 0
+    for importacao in paradas.iterator():
+        # Só se não houve progresso desde a leitura
+        if ImportacaoStreaming.objects.filter(
+            pk=importacao.pk, data_atualizacao=importacao.data_atualizacao,
+        ).update(
+            status='falhou', arquivo=None, data_conclusao=agora, data_atualizacao=agora,
+            mensagem='Importação interrompida; as linhas já importadas foram mantidas',
+        ):
+            marcadas += 1
+            if importacao.arquivo:
+                importacao.arquivo.delete(save=False)
+
+    # Arquivos gravados sem que a importação chegasse ao banco
+    armazenamento = ImportacaoStreaming._meta.get_field('arquivo').storage
+    try:
+        _, nomes = armazenamento.listdir('')
+    except FileNotFoundError:
+        nomes = []
+    em_uso = set(ImportacaoStreaming.objects.exclude(arquivo='').exclude(arquivo=None).values_list('arquivo', flat=True))
+    for nome in nomes:
+        if nome not in em_uso and armazenamento.get_modified_time(nome) < limite:
+            armazenamento.delete(nome)
+    return marcadas
+
+
+def _executar_em_thread(importacao_id):
+    try:
+        executar_importacao(ImportacaoStreaming.objects.select_related('usuario').get(pk=importacao_id))
+    finally:
+        connections.close_all()
+
+
+def agendar(importacao):
+    """
+    Inicia a importação depois do commit: em um thread (IMPORTACAO_ASSINCRONA)
+    ou na própria requisição
+    """
+    def iniciar():
+        if settings.IMPORTACAO_ASSINCRONA:
+            threading.Thread(
+                target=_executar_em_thread, args=(importacao.id,),
+                name=f'importacao-{importacao.id}', daemon=True,
+            ).start()
+        else:
+            executar_importacao(importacao)
+    transaction.on_commit(iniciar)
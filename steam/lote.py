@@ -0,0 +1,276 @@
+"""
+Operações em lote sobre contas de streaming
+
+Criação: todos os itens são validados de uma vez; os duplicados (mesmo email e
+plataforma do proprietário, a chave de unique_together) são procurados
+em uma única consulta, as senhas dos itens válidos são calculadas em
+paralelo no executor de hash e as contas entram com um bulk_create em
+uma transação. Cada item recebe o seu resultado, na ordem do envio.
+
+Alteração e desativação: as permissões de todo o conjunto de ids saem de
+uma consulta, que trava as contas (select_for_update) até o fim da
+transação, e as mudanças são aplicadas com um único QuerySet.update() só
+nos campos alterados (mais data_atualizacao).
+
+bulk_create e update() não disparam sinais: o resumo do cofre é
+atualizado aqui, na mesma transação, e o cache da listagem dos usuários
+afetados é invalidado depois do commit (os triggers da busca textual
+continuam valendo).
+"""
+
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from usuarios.consultas import consultas_em_lote
+from usuarios.hashing import gerar_hashes
+
+from . import resumo
+from .cache_listagem import invalidar_usuarios
+from .models import CompartilhamentoStreaming, ContaStreaming
+
+PLATAFORMAS = dict(ContaStreaming.PLATAFORMAS_CHOICES)
+STATUS = dict(ContaStreaming.STATUS_CHOICES)
+
+# Contas por INSERT (o Django reduz ao limite de parâmetros do banco)
+TAMANHO_INSERCAO = 200
+
+# Campos do item que, quando enviados, devem ser texto
+CAMPOS_TEXTO = ('nome', 'plataforma', 'email', 'usuario', 'senha', 'descricao', 'status', 'data_expiracao')
+
+# Campos que podem ser alterados em lote
+CAMPOS_ALTERAVEIS = ('status', 'data_expiracao')
+
+
+class DuplicadoConcorrente(Exception):
+    """Outra requisição criou uma das contas entre a verificação e o INSERT"""
+
+
+def _data(valor):
+    try:
+        return parse_date(str(valor))
+    except ValueError:
+        return None
+
+
+def validar_item(item):
+    """Retorna (dados para o modelo, lista de erros)"""
+    if not isinstance(item, dict):
+        return None, ['Cada item deve ser um objeto']
+
+    # Valores de outro tipo quebrariam as validações abaixo
+    erros = [
+        f'{campo} deve ser texto' for campo in CAMPOS_TEXTO
+        if item.get(campo) is not None and not isinstance(item[campo], str)
+    ]
+    if erros:
+        return None, erros
+
+    nome = item.get('nome')
+    email = item.get('email')
+    senha = item.get('senha')
+    if not nome or not email or not senha:
+        erros.append('Nome, email e senha são obrigatórios')
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError:
+            erros.append('Email inválido')
+
+    plataforma = item.get('plataforma', 'netflix')
+    if plataforma not in PLATAFORMAS:
+        erros.append('Plataforma inválida')
+    status_conta = item.get('status', 'ativo')
+    if status_conta not in STATUS:
+        erros.append('Status inválido')
+
+    data_expiracao = None
+    if item.get('data_expiracao'):
+        data_expiracao = _data(item['data_expiracao'])
+        if data_expiracao is None:
+            erros.append('data_expiracao deve estar no formato AAAA-MM-DD')
+
+    if erros:
+        return None, erros
+    dados = {
+        'nome': nome,
+        'plataforma': plataforma,
+        'email': email,
+        'usuario': item.get('usuario', ''),
+        'senha': senha,
+        'descricao': item.get('descricao', ''),
+        'status': status_conta,
+        'data_expiracao': data_expiracao,
+    }
+    # Tamanhos e demais regras dos campos do modelo (a senha vira hash)
+    try:
+        ContaStreaming(**dados).clean_fields(exclude=['senha', 'proprietario', 'foto'])
+    except ValidationError as e:
+        return None, [f'{campo}: {mensagem}' for campo, mensagens in e.message_dict.items() for mensagem in mensagens]
+    return dados, []
+
+
+def criar_em_lote(proprietario, itens):
+    """
+    Cria as contas válidas de itens para o proprietário.
+    Retorna (resultados, contas criadas); cada resultado tem indice e
+    status (201 ou 400) e conta ou erros.
+    """
+    resultados = [None] * len(itens)
+    validos = {}
+    for indice, item in enumerate(itens):
+        dados, erros = validar_item(item)
+        if erros:
+            resultados[indice] = {'indice': indice, 'status': 400, 'erros': erros}
+        else:
+            validos[indice] = dados
+
+    # Duplicados no próprio lote e no banco, em uma consulta
+    chaves = {(dados['email'], dados['plataforma']) for dados in validos.values()}
+    existentes = set()
+    if chaves:
+        existentes = set(
+            ContaStreaming.objects.filter(
+                proprietario=proprietario,
+                email__in={email for email, _ in chaves},
+                plataforma__in={plataforma for _, plataforma in chaves},
+            ).values_list('email', 'plataforma')
+        )
+    vistas = set()
+    for indice, dados in list(validos.items()):
+        chave = (dados['email'], dados['plataforma'])
+        if chave in existentes or chave in vistas:
+            resultados[indice] = {
+                'indice': indice,
+                'status': 400,
+                'erros': ['Já existe uma conta com este email nesta plataforma'],
+            }
+            del validos[indice]
+        vistas.add(chave)
+
+    if not validos:
+        return resultados, []
+
+    hashes = gerar_hashes([dados['senha'] for dados in validos.values()])
+    contas = [
+        ContaStreaming(**{**dados, 'senha': hash_senha}, proprietario=proprietario)
+        for dados, hash_senha in zip(validos.values(), hashes)
+    ]
+    try:
+        with transaction.atomic():
+            with consultas_em_lote():
+                ContaStreaming.objects.bulk_create(contas, batch_size=TAMANHO_INSERCAO)
+            resumo.aplicar(resumo.diferenca([], (
+                chave
+                for conta in contas
+                for chave in resumo.chaves_conta(*(getattr(conta, campo) for campo in resumo.CAMPOS_RESUMO))
+            )))
+            transaction.on_commit(lambda: invalidar_usuarios([proprietario.id]))
+    except IntegrityError:
+        raise DuplicadoConcorrente('Uma das contas foi criada por outra requisição; envie o lote novamente')
+
+    for indice, conta in zip(validos, contas):
+        resultados[indice] = {'indice': indice, 'status': 201, 'conta': conta}
+    return resultados, contas
+
+
+def validar_alteracoes(alteracoes):
+    """Retorna (campos para o update(), lista de erros)"""
+    if not isinstance(alteracoes, dict) or not alteracoes:
+        return None, [f'alteracoes deve ser um objeto com: {", ".join(CAMPOS_ALTERAVEIS)}']
+    erros = [f'Campo não alterável em lote: {campo}' for campo in alteracoes if campo not in CAMPOS_ALTERAVEIS]
+    campos = {}
+    if 'status' in alteracoes:
+        if isinstance(alteracoes['status'], str) and alteracoes['status'] in STATUS:
+            campos['status'] = alteracoes['status']
+        else:
+            erros.append('Status inválido')
+    if 'data_expiracao' in alteracoes:
+        if alteracoes['data_expiracao'] in (None, ''):
+            campos['data_expiracao'] = None
+        else:
+            campos['data_expiracao'] = _data(alteracoes['data_expiracao'])
+            if campos['data_expiracao'] is None:
+                erros.append('data_expiracao deve estar no formato AAAA-MM-DD')
+    return (None, erros) if erros else (campos, [])
+
+
+def permissoes_em_lote(usuario, ids, travar=False):
+    """
+    {id: (proprietario_id, pode_editar, pode_deletar, estado)} das contas
+    ativas visíveis ao usuário entre ids, em uma consulta. estado são os
+    valores de resumo.CAMPOS_RESUMO, para a diferença do resumo do cofre.
+    Com travar, as contas ficam travadas até o fim da transação.
+    """
+    linhas = ContaStreaming.objects.visiveis_para(usuario).filter(id__in=ids).order_by()
+    if travar:
+        linhas = linhas.select_for_update(of=('self',))
+    linhas = linhas.values_list('id', 'nivel_compartilhado', *resumo.CAMPOS_RESUMO)
+    permissoes = {}
+    for conta_id, nivel, *estado in linhas:
+        proprietario_id = estado[0]
+        if proprietario_id == usuario.id:
+            permissoes[conta_id] = (proprietario_id, True, True, tuple(estado))
+        else:
+            permissoes[conta_id] = (proprietario_id, nivel in ('acesso', 'admin'), nivel == 'admin', tuple(estado))
+    return permissoes
+
+
+def _aplicar(usuario, ids, indice_permissao, campos):
+    """update() nas contas permitidas; retorna (ids alterados, ids negados)"""
+    # O estado lido é a base dos deltas do resumo: nada pode mudá-lo até o update()
+    with transaction.atomic():
+        permissoes = permissoes_em_lote(usuario, ids, travar=True)
+        permitidos, negados = [], []
+        for conta_id in ids:
+            permitido = conta_id in permissoes and permissoes[conta_id][indice_permissao]
+            (permitidos if permitido else negados).append(conta_id)
+        if permitidos:
+            antes = {conta_id: permissoes[conta_id][3] for conta_id in permitidos}
+            ContaStreaming.objects.filter(id__in=permitidos).update(**campos, data_atualizacao=timezone.now())
+            compartilhados = list(
+                CompartilhamentoStreaming.objects.filter(conta_id__in=permitidos).values_list('conta_id', 'usuario_id')
+            )
+            resumo.aplicar(_deltas_resumo(antes, campos, compartilhados))
+            afetados = {
+                *(permissoes[conta_id][0] for conta_id in permitidos),
+                *(usuario_id for _, usuario_id in compartilhados),
+            }
+            transaction.on_commit(lambda: invalidar_usuarios(afetados))
+    return permitidos, negados
+
+
+def _deltas_resumo(antes, campos, compartilhados):
+    """Diferença do resumo do cofre causada por update(**campos) nas contas de antes"""
+    indices = {campo: resumo.CAMPOS_RESUMO.index(campo) for campo in campos if campo in resumo.CAMPOS_RESUMO}
+    depois = {}
+    for conta_id, valores in antes.items():
+        novos = list(valores)
+        for campo, indice in indices.items():
+            novos[indice] = campos[campo]
+        depois[conta_id] = tuple(novos)
+
+    deltas = Counter()
+    for conta_id in antes:
+        deltas.update(resumo.chaves_conta(*depois[conta_id]))
+        deltas.subtract(resumo.chaves_conta(*antes[conta_id]))
+    # Compartilhamentos contam só em contas ativas
+    for conta_id, usuario_id in compartilhados:
+        proprietario_id, ativa_antes, ativa_depois = antes[conta_id][0], antes[conta_id][-1], depois[conta_id][-1]
+        deltas.update(resumo.chaves_compartilhamento(usuario_id, proprietario_id, ativa_depois))
+        deltas.subtract(resumo.chaves_compartilhamento(usuario_id, proprietario_id, ativa_antes))
+    return deltas
+
+
+def atualizar_em_lote(usuario, ids, campos):
+    """Aplica campos às contas que o usuário pode editar"""
+    return _aplicar(usuario, ids, 1, campos)
+
+
+def desativar_em_lote(usuario, ids):
+    """Soft delete (ativo=False) das contas que o usuário pode deletar"""
+    return _aplicar(usuario, ids, 2, {'ativo': False})
@@ -0,0 +1,52 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from steam.importacao import MAPAS_PREDEFINIDOS, MapaInvalido, executar_importacao, ler_mapa
+from steam.models import ImportacaoStreaming
+from usuarios.models import Usuario
+
+
+class Command(BaseCommand):
+    help = 'Importa contas de streaming de um CSV para um usuário, em lotes, registrando uma ImportacaoStreaming'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do CSV')
+        parser.add_argument('--email', required=True, help='Email do usuário dono das contas importadas')
+        parser.add_argument(
+            '--mapa',
+            default='padrao',
+            help=f'Mapa predefinido ({", ".join(MAPAS_PREDEFINIDOS)}) ou JSON com colunas e plataformas',
+        )
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo']
+        try:
+            usuario = Usuario.objects.get(email=options['email'])
+        except Usuario.DoesNotExist:
+            raise CommandError(f'Usuário não encontrado: {options["email"]}')
+        try:
+            mapa = ler_mapa(options['mapa'])
+        except MapaInvalido as e:
+            raise CommandError(str(e))
+        if not os.path.isfile(caminho):
+            raise CommandError(f'Arquivo não encontrado: {caminho}')
+
+        importacao = ImportacaoStreaming.objects.create(
+            usuario=usuario,
+            nome_arquivo=os.path.basename(caminho)[:255],
+            tamanho_arquivo=os.path.getsize(caminho),
+            mapa=mapa,
+        )
+        with open(caminho, 'rb') as arquivo:
+            executar_importacao(importacao, arquivo)
+
+        self.stdout.write(
+            f'Importação {importacao.id}: {importacao.linhas_processadas} linhas, '
+            f'{importacao.criadas} criadas, {importacao.falhas} com erro'
+        )
+        for erro in importacao.erros[:20]:
+            self.stdout.write(f'  linha {erro["linha"]}: {"; ".join(erro["erros"])}')
+        if importacao.status == 'falhou':
+            raise CommandError(importacao.mensagem)
+        self.stdout.write(self.style.SUCCESS('Importação concluída'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from steam import resumo
+from usuarios.models import Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula o resumo dos cofres a partir das contas e compartilhamentos e corrige as '
+        'linhas divergentes. Rode após migrar e diariamente, fora do horário de pico.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email',
+            action='append',
+            help='Reconcilia só estes usuários (pode repetir)',
+        )
+        parser.add_argument(
+            '--tamanho-lote',
+            type=int,
+            default=1000,
+            help='Quantidade de linhas lidas e gravadas por lote',
+        )
+
+    def handle(self, *args, **options):
+        usuario_ids = None
+        if options['email']:
+            usuario_ids = list(Usuario.objects.filter(email__in=options['email']).values_list('id', flat=True))
+            if len(usuario_ids) != len(set(options['email'])):
+                raise CommandError('Usuário não encontrado entre os emails informados')
+
+        corrigidas, criadas, apagadas = resumo.reconciliar(usuario_ids, tamanho_lote=options['tamanho_lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumos reconciliados: {corrigidas} corrigidas, {criadas} criadas, {apagadas} apagadas'
+        ))
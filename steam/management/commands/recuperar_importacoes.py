@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from steam.importacao import recuperar_interrompidas
+
+
+class Command(BaseCommand):
+    help = (
+        'Marca como falhas as importações de CSV paradas (thread ou processo encerrado no meio) '
+        'e apaga os arquivos delas. Rode periodicamente, por exemplo a cada 15 minutos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tempo-limite',
+            type=int,
+            default=settings.IMPORTACAO_TEMPO_LIMITE,
+            help='Segundos sem progresso para considerar a importação interrompida',
+        )
+
+    def handle(self, *args, **options):
+        marcadas = recuperar_interrompidas(options['tempo_limite'])
+        self.stdout.write(self.style.SUCCESS(f'Importações interrompidas: {marcadas}'))
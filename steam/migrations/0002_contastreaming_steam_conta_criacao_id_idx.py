@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steam', '0001_initial'),
+        ('usuarios', '0005_usuario_usuarios_criacao_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contastreaming',
+            index=models.Index(fields=['-data_criacao', '-id'], name='steam_conta_criacao_id_idx'),
+        ),
+    ]
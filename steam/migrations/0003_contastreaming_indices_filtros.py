@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steam', '0002_contastreaming_steam_conta_criacao_id_idx'),
+        ('usuarios', '0005_usuario_usuarios_criacao_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contastreaming',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['proprietario', 'plataforma', '-data_criacao', '-id'], name='steam_conta_prop_plat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contastreaming',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['proprietario', 'status', '-data_criacao', '-id'], name='steam_conta_prop_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contastreaming',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['proprietario', 'data_expiracao'], name='steam_conta_prop_expira_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contastreaming',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['proprietario', 'ultimo_acesso'], name='steam_conta_prop_acesso_idx'),
+        ),
+    ]
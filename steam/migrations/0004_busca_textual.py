@@ -0,0 +1,69 @@
+from django.db import migrations
+
+TABELA = 'steam_contastreaming'
+TABELA_FTS = 'steam_contastreaming_fts'
+COLUNAS = 'nome, descricao, email, usuario'
+
+SQLITE_CRIAR = [
+    f"""CREATE VIRTUAL TABLE {TABELA_FTS} USING fts5(
+        {COLUNAS}, content='{TABELA}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER {TABELA_FTS}_ai AFTER INSERT ON {TABELA} BEGIN
+        INSERT INTO {TABELA_FTS}(rowid, {COLUNAS})
+        VALUES (new.id, new.nome, new.descricao, new.email, new.usuario);
+    END""",
+    f"""CREATE TRIGGER {TABELA_FTS}_ad AFTER DELETE ON {TABELA} BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, {COLUNAS})
+        VALUES ('delete', old.id, old.nome, old.descricao, old.email, old.usuario);
+    END""",
+    f"""CREATE TRIGGER {TABELA_FTS}_au AFTER UPDATE OF {COLUNAS} ON {TABELA} BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, {COLUNAS})
+        VALUES ('delete', old.id, old.nome, old.descricao, old.email, old.usuario);
+        INSERT INTO {TABELA_FTS}(rowid, {COLUNAS})
+        VALUES (new.id, new.nome, new.descricao, new.email, new.usuario);
+    END""",
+    # Indexa as contas já existentes
+    f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')",
+]
+
+SQLITE_REMOVER = [
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_ai',
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_ad',
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_au',
+    f'DROP TABLE IF EXISTS {TABELA_FTS}',
+]
+
+# Mesma expressão de steam.busca.EXPRESSAO_TSVECTOR
+POSTGRES_CRIAR = [
+    f"""CREATE INDEX steam_conta_busca_gin ON {TABELA} USING GIN (
+        to_tsvector('simple', coalesce(nome, '') || ' ' || coalesce(descricao, '') || ' '
+            || coalesce(email, '') || ' ' || coalesce(usuario, ''))
+    )""",
+]
+
+POSTGRES_REMOVER = ['DROP INDEX IF EXISTS steam_conta_busca_gin']
+
+
+def _executar(schema_editor, comandos):
+    for sql in comandos.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def criar_indice_busca(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQLITE_CRIAR, 'postgresql': POSTGRES_CRIAR})
+
+
+def remover_indice_busca(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQLITE_REMOVER, 'postgresql': POSTGRES_REMOVER})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steam', '0003_contastreaming_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice_busca, remover_indice_busca),
+    ]
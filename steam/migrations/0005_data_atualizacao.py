@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:47
+
+import importlib
+
+from django.db import migrations, models
+
+busca_textual = importlib.import_module('steam.migrations.0004_busca_textual')
+
+
+def recriar_busca_sqlite(apps, schema_editor):
+    # No SQLite, adicionar/remover coluna recria a tabela e descarta os
+    # triggers da busca textual (0004); recria-os e reindexa
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in busca_textual.SQLITE_REMOVER + busca_textual.SQLITE_CRIAR:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steam', '0004_busca_textual'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recriar_busca_sqlite),
+        migrations.AddField(
+            model_name='compartilhamentostreaming',
+            name='data_atualizacao',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='contastreaming',
+            name='data_atualizacao',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(recriar_busca_sqlite, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steam', '0005_data_atualizacao'),
+        ('usuarios', '0005_usuario_usuarios_criacao_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacaoStreaming',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('arquivo', models.FileField(blank=True, help_text='CSV enviado (removido ao final)', null=True, upload_to='importacoes/')),
+                ('nome_arquivo', models.CharField(blank=True, max_length=255)),
+                ('mapa', models.JSONField(default=dict, help_text='Colunas do CSV para cada campo e valores de plataforma')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=12)),
+                ('tamanho_arquivo', models.PositiveBigIntegerField(default=0)),
+                ('bytes_processados', models.PositiveBigIntegerField(default=0)),
+                ('linhas_processadas', models.PositiveIntegerField(default=0)),
+                ('criadas', models.PositiveIntegerField(default=0)),
+                ('falhas', models.PositiveIntegerField(default=0)),
+                ('erros', models.JSONField(default=list, help_text='Erros por linha: [{linha, erros}]')),
+                ('mensagem', models.TextField(blank=True, help_text='Erro que interrompeu a importação')),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='importacoes_streaming', to='usuarios.usuario')),
+            ],
+            options={
+                'verbose_name': 'Importação de Streaming',
+                'verbose_name_plural': 'Importações de Streaming',
+                'ordering': ['-data_criacao'],
+            },
+        ),
+    ]
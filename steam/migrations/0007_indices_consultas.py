@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steam', '0006_importacaostreaming'),
+        ('usuarios', '0006_usuario_principal_ativo_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='compartilhamentostreaming',
+            index=models.Index(fields=['usuario', 'conta'], name='steam_comp_usuario_conta_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicoacesso',
+            index=models.Index(fields=['conta', '-data_acesso'], name='steam_hist_conta_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicoacesso',
+            index=models.Index(fields=['usuario', '-data_acesso'], name='steam_hist_usuario_data_idx'),
+        ),
+    ]
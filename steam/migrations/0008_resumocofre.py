@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steam', '0007_indices_consultas'),
+        ('usuarios', '0006_usuario_principal_ativo_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoCofre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimensao', models.CharField(choices=[('total', 'Total de contas'), ('plataforma', 'Plataforma'), ('status', 'Status'), ('expiracao', 'Data de expiração'), ('compartilhadas_entrada', 'Compartilhadas com o usuário'), ('compartilhamentos_saida', 'Compartilhamentos feitos')], max_length=25)),
+                ('valor', models.CharField(blank=True, help_text='Plataforma, status ou data (AAAA-MM-DD)', max_length=20)),
+                ('total', models.IntegerField(default=0)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumo_cofre', to='usuarios.usuario')),
+            ],
+            options={
+                'verbose_name': 'Resumo do Cofre',
+                'verbose_name_plural': 'Resumos dos Cofres',
+                'unique_together': {('usuario', 'dimensao', 'valor')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-17 05:04
+
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def criar_versoes(apps, schema_editor):
+    Usuario = apps.get_model('usuarios', 'Usuario')
+    VersaoListagem = apps.get_model('steam', 'VersaoListagem')
+    agora = timezone.now()
+    VersaoListagem.objects.bulk_create(
+        [VersaoListagem(usuario_id=usuario_id, versao=uuid.uuid4().hex, data_atualizacao=agora)
+         for usuario_id in Usuario.objects.values_list('id', flat=True).iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steam', '0008_resumocofre'),
+        ('usuarios', '0007_raiz_set_null'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoListagem',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='versao_listagem', serialize=False, to='usuarios.usuario')),
+                ('versao', models.CharField(max_length=32)),
+                ('data_atualizacao', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Versão da Listagem',
+                'verbose_name_plural': 'Versões das Listagens',
+            },
+        ),
+        migrations.RunPython(criar_versoes, migrations.RunPython.noop),
+    ]
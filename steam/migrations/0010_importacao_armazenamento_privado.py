@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 05:12
+
+import steam.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steam', '0009_versaolistagem'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importacaostreaming',
+            name='arquivo',
+            field=models.FileField(blank=True, help_text='CSV enviado (removido ao final)', null=True, storage=steam.models.armazenamento_importacoes, upload_to=''),
+        ),
+    ]
@@ -1,8 +1,117 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
-from django.contrib.auth.hashers import make_password, check_password
+from django.db.models import OuterRef, Q, Subquery
+from usuarios import hashing
 from usuarios.models import Usuario
 
 
+class ContasVisiveis:
+    """
+    Resultado de ContaStreamingQuerySet.listagem(): uma consulta por escopo.
+    filter(), exclude() e values() valem para cada consulta; order_by(), o
+    fatiamento e a iteração, para a união delas (UNION ALL).
+    """
+    
+    def __init__(self, ramos, ordem=()):
+        self.ramos = ramos
+        self.ordem = ordem
+        self.model = ramos[0].model
+    
+    def _em_cada_ramo(self, metodo, *args, **kwargs):
+        return ContasVisiveis([getattr(ramo, metodo)(*args, **kwargs) for ramo in self.ramos], self.ordem)
+    
+    def filter(self, *args, **kwargs):
+        return self._em_cada_ramo('filter', *args, **kwargs)
+    
+    def exclude(self, *args, **kwargs):
+        return self._em_cada_ramo('exclude', *args, **kwargs)
+    
+    def values(self, *campos):
+        return self._em_cada_ramo('values', *campos)
+    
+    def order_by(self, *ordem):
+        return ContasVisiveis(self.ramos, ordem)
+    
+    def consulta(self):
+        """
+        O queryset final. Sem ORDER BY dentro dos ramos: com a ordenação só
+        na união, o banco intercala os ramos (MERGE) e cada um pode entregar
+        as linhas já na ordem do seu índice.
+        """
+        if len(self.ramos) == 1:
+            return self.ramos[0].order_by(*self.ordem)
+        primeiro, *demais = [ramo.order_by() for ramo in self.ramos]
+        return primeiro.union(*demais, all=True).order_by(*self.ordem)
+    
+    def __getitem__(self, indice):
+        return self.consulta()[indice]
+    
+    def __iter__(self):
+        return iter(self.consulta())
+    
+    def iterator(self, chunk_size=None):
+        return self.consulta().iterator(chunk_size=chunk_size)
+    
+    def explain(self, **opcoes):
+        return self.consulta().explain(**opcoes)
+
+
+class ContaStreamingQuerySet(models.QuerySet):
+    """
+    Consultas de contas de streaming
+    """
+    
+    def _com_nivel(self, usuario):
+        """
+        Anota nivel_compartilhado (o nivel_acesso do compartilhamento com o
+        usuário, ou None) e carrega o proprietário
+        """
+        nivel = CompartilhamentoStreaming.objects.filter(
+            conta=OuterRef('pk'),
+            usuario=usuario,
+        ).values('nivel_acesso')[:1]
+        return self.annotate(nivel_compartilhado=Subquery(nivel)).select_related('proprietario')
+    
+    def visiveis_para(self, usuario):
+        """
+        Contas ativas que o usuário possui ou que foram compartilhadas com ele,
+        em uma única consulta. Cada conta vem com nivel_compartilhado e com o
+        proprietário já carregado.
+        """
+        # "id IN (...)" permite ao banco usar um índice em cada lado do OR
+        compartilhadas = CompartilhamentoStreaming.objects.filter(usuario=usuario).values('conta')
+        return (
+            self.filter(Q(proprietario=usuario) | Q(id__in=compartilhadas), ativo=True)
+            ._com_nivel(usuario)
+            .order_by('-data_criacao', '-id')
+        )
+    
+    def listagem(self, usuario, plataforma=None, status=None, expira_antes=None, escopo='todos'):
+        """
+        As contas de visiveis_para com os filtros da listagem; escopo é
+        'todos', 'proprios' ou 'compartilhados'. Próprias e compartilhadas são
+        consultas separadas, cada uma com o seu índice ((proprietario, campo)
+        sobre as contas ativas e (usuario, conta)); em 'todos' elas são unidas
+        por ContasVisiveis.
+        """
+        contas = self.filter(ativo=True)
+        if plataforma:
+            contas = contas.filter(plataforma=plataforma)
+        if status:
+            contas = contas.filter(status=status)
+        if expira_antes:
+            contas = contas.filter(data_expiracao__lt=expira_antes)
+        
+        ramos = []
+        if escopo in ('todos', 'proprios'):
+            ramos.append(contas.filter(proprietario=usuario))
+        if escopo in ('todos', 'compartilhados'):
+            compartilhadas = CompartilhamentoStreaming.objects.filter(usuario=usuario).values('conta')
+            ramos.append(contas.filter(id__in=compartilhadas).exclude(proprietario=usuario))
+        return ContasVisiveis([ramo._com_nivel(usuario) for ramo in ramos]).order_by('-data_criacao', '-id')
+
+
 class ContaStreaming(models.Model):
     """
     Modelo para gerenciar contas de streaming
@@ -50,6 +159,7 @@ class ContaStreaming(models.Model):
     data_criacao = models.DateTimeField(auto_now_add=True)
     data_expiracao = models.DateField(blank=True, null=True, help_text="Data de expiração da conta")
     ultimo_acesso = models.DateTimeField(blank=True, null=True, help_text="Último acesso à conta")
+    data_atualizacao = models.DateTimeField(auto_now=True)
     
     # Relacionamentos
     proprietario = models.ForeignKey(
@@ -69,30 +179,60 @@ class ContaStreaming(models.Model):
     # Configurações
     ativo = models.BooleanField(default=True)
     
+    objects = ContaStreamingQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Conta de Streaming"
         verbose_name_plural = "Contas de Streaming"
         ordering = ['-data_criacao']
         unique_together = ['email', 'plataforma', 'proprietario']
+        indexes = [
+            # Paginação por cursor em (data_criacao, id)
+            models.Index(fields=['-data_criacao', '-id'], name='steam_conta_criacao_id_idx'),
+            # Filtros e ordenações da listagem, só sobre contas ativas. O
+            # ativo fica na condição do índice: "WHERE ativo" sem "= 1" não
+            # serve de prefixo de índice no SQLite. Os filtros por igualdade
+            # terminam na ordem padrão, para não ordenar em memória.
+            models.Index(fields=['proprietario', 'plataforma', '-data_criacao', '-id'], name='steam_conta_prop_plat_idx', condition=Q(ativo=True)),
+            models.Index(fields=['proprietario', 'status', '-data_criacao', '-id'], name='steam_conta_prop_status_idx', condition=Q(ativo=True)),
+            models.Index(fields=['proprietario', 'data_expiracao'], name='steam_conta_prop_expira_idx', condition=Q(ativo=True)),
+            models.Index(fields=['proprietario', 'ultimo_acesso'], name='steam_conta_prop_acesso_idx', condition=Q(ativo=True)),
+        ]
     
     def __str__(self):
         return f"{self.nome} ({self.get_plataforma_display()})"
     
     def save(self, *args, **kwargs):
         # Criptografar senha se não estiver criptografada
-        if self.senha and not self.senha.startswith('pbkdf2_sha256$'):
-            self.senha = make_password(self.senha)
+        if self.senha and not hashing.e_hash(self.senha):
+            self.senha = hashing.gerar_hash(self.senha)
         super().save(*args, **kwargs)
     
     def verificar_senha(self, senha_plana):
         """Verifica se a senha fornecida está correta"""
-        return check_password(senha_plana, self.senha)
+        return hashing.verificar_hash(senha_plana, self.senha)
     
     def get_senha_plana(self):
         """Retorna a senha descriptografada (apenas para exibição)"""
         # Em produção, isso deve ser feito com cuidado
         return self.senha
     
+    def permissoes_para(self, usuario):
+        """
+        Retorna (is_proprietario, pode_editar, pode_deletar).
+        Usa nivel_compartilhado quando a conta veio de visiveis_para.
+        """
+        if self.proprietario_id == usuario.id:
+            return True, True, True
+        
+        if hasattr(self, 'nivel_compartilhado'):
+            nivel = self.nivel_compartilhado
+        else:
+            nivel = CompartilhamentoStreaming.objects.filter(
+                conta=self, usuario=usuario
+            ).values_list('nivel_acesso', flat=True).first()
+        return False, nivel in ['acesso', 'admin'], nivel == 'admin'
+    
     def pode_ser_acessada_por(self, usuario):
         """Verifica se um usuário pode acessar esta conta"""
         if self.proprietario == usuario:
@@ -129,7 +269,7 @@ class ContaStreaming(models.Model):
         """Atualiza a data do último acesso"""
         from django.utils import timezone
         self.ultimo_acesso = timezone.now()
-        self.save(update_fields=['ultimo_acesso'])
+        self.save(update_fields=['ultimo_acesso', 'data_atualizacao'])
 
 
 class CompartilhamentoStreaming(models.Model):
@@ -146,6 +286,7 @@ class CompartilhamentoStreaming(models.Model):
     conta = models.ForeignKey(ContaStreaming, on_delete=models.CASCADE)
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     data_compartilhamento = models.DateTimeField(auto_now_add=True)
+    data_atualizacao = models.DateTimeField(auto_now=True)
     nivel_acesso = models.CharField(max_length=10, choices=NIVEL_ACESSO_CHOICES, default='leitura')
     ativo = models.BooleanField(default=True)
     
@@ -153,6 +294,13 @@ class CompartilhamentoStreaming(models.Model):
         unique_together = ['conta', 'usuario']
         verbose_name = "Compartilhamento de Streaming"
         verbose_name_plural = "Compartilhamentos de Streaming"
+        indexes = [
+            # Contas compartilhadas com o usuário (visiveis_para e listagem): o
+            # índice único começa pela conta; este responde sem ler a tabela.
+            # Nenhuma consulta filtra o ativo do compartilhamento, então ele
+            # fica de fora
+            models.Index(fields=['usuario', 'conta'], name='steam_comp_usuario_conta_idx'),
+        ]
     
     def __str__(self):
         return f"{self.conta.nome} compartilhada com {self.usuario.nome}"
@@ -183,6 +331,123 @@ class HistoricoAcesso(models.Model):
         verbose_name = "Histórico de Acesso"
         verbose_name_plural = "Histórico de Acessos"
         ordering = ['-data_acesso']
+        indexes = [
+            # Acessos de uma conta ou de um usuário, já na ordem do Meta
+            models.Index(fields=['conta', '-data_acesso'], name='steam_hist_conta_data_idx'),
+            models.Index(fields=['usuario', '-data_acesso'], name='steam_hist_usuario_data_idx'),
+        ]
     
     def __str__(self):
         return f"Acesso de {self.usuario.nome} em {self.conta.nome} - {self.data_acesso}"
+
+
+def armazenamento_importacoes():
+    """
+    Onde ficam os CSVs das importações até o processamento: em
+    IMPORTACAO_DIRETORIO, fora de MEDIA_ROOT, legíveis só pelo processo
+    """
+    return FileSystemStorage(
+        location=settings.IMPORTACAO_DIRETORIO,
+        file_permissions_mode=0o600,
+        directory_permissions_mode=0o700,
+    )
+
+
+class ImportacaoStreaming(models.Model):
+    """
+    Importação de contas a partir de um CSV, acompanhada por consulta
+    (progresso e erros por linha)
+    """
+    
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+    ]
+    
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='importacoes_streaming')
+    arquivo = models.FileField(
+        storage=armazenamento_importacoes, blank=True, null=True, help_text="CSV enviado (removido ao final)"
+    )
+    nome_arquivo = models.CharField(max_length=255, blank=True)
+    mapa = models.JSONField(default=dict, help_text="Colunas do CSV para cada campo e valores de plataforma")
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='pendente')
+    
+    # Progresso
+    tamanho_arquivo = models.PositiveBigIntegerField(default=0)
+    bytes_processados = models.PositiveBigIntegerField(default=0)
+    linhas_processadas = models.PositiveIntegerField(default=0)
+    criadas = models.PositiveIntegerField(default=0)
+    falhas = models.PositiveIntegerField(default=0)
+    erros = models.JSONField(default=list, help_text="Erros por linha: [{linha, erros}]")
+    mensagem = models.TextField(blank=True, help_text="Erro que interrompeu a importação")
+    
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    data_atualizacao = models.DateTimeField(auto_now=True)
+    data_conclusao = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        verbose_name = "Importação de Streaming"
+        verbose_name_plural = "Importações de Streaming"
+        ordering = ['-data_criacao']
+    
+    def __str__(self):
+        return f"Importação {self.id} de {self.usuario.nome} ({self.get_status_display()})"
+    
+    @property
+    def progresso(self):
+        """Percentual do arquivo já lido (0 a 100)"""
+        if self.status == 'concluida':
+            return 100
+        if not self.tamanho_arquivo:
+            return 0
+        return min(100, round(100 * self.bytes_processados / self.tamanho_arquivo))
+
+
+class ResumoCofre(models.Model):
+    """
+    Contagens materializadas do cofre de um usuário, uma linha por
+    (dimensão, valor), mantidas pelos sinais (ver steam.resumo)
+    """
+    
+    DIMENSOES_CHOICES = [
+        ('total', 'Total de contas'),
+        ('plataforma', 'Plataforma'),
+        ('status', 'Status'),
+        ('expiracao', 'Data de expiração'),
+        ('compartilhadas_entrada', 'Compartilhadas com o usuário'),
+        ('compartilhamentos_saida', 'Compartilhamentos feitos'),
+    ]
+    
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='resumo_cofre')
+    dimensao = models.CharField(max_length=25, choices=DIMENSOES_CHOICES)
+    valor = models.CharField(max_length=20, blank=True, help_text="Plataforma, status ou data (AAAA-MM-DD)")
+    total = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['usuario', 'dimensao', 'valor']
+        verbose_name = "Resumo do Cofre"
+        verbose_name_plural = "Resumos dos Cofres"
+    
+    def __str__(self):
+        return f"{self.usuario_id} {self.dimensao}={self.valor}: {self.total}"
+
+
+class VersaoListagem(models.Model):
+    """
+    Versão da listagem de contas de um usuário, trocada a cada alteração
+    que ele veria (ver steam.cache_listagem). Fica no banco para valer
+    igual em todos os processos; data_atualizacao é o Last-Modified.
+    """
+    
+    usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, primary_key=True, related_name='versao_listagem')
+    versao = models.CharField(max_length=32)
+    data_atualizacao = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = "Versão da Listagem"
+        verbose_name_plural = "Versões das Listagens"
+    
+    def __str__(self):
+        return f"{self.usuario_id}: {self.versao}"
@@ -0,0 +1,182 @@
+"""
+Resumo materializado do cofre de cada usuário
+
+ResumoCofre guarda uma linha por (usuário, dimensão, valor) com a
+quantidade de contas ativas: total, por plataforma, por status e por data
+de expiração, além dos compartilhamentos recebidos e feitos. Os sinais
+calculam as chaves antes e depois de cada alteração e aplicam só a
+diferença com F() (bulk_create das linhas novas e um UPDATE com CASE),
+sem GROUP BY sobre ContaStreaming. As expirações ficam por data, então
+"expira em 7 dias" continua certo com a passagem dos dias.
+
+bulk_create e update() não disparam sinais: lote.py aplica as
+diferenças por conta própria. reconciliar() recalcula tudo por agregação
+e corrige as linhas divergentes (comando reconciliar_resumos).
+"""
+
+from collections import Counter
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.utils import timezone
+
+from .models import CompartilhamentoStreaming, ContaStreaming, ResumoCofre
+
+_DATA = models.DateField()
+
+# Campos de ContaStreaming que entram no resumo
+CAMPOS_RESUMO = ('proprietario_id', 'plataforma', 'status', 'data_expiracao', 'ativo')
+
+
+def chaves_conta(proprietario_id, plataforma, status, data_expiracao, ativo):
+    """Linhas do resumo em que a conta conta uma vez"""
+    if not ativo:
+        return []
+    chaves = [
+        (proprietario_id, 'total', ''),
+        (proprietario_id, 'plataforma', plataforma),
+        (proprietario_id, 'status', status),
+    ]
+    if data_expiracao:
+        # As views podem atribuir a data como texto antes do save
+        chaves.append((proprietario_id, 'expiracao', str(_DATA.to_python(data_expiracao))))
+    return chaves
+
+
+def chaves_compartilhamento(usuario_id, proprietario_id, conta_ativa):
+    """Linhas do resumo de um compartilhamento (só de contas ativas)"""
+    if not conta_ativa:
+        return []
+    return [(usuario_id, 'compartilhadas_entrada', ''), (proprietario_id, 'compartilhamentos_saida', '')]
+
+
+def diferenca(antes, depois):
+    """Counter com +1 para cada chave de depois e -1 para cada de antes"""
+    deltas = Counter(depois)
+    deltas.subtract(antes)
+    return deltas
+
+
+def aplicar(deltas):
+    """
+    Soma os deltas às linhas do resumo: cria as que faltam e atualiza
+    todas em um UPDATE, com F() para não perder alterações concorrentes
+    """
+    deltas = {chave: delta for chave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    novas = [
+        ResumoCofre(usuario_id=usuario_id, dimensao=dimensao, valor=valor)
+        for (usuario_id, dimensao, valor), delta in deltas.items() if delta > 0
+    ]
+    if novas:
+        ResumoCofre.objects.bulk_create(novas, ignore_conflicts=True)
+    condicoes = {
+        chave: Q(usuario_id=chave[0], dimensao=chave[1], valor=chave[2])
+        for chave in deltas
+    }
+    ResumoCofre.objects.filter(reduce(or_, condicoes.values())).update(
+        total=F('total') + Case(
+            *(When(condicao, then=Value(deltas[chave])) for chave, condicao in condicoes.items()),
+            default=Value(0),
+        )
+    )
+
+
+def resumo_de(usuario, hoje=None):
+    """Resumo do cofre do usuário a partir das linhas materializadas"""
+    hoje = hoje or timezone.localdate()
+    em_7_dias, em_30_dias = str(hoje + timedelta(days=7)), str(hoje + timedelta(days=30))
+    hoje = str(hoje)
+    resumo = {
+        'total': 0,
+        'por_plataforma': {},
+        'por_status': {},
+        'expiradas': 0,
+        'expirando_7_dias': 0,
+        'expirando_30_dias': 0,
+        'compartilhadas_comigo': 0,
+        'compartilhamentos_feitos': 0,
+    }
+    linhas = ResumoCofre.objects.filter(usuario=usuario, total__gt=0).values_list('dimensao', 'valor', 'total')
+    for dimensao, valor, total in linhas:
+        if dimensao == 'total':
+            resumo['total'] = total
+        elif dimensao == 'plataforma':
+            resumo['por_plataforma'][valor] = total
+        elif dimensao == 'status':
+            resumo['por_status'][valor] = total
+        elif dimensao == 'expiracao':
+            # Datas ISO comparam como texto
+            if valor < hoje:
+                resumo['expiradas'] += total
+            elif valor <= em_7_dias:
+                resumo['expirando_7_dias'] += total
+                resumo['expirando_30_dias'] += total
+            elif valor <= em_30_dias:
+                resumo['expirando_30_dias'] += total
+        elif dimensao == 'compartilhadas_entrada':
+            resumo['compartilhadas_comigo'] = total
+        elif dimensao == 'compartilhamentos_saida':
+            resumo['compartilhamentos_feitos'] = total
+    return resumo
+
+
+def _contagens(usuario_ids=None):
+    """Resumo esperado calculado por GROUP BY: {chave: total}"""
+    contas = ContaStreaming.objects.filter(ativo=True).order_by()
+    compartilhamentos = CompartilhamentoStreaming.objects.filter(conta__ativo=True).order_by()
+    if usuario_ids is not None:
+        contas = contas.filter(proprietario_id__in=usuario_ids)
+
+    esperado = Counter()
+    for linha in contas.values('proprietario_id').annotate(n=Count('id')):
+        esperado[(linha['proprietario_id'], 'total', '')] = linha['n']
+    for campo in ('plataforma', 'status'):
+        for linha in contas.values('proprietario_id', campo).annotate(n=Count('id')):
+            esperado[(linha['proprietario_id'], campo, linha[campo])] = linha['n']
+    for linha in contas.exclude(data_expiracao=None).values('proprietario_id', 'data_expiracao').annotate(n=Count('id')):
+        esperado[(linha['proprietario_id'], 'expiracao', str(linha['data_expiracao']))] = linha['n']
+
+    entrada = compartilhamentos if usuario_ids is None else compartilhamentos.filter(usuario_id__in=usuario_ids)
+    for linha in entrada.values('usuario_id').annotate(n=Count('id')):
+        esperado[(linha['usuario_id'], 'compartilhadas_entrada', '')] = linha['n']
+    saida = compartilhamentos if usuario_ids is None else compartilhamentos.filter(conta__proprietario_id__in=usuario_ids)
+    for linha in saida.values('conta__proprietario_id').annotate(n=Count('id')):
+        esperado[(linha['conta__proprietario_id'], 'compartilhamentos_saida', '')] = linha['n']
+    return esperado
+
+
+def reconciliar(usuario_ids=None, tamanho_lote=1000):
+    """
+    Recalcula o resumo por agregação e corrige as linhas divergentes (e
+    apaga as zeradas). Retorna (corrigidas, criadas, apagadas).
+    Escreve totais absolutos: rode fora dos horários de pico.
+    """
+    with transaction.atomic():
+        esperado = _contagens(usuario_ids)
+        existentes = ResumoCofre.objects.all()
+        if usuario_ids is not None:
+            existentes = existentes.filter(usuario_id__in=usuario_ids)
+
+        corrigir, apagar = [], []
+        for linha in existentes.only('id', 'usuario_id', 'dimensao', 'valor', 'total').iterator(chunk_size=tamanho_lote):
+            total = esperado.pop((linha.usuario_id, linha.dimensao, linha.valor), 0)
+            if not total:
+                apagar.append(linha.id)
+            elif total != linha.total:
+                linha.total = total
+                corrigir.append(linha)
+
+        ResumoCofre.objects.bulk_update(corrigir, ['total'], batch_size=tamanho_lote)
+        for inicio in range(0, len(apagar), tamanho_lote):
+            ResumoCofre.objects.filter(id__in=apagar[inicio:inicio + tamanho_lote]).delete()
+        novas = [
+            ResumoCofre(usuario_id=usuario_id, dimensao=dimensao, valor=valor, total=total)
+            for (usuario_id, dimensao, valor), total in esperado.items() if total
+        ]
+        ResumoCofre.objects.bulk_create(novas, batch_size=tamanho_lote)
+    return len(corrigir), len(novas), len(apagar)
@@ -0,0 +1,88 @@
+"""
+Serialização de contas de streaming (ver usuarios.campos)
+"""
+
+from usuarios.campos import Campo, CamposResposta, arquivo, coluna, exibicao
+
+from .models import ContaStreaming, ImportacaoStreaming
+
+
+def _permissoes(linha, usuario):
+    """(is_proprietario, pode_editar, pode_deletar), como ContaStreaming.permissoes_para"""
+    if linha['proprietario_id'] == usuario.id:
+        return True, True, True
+    nivel = linha['nivel_compartilhado']
+    return False, nivel in ('acesso', 'admin'), nivel == 'admin'
+
+
+def _permissao(indice):
+    # nivel_compartilhado vem da anotação de ContaStreaming.objects.visiveis_para
+    return Campo(lambda linha, usuario: _permissoes(linha, usuario)[indice], ['proprietario_id', 'nivel_compartilhado'])
+
+
+# Campos de uma conta, aceitos em ?fields= (a senha nunca entra na listagem)
+CAMPOS_CONTA = CamposResposta({
+    'id': coluna('id'),
+    'nome': coluna('nome'),
+    'plataforma': coluna('plataforma'),
+    'plataforma_display': exibicao('plataforma', ContaStreaming.PLATAFORMAS_CHOICES),
+    'email': coluna('email'),
+    'usuario': coluna('usuario'),
+    'foto': arquivo('foto', ContaStreaming._meta.get_field('foto')),
+    'descricao': coluna('descricao'),
+    'status': coluna('status'),
+    'status_display': exibicao('status', ContaStreaming.STATUS_CHOICES),
+    'data_criacao': coluna('data_criacao'),
+    'data_expiracao': coluna('data_expiracao'),
+    'ultimo_acesso': coluna('ultimo_acesso'),
+    'proprietario': Campo(
+        lambda linha, usuario: {
+            'id': linha['proprietario__id'],
+            'nome': linha['proprietario__nome'],
+            'email': linha['proprietario__email'],
+        },
+        ['proprietario__id', 'proprietario__nome', 'proprietario__email'],
+    ),
+    'is_proprietario': _permissao(0),
+    'pode_editar': _permissao(1),
+    'pode_deletar': _permissao(2),
+})
+
+# Exportação: os campos da listagem e o nível de acesso do usuário em cada conta
+CAMPOS_EXPORTACAO = CamposResposta({
+    **CAMPOS_CONTA.campos,
+    'nivel_acesso': Campo(
+        lambda linha, usuario: 'proprietario' if linha['proprietario_id'] == usuario.id else linha['nivel_compartilhado'],
+        ['proprietario_id', 'nivel_compartilhado'],
+    ),
+})
+
+# Resposta do PUT (sem datas de criação/acesso nem permissões)
+CAMPOS_CONTA_ATUALIZADA = [
+    'id', 'nome', 'plataforma', 'plataforma_display', 'email', 'usuario', 'foto',
+    'descricao', 'status', 'status_display', 'data_expiracao',
+]
+
+# Situação de uma importação de CSV
+CAMPOS_IMPORTACAO = CamposResposta({
+    'id': coluna('id'),
+    'nome_arquivo': coluna('nome_arquivo'),
+    'status': coluna('status'),
+    'status_display': exibicao('status', ImportacaoStreaming.STATUS_CHOICES),
+    'progresso': Campo(
+        lambda linha, usuario: ImportacaoStreaming(
+            status=linha['status'],
+            tamanho_arquivo=linha['tamanho_arquivo'],
+            bytes_processados=linha['bytes_processados'],
+        ).progresso,
+        ['status', 'tamanho_arquivo', 'bytes_processados'],
+    ),
+    'linhas_processadas': coluna('linhas_processadas'),
+    'criadas': coluna('criadas'),
+    'falhas': coluna('falhas'),
+    'erros': coluna('erros'),
+    'mensagem': coluna('mensagem'),
+    'data_criacao': coluna('data_criacao'),
+    'data_atualizacao': coluna('data_atualizacao'),
+    'data_conclusao': coluna('data_conclusao'),
+})
@@ -0,0 +1,212 @@
+"""
+Sinais do app steam
+"""
+
+from collections import Counter
+
+from django.db import connections
+from django.db.models import Count
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from usuarios.models import Usuario
+
+from . import busca, resumo
+from .cache_listagem import criar_versao, invalidar_usuarios
+from .models import CompartilhamentoStreaming, ContaStreaming
+
+
+def _usuarios_da_conta(conta):
+    """Proprietário e todos os usuários com quem a conta é compartilhada"""
+    compartilhados = CompartilhamentoStreaming.objects.filter(conta_id=conta.pk).values_list('usuario_id', flat=True)
+    return {conta.proprietario_id, *compartilhados}
+
+
+@receiver(post_save, sender=ContaStreaming)
+@receiver(post_delete, sender=ContaStreaming)
+def invalidar_listagem_conta(sender, instance, **kwargs):
+    """Descarta a listagem em cache de quem vê a conta"""
+    invalidar_usuarios(_usuarios_da_conta(instance))
+
+
+@receiver(post_save, sender=CompartilhamentoStreaming)
+@receiver(post_delete, sender=CompartilhamentoStreaming)
+def invalidar_listagem_compartilhamento(sender, instance, **kwargs):
+    invalidar_usuarios([instance.usuario_id])
+
+
+@receiver(m2m_changed, sender=ContaStreaming.compartilhado_com.through)
+def invalidar_listagem_compartilhado_com(sender, instance, action, reverse, pk_set, **kwargs):
+    """add/remove/clear em compartilhado_com não disparam post_save/post_delete"""
+    if not action.startswith('post_') and action != 'pre_clear':
+        return
+    if reverse:
+        # usuario.contas_compartilhadas.remove(...): instance é o usuário
+        invalidar_usuarios([instance.pk])
+    elif action == 'pre_clear':
+        # Depois do clear não há mais como saber com quem estava compartilhada
+        invalidar_usuarios(_usuarios_da_conta(instance))
+    elif action != 'post_clear':
+        invalidar_usuarios(pk_set or ())
+
+
+@receiver(post_save, sender=Usuario)
+def invalidar_listagem_proprietario(sender, instance, created, **kwargs):
+    """
+    Nome e email do proprietário aparecem na listagem de quem vê as contas
+    dele. Um usuário novo também recebe versão nova (ids podem ser reusados).
+    """
+    if created:
+        criar_versao(instance.pk)
+        invalidar_usuarios([instance.pk])
+        return
+    compartilhados = CompartilhamentoStreaming.objects.filter(
+        conta__proprietario_id=instance.pk
+    ).values_list('usuario_id', flat=True)
+    invalidar_usuarios({instance.pk, *compartilhados})
+
+
+# Resumo do cofre (ver steam.resumo)
+
+def _estado_resumo(conta):
+    """Valores de CAMPOS_RESUMO da instância, ou None se algum foi adiado"""
+    valores = conta.__dict__
+    if any(campo not in valores for campo in resumo.CAMPOS_RESUMO):
+        return None
+    return tuple(valores[campo] for campo in resumo.CAMPOS_RESUMO)
+
+
+@receiver(post_init, sender=ContaStreaming)
+def guardar_estado_resumo(sender, instance, **kwargs):
+    """Guarda os valores carregados para calcular a diferença no save"""
+    instance._estado_resumo = _estado_resumo(instance)
+
+
+def _compartilhamentos_da_conta(conta_id):
+    return CompartilhamentoStreaming.objects.filter(conta_id=conta_id).values_list('usuario_id', flat=True)
+
+
+def _deltas_conta(conta_id, antes, depois):
+    """Diferença do resumo entre dois estados (tuplas de CAMPOS_RESUMO ou None)"""
+    deltas = resumo.diferenca(
+        resumo.chaves_conta(*antes) if antes else [],
+        resumo.chaves_conta(*depois) if depois else [],
+    )
+    # Compartilhamentos só contam em contas ativas: seguem o proprietário e o ativo
+    dono_antes, ativa_antes = (antes[0], antes[-1]) if antes else (None, False)
+    dono_depois, ativa_depois = (depois[0], depois[-1]) if depois else (None, False)
+    if conta_id and (dono_antes, ativa_antes) != (dono_depois, ativa_depois) and (ativa_antes or ativa_depois):
+        for usuario_id in _compartilhamentos_da_conta(conta_id):
+            deltas.subtract(resumo.chaves_compartilhamento(usuario_id, dono_antes, ativa_antes))
+            deltas.update(resumo.chaves_compartilhamento(usuario_id, dono_depois, ativa_depois))
+    return deltas
+
+
+@receiver(post_save, sender=ContaStreaming)
+def atualizar_resumo_conta(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not {'plataforma', 'status', 'data_expiracao', 'ativo', 'proprietario'} & set(update_fields):
+        return
+    depois = _estado_resumo(instance)
+    if created:
+        antes = None
+    else:
+        antes = instance._estado_resumo
+        if antes is None:
+            # Instância carregada com campos adiados: não há como saber o anterior
+            return
+    resumo.aplicar(_deltas_conta(None if created else instance.pk, antes, depois))
+    instance._estado_resumo = depois
+
+
+def _exclusao_de_usuario(origem):
+    """A exclusão veio de um usuário (ver atualizar_resumo_usuario_removido)"""
+    return isinstance(origem, Usuario) or getattr(origem, 'model', None) is Usuario
+
+
+@receiver(post_delete, sender=ContaStreaming)
+def atualizar_resumo_conta_removida(sender, instance, origin=None, **kwargs):
+    if _exclusao_de_usuario(origin):
+        return
+    # Os compartilhamentos (em cascata) já saíram do resumo no próprio post_delete
+    antes = instance._estado_resumo or _estado_resumo(instance)
+    if antes:
+        resumo.aplicar(resumo.diferenca(resumo.chaves_conta(*antes), []))
+
+
+def _conta_do_compartilhamento(compartilhamento):
+    """(proprietario_id, ativo) da conta, sem consulta se já estiver carregada"""
+    if CompartilhamentoStreaming.conta.is_cached(compartilhamento):
+        conta = compartilhamento.conta
+        return conta.proprietario_id, conta.ativo
+    return ContaStreaming.objects.filter(pk=compartilhamento.conta_id).values_list('proprietario_id', 'ativo').first()
+
+
+@receiver(post_save, sender=CompartilhamentoStreaming)
+def atualizar_resumo_compartilhamento(sender, instance, created, **kwargs):
+    if not created:
+        return
+    proprietario_id, ativa = _conta_do_compartilhamento(instance)
+    resumo.aplicar(Counter(resumo.chaves_compartilhamento(instance.usuario_id, proprietario_id, ativa)))
+
+
+@receiver(post_delete, sender=CompartilhamentoStreaming)
+def atualizar_resumo_compartilhamento_removido(sender, instance, origin=None, **kwargs):
+    if _exclusao_de_usuario(origin):
+        return
+    conta = _conta_do_compartilhamento(instance)
+    if conta:
+        resumo.aplicar(resumo.diferenca(resumo.chaves_compartilhamento(instance.usuario_id, *conta), []))
+
+
+@receiver(m2m_changed, sender=ContaStreaming.compartilhado_com.through)
+def atualizar_resumo_compartilhado_com(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    add() grava a tabela intermediária com bulk_create, sem post_save;
+    remove() e clear() passam pelo post_delete de cada compartilhamento
+    """
+    if action != 'post_add' or not pk_set:
+        return
+    deltas = Counter()
+    if reverse:
+        contas = ContaStreaming.objects.filter(pk__in=pk_set).values_list('proprietario_id', 'ativo')
+        for proprietario_id, ativa in contas:
+            deltas.update(resumo.chaves_compartilhamento(instance.pk, proprietario_id, ativa))
+    else:
+        for usuario_id in pk_set:
+            deltas.update(resumo.chaves_compartilhamento(usuario_id, instance.proprietario_id, instance.ativo))
+    resumo.aplicar(deltas)
+
+
+@receiver(pre_delete, sender=Usuario)
+def atualizar_resumo_usuario_removido(sender, instance, **kwargs):
+    """
+    Excluir um usuário apaga em cascata as contas, os compartilhamentos e
+    as linhas de resumo dele. Em vez de uma diferença por objeto, os
+    compartilhamentos que afetam outros usuários saem em duas agregações.
+    """
+    deltas = Counter()
+    # Contas dele compartilhadas com outros
+    recebidos = (
+        CompartilhamentoStreaming.objects.filter(conta__proprietario_id=instance.pk, conta__ativo=True)
+        .order_by().values('usuario_id').annotate(n=Count('id'))
+    )
+    for linha in recebidos:
+        deltas[(linha['usuario_id'], 'compartilhadas_entrada', '')] -= linha['n']
+    # Contas de outros compartilhadas com ele
+    feitos = (
+        CompartilhamentoStreaming.objects.filter(usuario_id=instance.pk, conta__ativo=True)
+        .order_by().values('conta__proprietario_id').annotate(n=Count('id'))
+    )
+    for linha in feitos:
+        deltas[(linha['conta__proprietario_id'], 'compartilhamentos_saida', '')] -= linha['n']
+    resumo.aplicar(deltas)
+
+
+@receiver(post_migrate)
+def garantir_busca_textual(sender, app_config, using, **kwargs):
+    """
+    Uma migração que recria steam_contastreaming no SQLite e não refaz a
+    busca textual (como a 0005 faz) deixaria as contas novas fora dela
+    """
+    if app_config.name == 'steam':
+        busca.garantir_triggers_sqlite(connections[using])
@@ -1,19 +1,47 @@
-from django.test import TestCase, Client
+from django.conf import settings
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth.hashers import make_password
 from django.utils import timezone
 from datetime import date, timedelta
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from io import StringIO
+import csv
+import gzip
 import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
 
-from .models import ContaStreaming, CompartilhamentoStreaming, HistoricoAcesso
+from .models import (
+    CompartilhamentoStreaming, ContaStreaming, HistoricoAcesso, ImportacaoStreaming, ResumoCofre, VersaoListagem,
+)
+from . import busca, resumo
+from . import importacao as modulo_importacao
+from .importacao import resolver_plataforma
+from . import cache_listagem
+from usuarios import metricas
 from usuarios.models import Usuario
 
 
+@override_settings(QUERY_INSPECTOR_MODE='raise')
 class SteamAppTestCase(TestCase):
     """Testes para o app steam"""
     
     def setUp(self):
         """Configuração inicial para os testes"""
+        # Contadores do rate limit e versões da listagem não passam de um teste para outro
+        cache.clear()
+        
         # Criar usuários de teste
         self.admin = Usuario.objects.create(
             nome="Admin Teste",
@@ -479,6 +507,74 @@ class SteamAPITest(SteamAppTestCase):
         self.assertIn('expirado', status_list)
 
 
+    def test_listar_contas_compartilhadas_com_permissoes(self):
+        """Contas compartilhadas trazem as permissões do nível de acesso"""
+        for i, nivel in enumerate(['leitura', 'acesso', 'admin']):
+            conta = ContaStreaming.objects.create(
+                nome=f'Compartilhada {nivel}',
+                plataforma='hbo',
+                email=f'compartilhada{i}@teste.com',
+                senha='senha123',
+                proprietario=self.gerente
+            )
+            conta.adicionar_compartilhamento(self.admin, nivel)
+        
+        response = self.client.get(reverse('steam:streaming_list_create'))
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        permissoes = {
+            conta['nome']: (conta['is_proprietario'], conta['pode_editar'], conta['pode_deletar'])
+            for conta in data
+        }
+        self.assertEqual(permissoes['Netflix Premium'], (True, True, True))
+        self.assertEqual(permissoes['Compartilhada leitura'], (False, False, False))
+        self.assertEqual(permissoes['Compartilhada acesso'], (False, True, False))
+        self.assertEqual(permissoes['Compartilhada admin'], (False, True, True))
+        self.assertNotIn('Disney+ Family', permissoes)
+        # Mais recentes primeiro
+        self.assertEqual(data[0]['nome'], 'Compartilhada admin')
+    
+    def test_listar_contas_paginadas(self):
+        """A listagem aceita limit e devolve cursores opacos"""
+        conta = ContaStreaming.objects.create(
+            nome='Compartilhada', plataforma='hbo', email='pag@teste.com',
+            senha='senha123', proprietario=self.gerente
+        )
+        conta.adicionar_compartilhamento(self.admin, 'leitura')
+        
+        response = self.client.get(reverse('steam:streaming_list_create'), {'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        pagina = response.json()
+        self.assertEqual([c['nome'] for c in pagina['resultados']], ['Compartilhada'])
+        self.assertIsNotNone(pagina['proximo'])
+        
+        response = self.client.get(
+            reverse('steam:streaming_list_create'), {'limit': 1, 'cursor': pagina['proximo']}
+        )
+        pagina = response.json()
+        self.assertEqual([c['nome'] for c in pagina['resultados']], ['Netflix Premium'])
+        self.assertIsNone(pagina['proximo'])
+        self.assertIsNotNone(pagina['anterior'])
+    
+    def test_listar_contas_dentro_do_orcamento(self):
+        """A listagem não faz uma consulta por conta (N+1)"""
+        for i in range(4):
+            ContaStreaming.objects.create(
+                nome=f'Conta Extra {i}',
+                plataforma='netflix',
+                email=f'extra{i}@teste.com',
+                senha='senha123',
+                proprietario=self.admin
+            )
+        
+        response = self.client.get(reverse('steam:streaming_list_create'))
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(len(response.json()), 5)
+
+
+@override_settings(QUERY_INSPECTOR_MODE='raise')
 class SteamAPIAuthenticationTest(TestCase):
     """Testes de autenticação para as APIs do steam"""
     
@@ -715,3 +811,954 @@ class SteamIntegrationTest(SteamAppTestCase):
         
         acessos_admin = HistoricoAcesso.objects.filter(usuario=self.admin)
         self.assertEqual(acessos_admin.count(), 2)
+
+
+@override_settings(QUERY_INSPECTOR_MODE='raise')
+class SteamFiltrosTest(SteamAppTestCase):
+    """Testes para filtros e ordenação da listagem de contas"""
+    
+    def setUp(self):
+        super().setUp()
+        self.conta_hbo = ContaStreaming.objects.create(
+            nome="HBO Antiga",
+            plataforma="hbo",
+            email="admin@hbo.com",
+            senha="Hbo123!",
+            status="expirado",
+            data_expiracao=date.today() - timedelta(days=10),
+            ultimo_acesso=timezone.now() - timedelta(days=2),
+            proprietario=self.admin
+        )
+        self.conta_prime = ContaStreaming.objects.create(
+            nome="Prime",
+            plataforma="prime",
+            email="admin@prime.com",
+            senha="Prime123!",
+            ultimo_acesso=timezone.now(),
+            proprietario=self.admin
+        )
+        self.conta_disney.adicionar_compartilhamento(self.admin, 'leitura')
+    
+    def _nomes(self, **params):
+        response = self.client.get(reverse('steam:streaming_list_create'), params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        if isinstance(data, dict):
+            data = data['resultados']
+        return [conta['nome'] for conta in data]
+    
+    def test_filtros(self):
+        """Plataforma, status, expiração e escopo são filtrados no servidor"""
+        self.assertEqual(self._nomes(plataforma='hbo'), ['HBO Antiga'])
+        self.assertEqual(self._nomes(status='expirado'), ['HBO Antiga'])
+        self.assertEqual(self._nomes(expira_antes=date.today().isoformat()), ['HBO Antiga'])
+        self.assertEqual(self._nomes(escopo='compartilhados'), ['Disney+ Family'])
+        self.assertNotIn('Disney+ Family', self._nomes(escopo='proprios'))
+    
+    def test_filtro_invalido(self):
+        """Valores desconhecidos respondem 400"""
+        for params in [{'plataforma': 'xpto'}, {'expira_antes': 'ontem'}, {'escopo': 'alheios'}, {'ordenar': 'senha'}]:
+            response = self.client.get(reverse('steam:streaming_list_create'), params)
+            self.assertEqual(response.status_code, 400, params)
+    
+    def test_fields_limita_colunas_e_relacoes(self):
+        """?fields= reduz o SELECT e as chaves; o proprietário só é juntado se pedido"""
+        self.conta_disney.adicionar_compartilhamento(self.admin, 'leitura')
+        url = reverse('steam:streaming_list_create')
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, {'fields': 'id,nome,plataforma'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [sorted(conta) for conta in response.json()],
+            [['id', 'nome', 'plataforma']] * len(response.json()),
+        )
+        sql = consultas[-1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"descricao"', sql)
+        
+        contas = self.client.get(url, {'fields': 'nome,proprietario,pode_editar'}).json()
+        disney = next(conta for conta in contas if conta['nome'] == 'Disney+ Family')
+        self.assertEqual(disney['proprietario']['nome'], 'Gerente Teste')
+        self.assertFalse(disney['pode_editar'])
+        
+        response = self.client.get(url, {'fields': 'id,senha'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_listagem_em_fluxo(self):
+        """?stream=1 devolve o mesmo array, escrito aos pedaços"""
+        self.conta_disney.adicionar_compartilhamento(self.admin, 'leitura')
+        url = reverse('steam:streaming_list_create')
+        response = self.client.get(url, {'stream': '1', 'ordenar': 'nome'})
+        self.assertTrue(response.streaming)
+        em_fluxo = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(em_fluxo, self.client.get(url, {'ordenar': 'nome'}).json())
+        self.assertIn('Disney+ Family', [conta['nome'] for conta in em_fluxo])
+        
+        response = self.client.get(url, {'stream': '1', 'cursor': 'x'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_ordenar_por_ultimo_acesso_com_nulos_no_fim(self):
+        """Contas nunca acessadas ficam no fim, inclusive entre páginas"""
+        esperado = ['Prime', 'HBO Antiga', 'Disney+ Family', 'Netflix Premium']
+        self.assertEqual(self._nomes(ordenar='-ultimo_acesso'), esperado)
+        
+        nomes = []
+        pagina = self.client.get(
+            reverse('steam:streaming_list_create'), {'ordenar': '-ultimo_acesso', 'limit': 1}
+        ).json()
+        while True:
+            nomes.extend(conta['nome'] for conta in pagina['resultados'])
+            if not pagina['proximo']:
+                break
+            pagina = self.client.get(
+                reverse('steam:streaming_list_create'),
+                {'ordenar': '-ultimo_acesso', 'limit': 1, 'cursor': pagina['proximo']}
+            ).json()
+        self.assertEqual(nomes, esperado)
+        
+        # E de volta a partir da última página
+        anterior = self.client.get(
+            reverse('steam:streaming_list_create'),
+            {'ordenar': '-ultimo_acesso', 'limit': 2, 'cursor': pagina['anterior']}
+        ).json()
+        self.assertEqual([conta['nome'] for conta in anterior['resultados']], esperado[1:3])
+    
+    def test_plano_usa_indices(self):
+        """EXPLAIN QUERY PLAN usa um índice composto para cada filtro"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Verificação de plano específica do SQLite')
+        
+        casos = {
+            'steam_conta_prop_plat_idx': {'plataforma': 'hbo'},
+            'steam_conta_prop_status_idx': {'status': 'expirado'},
+            'steam_conta_prop_expira_idx': {'expira_antes': date.today()},
+        }
+        for indice, filtros in casos.items():
+            contas = ContaStreaming.objects.listagem(
+                self.admin, escopo='proprios', **filtros
+            )
+            plano = contas.explain()
+            self.assertIn(indice, plano, f'{filtros}: {plano}')
+        
+        contas = ContaStreaming.objects.listagem(
+            self.admin, escopo='proprios'
+        ).order_by('-ultimo_acesso', '-id')
+        plano = contas.explain()
+        self.assertIn('steam_conta_prop_acesso_idx', plano, plano)
+    
+    def test_plano_demais_consultas_usa_indices(self):
+        """Filtros já na ordem padrão, compartilhadas e histórico usam os índices compostos"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Verificação de plano específica do SQLite')
+        
+        planos = {
+            'steam_conta_prop_plat_idx': ContaStreaming.objects.listagem(
+                self.admin, escopo='proprios', plataforma='hbo'
+            ),
+            'steam_conta_prop_status_idx': ContaStreaming.objects.listagem(
+                self.admin, escopo='proprios', status='expirado'
+            ),
+            'steam_comp_usuario_conta_idx': CompartilhamentoStreaming.objects.filter(usuario=self.admin).values('conta'),
+            'steam_hist_conta_data_idx': HistoricoAcesso.objects.filter(conta=self.conta_netflix),
+            'steam_hist_usuario_data_idx': HistoricoAcesso.objects.filter(usuario=self.admin),
+        }
+        for indice, consulta in planos.items():
+            plano = consulta.explain()
+            self.assertIn(indice, plano, plano)
+            self.assertNotIn('TEMP B-TREE', plano, plano)
+        
+        # Visíveis: o lado das compartilhadas também usa o índice (usuario, conta)
+        plano = ContaStreaming.objects.visiveis_para(self.admin).explain()
+        self.assertIn('steam_comp_usuario_conta_idx', plano, plano)
+    
+    def test_plano_escopo_todos_usa_indices(self):
+        """No escopo padrão as próprias vêm do índice composto, já em ordem, e são intercaladas às compartilhadas"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Verificação de plano específica do SQLite')
+        
+        casos = {
+            'steam_conta_prop_plat_idx': {'plataforma': 'hbo'},
+            'steam_conta_prop_status_idx': {'status': 'expirado'},
+        }
+        for indice, filtros in casos.items():
+            plano = ContaStreaming.objects.listagem(self.admin, **filtros).explain()
+            self.assertIn('MERGE (UNION ALL)', plano, plano)
+            proprias, compartilhadas = plano.split('RIGHT')
+            self.assertIn(indice, proprias, plano)
+            self.assertNotIn('TEMP B-TREE', proprias, plano)
+            self.assertNotIn('MULTI-INDEX OR', plano, plano)
+            self.assertIn('steam_comp_usuario_conta_idx', compartilhadas, plano)
+    
+    def test_listagem_equivale_a_visiveis_para(self):
+        """O escopo padrão devolve as mesmas contas, na mesma ordem, que visiveis_para filtrado"""
+        for filtros in [{}, {'plataforma': 'disney'}, {'status': 'ativo'}]:
+            esperado = list(
+                ContaStreaming.objects.visiveis_para(self.admin).filter(**filtros)
+                .values_list('nome', 'nivel_compartilhado')
+            )
+            obtido = [
+                (conta['nome'], conta['nivel_compartilhado'])
+                for conta in ContaStreaming.objects.listagem(self.admin, **filtros).values('nome', 'nivel_compartilhado', 'data_criacao', 'id')
+            ]
+            self.assertEqual(obtido, esperado, filtros)
+            self.assertTrue(esperado, filtros)
+
+
+@override_settings(QUERY_INSPECTOR_MODE='raise')
+class SteamBuscaTest(SteamAppTestCase):
+    """Testes para a busca textual de contas"""
+    
+    def setUp(self):
+        super().setUp()
+        self.conta_filmes = ContaStreaming.objects.create(
+            nome="Filmes da Família",
+            plataforma="prime",
+            email="familia@prime.com",
+            descricao="Conta para filmes e séries",
+            senha="Prime123!",
+            proprietario=self.admin
+        )
+    
+    def _buscar(self, **params):
+        response = self.client.get(reverse('steam:streaming_busca'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def _nomes(self, q):
+        return [conta['nome'] for conta in self._buscar(q=q)['resultados']]
+    
+    def test_busca_por_prefixo_em_varios_campos(self):
+        """Termos casam por prefixo em nome, descrição, email e usuário"""
+        self.assertEqual(self._nomes('Netfl'), ['Netflix Premium'])
+        self.assertEqual(self._nomes('series'), ['Filmes da Família'])
+        self.assertEqual(self._nomes('admin_user'), ['Netflix Premium'])
+        self.assertEqual(self._nomes('familia prime'), ['Filmes da Família'])
+    
+    def test_busca_respeita_visibilidade(self):
+        """Contas de outros usuários só aparecem se compartilhadas"""
+        self.assertEqual(self._nomes('Disney'), [])
+        self.conta_disney.adicionar_compartilhamento(self.admin, 'leitura')
+        self.assertEqual(self._nomes('Disney'), ['Disney+ Family'])
+    
+    def test_indice_acompanha_alteracoes(self):
+        """Renomear ou desativar uma conta atualiza a busca"""
+        self.conta_netflix.nome = 'Streaming Principal'
+        self.conta_netflix.save()
+        self.assertEqual(self._nomes('Principal'), ['Streaming Principal'])
+        
+        self.conta_netflix.ativo = False
+        self.conta_netflix.save()
+        self.assertEqual(self._nomes('Principal'), [])
+    
+    def test_ranking_e_paginacao(self):
+        """Resultados mais relevantes primeiro, paginados por offset"""
+        ContaStreaming.objects.create(
+            nome="Filmes Filmes Filmes", plataforma="hbo", email="x@hbo.com",
+            descricao="filmes", senha="Hbo123!", proprietario=self.admin
+        )
+        pagina = self._buscar(q='filmes', limit=1)
+        self.assertEqual([c['nome'] for c in pagina['resultados']], ['Filmes Filmes Filmes'])
+        self.assertEqual(pagina['proximo'], 1)
+        
+        pagina = self._buscar(q='filmes', limit=1, offset=1)
+        self.assertEqual([c['nome'] for c in pagina['resultados']], ['Filmes da Família'])
+        self.assertIsNone(pagina['proximo'])
+        self.assertEqual(pagina['anterior'], 0)
+    
+    def test_caracteres_especiais(self):
+        """Aspas e operadores do FTS5 na busca não quebram a consulta"""
+        self.assertEqual(self._nomes('"Netflix" (*'), ['Netflix Premium'])
+        response = self.client.get(reverse('steam:streaming_busca'), {'q': ''})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_post_migrate_recria_triggers(self):
+        """Triggers descartados por uma recriação da tabela voltam ao fim do migrate"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Triggers FTS5 só existem no SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER steam_contastreaming_fts_ai')
+        ContaStreaming.objects.create(
+            nome="Sem Trigger", plataforma="hbo", email="sem@hbo.com", senha="Hbo123!", proprietario=self.admin
+        )
+        self.assertEqual(self._nomes('Trigger'), [])
+        
+        emit_post_migrate_signal(0, False, 'default')
+        # Reindexada a conta criada sem o trigger, e os novos INSERTs voltam a entrar
+        self.assertEqual(self._nomes('Trigger'), ['Sem Trigger'])
+        ContaStreaming.objects.create(
+            nome="Com Trigger", plataforma="hbo", email="com@hbo.com", senha="Hbo123!", proprietario=self.admin
+        )
+        self.assertEqual(sorted(self._nomes('Trigger')), ['Com Trigger', 'Sem Trigger'])
+        self.assertEqual(busca.garantir_triggers_sqlite(connection), [])
+
+
+
+@override_settings(QUERY_INSPECTOR_MODE='raise')
+class SteamCondicionalTest(SteamAppTestCase):
+    """Testes para ETag, Last-Modified e respostas 304"""
+    
+    def _get(self, url, **headers):
+        return self.client.get(url, headers=headers)
+    
+    def test_listagem_responde_304(self):
+        """Mesmo ETag responde 304 sem corpo; alterar a conta gera outro"""
+        url = reverse('steam:streaming_list_create')
+        response = self._get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        self.assertFalse(etag.startswith('W/'))
+        
+        response = self._get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        
+        self.conta_netflix.nome = 'Netflix Família'
+        self.conta_netflix.save()
+        response = self._get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_etag_depende_da_query_string(self):
+        url = reverse('steam:streaming_list_create')
+        etag = self._get(url)['ETag']
+        self.assertNotEqual(self._get(url + '?plataforma=netflix')['ETag'], etag)
+        self.assertEqual(self._get(url + '?plataforma=disney', if_none_match=etag).status_code, 200)
+    
+    def test_compartilhamento_muda_etag(self):
+        """Novo compartilhamento e mudança de nível invalidam o ETag"""
+        url = reverse('steam:streaming_list_create')
+        etag = self._get(url)['ETag']
+        
+        compartilhamento = self.conta_disney.adicionar_compartilhamento(self.admin, 'leitura')
+        response = self._get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        
+        compartilhamento.nivel_acesso = 'admin'
+        compartilhamento.save()
+        response = self._get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        
+        compartilhamento.delete()
+        self.assertEqual(self._get(url, if_none_match=response['ETag']).status_code, 200)
+    
+    def test_desativar_conta_antiga_muda_etag(self):
+        """Desativar uma conta que não é a última alterada também invalida"""
+        conta_hbo = ContaStreaming.objects.create(
+            nome="HBO", plataforma="hbo", email="admin@hbo.com", senha="Hbo123!", proprietario=self.admin
+        )
+        # Last-Modified tem resolução de segundos: a versão atual fica no passado
+        VersaoListagem.objects.filter(usuario=self.admin).update(data_atualizacao=timezone.now() - timedelta(hours=1))
+        url = reverse('steam:streaming_list_create')
+        response = self._get(url)
+        etag, desde = response['ETag'], response['Last-Modified']
+        self.assertEqual(self._get(url, if_modified_since=desde).status_code, 304)
+        
+        self.conta_netflix.ativo = False
+        self.conta_netflix.save()
+        self.assertEqual(self._get(url, if_modified_since=desde).status_code, 200)
+        response = self._get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([conta['nome'] for conta in response.json()], [conta_hbo.nome])
+    
+    def test_renomear_proprietario_muda_etag(self):
+        """O nome do proprietário aparece no corpo de quem vê a conta"""
+        self.conta_disney.adicionar_compartilhamento(self.admin, 'leitura')
+        url = reverse('steam:streaming_list_create')
+        detalhe = reverse('steam:streaming_detail', args=[self.conta_disney.id])
+        etag, etag_detalhe = self._get(url)['ETag'], self._get(detalhe)['ETag']
+        
+        self.gerente.nome = 'Gerente Renomeado'
+        self.gerente.save()
+        self.assertEqual(self._get(url, if_none_match=etag).status_code, 200)
+        response = self._get(detalhe, if_none_match=etag_detalhe)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['proprietario']['nome'], 'Gerente Renomeado')
+    
+    def test_detalhe_condicional(self):
+        """304 no GET da conta e 412 em PUT com If-Match desatualizado"""
+        url = reverse('steam:streaming_detail', args=[self.conta_netflix.id])
+        etag = self._get(url)['ETag']
+        self.assertEqual(self._get(url, if_none_match=etag).status_code, 304)
+        
+        self.conta_netflix.atualizar_ultimo_acesso()
+        response = self.client.put(url, data=json.dumps({'nome': 'Outro'}),
+                                   content_type='application/json', headers={'if_match': etag})
+        self.assertEqual(response.status_code, 412)
+        
+        etag = self._get(url)['ETag']
+        response = self.client.put(url, data=json.dumps({'nome': 'Outro'}),
+                                   content_type='application/json', headers={'if_match': etag})
+        self.assertEqual(response.status_code, 200)
+    
+    def test_conta_sem_permissao_sem_etag(self):
+        url = reverse('steam:streaming_detail', args=[self.conta_disney.id])
+        response = self._get(url)
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('ETag', response)
+
+
+@override_settings(QUERY_INSPECTOR_MODE='raise', STREAMING_CACHE_TTL=300)
+class SteamCacheListagemTest(SteamAppTestCase):
+    """Testes para o cache versionado da listagem de contas"""
+    
+    def setUp(self):
+        super().setUp()
+        metricas.registro.zerar()
+    
+    def _nomes(self):
+        response = self.client.get(reverse('steam:streaming_list_create'))
+        self.assertEqual(response.status_code, 200)
+        return sorted(conta['nome'] for conta in response.json())
+    
+    def _contador(self, resultado):
+        for nome, rotulos, valor in metricas.registro.instantaneo()['contadores']:
+            if nome == 'cache_listagem_contas_total' and rotulos == {'resultado': resultado}:
+                return valor
+        return 0
+    
+    def test_segunda_leitura_vem_do_cache(self):
+        self.assertEqual(self._nomes(), ['Netflix Premium'])
+        with self.assertNumQueries(3):
+            # Sessão, usuário e a versão do ETag; a listagem não é consultada
+            self.assertEqual(self._nomes(), ['Netflix Premium'])
+        self.assertEqual(self._contador('falha'), 1)
+        self.assertEqual(self._contador('acerto'), 1)
+    
+    def test_alteracoes_de_outros_usuarios_invalidam(self):
+        """Mudanças na conta, no compartilhamento e no proprietário chegam a quem a vê"""
+        self.assertEqual(self._nomes(), ['Netflix Premium'])
+        
+        self.conta_disney.adicionar_compartilhamento(self.admin, 'leitura')
+        self.assertEqual(self._nomes(), ['Disney+ Family', 'Netflix Premium'])
+        
+        self.conta_disney.nome = 'Disney+ Kids'
+        self.conta_disney.save()
+        self.assertEqual(self._nomes(), ['Disney+ Kids', 'Netflix Premium'])
+        
+        self.gerente.nome = 'Gerente Renomeado'
+        self.gerente.save()
+        response = self.client.get(reverse('steam:streaming_list_create'))
+        proprietarios = {conta['nome']: conta['proprietario']['nome'] for conta in response.json()}
+        self.assertEqual(proprietarios['Disney+ Kids'], 'Gerente Renomeado')
+        
+        self.conta_disney.remover_compartilhamento(self.admin)
+        self.assertEqual(self._nomes(), ['Netflix Premium'])
+    
+    def test_alteracao_em_outro_worker(self):
+        """Cada worker com o seu cache local: a versão no banco invalida todos"""
+        from django.core.cache.backends.locmem import LocMemCache
+        worker_a = LocMemCache('worker-a', {})
+        worker_b = LocMemCache('worker-b', {})
+        url = reverse('steam:streaming_list_create')
+        
+        with mock.patch.object(cache_listagem, 'cache', worker_a):
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self._nomes(), ['Netflix Premium'])
+            self.assertEqual(self._contador('acerto'), 1)
+        
+        with mock.patch.object(cache_listagem, 'cache', worker_b):
+            self.conta_netflix.nome = 'Netflix Outro Worker'
+            self.conta_netflix.save()
+            self.assertEqual(self._nomes(), ['Netflix Outro Worker'])
+        
+        with mock.patch.object(cache_listagem, 'cache', worker_a):
+            response = self.client.get(url, headers={'if_none_match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([conta['nome'] for conta in response.json()], ['Netflix Outro Worker'])
+    
+    @override_settings(STREAMING_CACHE_TTL=0)
+    def test_cache_desativado(self):
+        self._nomes()
+        self._nomes()
+        self.assertEqual(self._contador('acerto') + self._contador('falha'), 0)
+
+
+@override_settings(QUERY_INSPECTOR_MODE='raise', STREAMING_CACHE_TTL=300)
+class SteamLoteTest(SteamAppTestCase):
+    """Testes para a criação de contas em lote"""
+    
+    def _enviar(self, itens):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('steam:streaming_lote'), data=json.dumps(itens), content_type='application/json')
+    
+    def _item(self, i, **extra):
+        return {'nome': f'Conta {i}', 'plataforma': 'hbo', 'email': f'lote{i}@hbo.com', 'senha': 'Lote123!', **extra}
+    
+    def test_cria_todas_em_consultas_constantes(self):
+        """Vinte contas com o mesmo número de consultas de uma"""
+        self.client.get(reverse('steam:streaming_list_create'))  # popula o cache
+        
+        response = self._enviar([self._item(i) for i in range(20)])
+        self.assertEqual(response.status_code, 201)
+        dados = response.json()
+        self.assertEqual((dados['criadas'], dados['falhas']), (20, 0))
+        self.assertEqual([r['indice'] for r in dados['resultados']], list(range(20)))
+        
+        conta = ContaStreaming.objects.get(id=dados['resultados'][0]['conta']['id'])
+        self.assertNotEqual(conta.senha, 'Lote123!')
+        self.assertTrue(conta.verificar_senha('Lote123!'))
+        
+        # Listagem em cache invalidada e busca textual atualizada
+        nomes = [c['nome'] for c in self.client.get(reverse('steam:streaming_list_create')).json()]
+        self.assertIn('Conta 19', nomes)
+        busca = self.client.get(reverse('steam:streaming_busca'), {'q': 'lote7'}).json()
+        self.assertEqual([c['nome'] for c in busca['resultados']], ['Conta 7'])
+    
+    @override_settings(PASSWORD_HASHERS=['usuarios.hashers.PBKDF2Ajustado'], PBKDF2_ITERACOES=1000)
+    def test_lote_grande_dentro_do_orcamento(self):
+        """O INSERT dividido em vários lotes pelo banco conta como uma consulta"""
+        with CaptureQueriesContext(connection) as consultas:
+            response = self._enviar([self._item(i) for i in range(200)])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['criadas'], 200)
+        inserts = [c for c in consultas if c['sql'].startswith('INSERT INTO "steam_contastreaming"')]
+        if connection.vendor == 'sqlite':
+            self.assertGreater(len(inserts), 1)
+        self.assertEqual(ContaStreaming.objects.filter(email__startswith='lote').count(), 200)
+
+    def test_falha_parcial(self):
+        """Inválidos e duplicados (no banco e no próprio lote) falham sozinhos"""
+        response = self._enviar([
+            self._item(1),
+            self._item(2, senha=''),
+            {'nome': 'Repetida', 'plataforma': 'netflix', 'email': 'admin@netflix.com', 'senha': 'Netflix123!'},
+            self._item(1, nome='Mesma chave'),
+            self._item(3, plataforma='orkut'),
+            'não é objeto',
+        ])
+        self.assertEqual(response.status_code, 207)
+        resultados = response.json()['resultados']
+        self.assertEqual([r['status'] for r in resultados], [201, 400, 400, 400, 400, 400])
+        self.assertIn('Já existe uma conta com este email nesta plataforma', resultados[2]['erros'])
+        self.assertIn('Já existe uma conta com este email nesta plataforma', resultados[3]['erros'])
+        self.assertIn('Plataforma inválida', resultados[4]['erros'])
+        self.assertEqual(ContaStreaming.objects.filter(email__startswith='lote').count(), 1)
+
+    def test_itens_mal_formados_falham_sozinhos(self):
+        """Tipos errados e campos longos demais viram erros do item, não 500"""
+        response = self._enviar([
+            self._item(1),
+            self._item(2, email=123),
+            self._item(3, plataforma=['netflix']),
+            self._item(4, nome='x' * 300),
+            self._item(5, status={'ativo': True}),
+        ])
+        self.assertEqual(response.status_code, 207)
+        resultados = response.json()['resultados']
+        self.assertEqual([r['status'] for r in resultados], [201, 400, 400, 400, 400])
+        self.assertIn('email deve ser texto', resultados[1]['erros'])
+        self.assertIn('plataforma deve ser texto', resultados[2]['erros'])
+        self.assertTrue(resultados[3]['erros'][0].startswith('nome: '))
+        self.assertIn('status deve ser texto', resultados[4]['erros'])
+        self.assertEqual(ContaStreaming.objects.filter(email__startswith='lote').count(), 1)
+
+        response = self._alterar('patch', {'ids': [self.conta_netflix.id], 'alteracoes': {'status': ['ativo']}})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(API_LOTE_MAXIMO=2)
+    def test_lote_invalido(self):
+        self.assertEqual(self._enviar({'nome': 'x'}).status_code, 400)
+        self.assertEqual(self._enviar([]).status_code, 400)
+        self.assertEqual(self._enviar([self._item(i) for i in range(3)]).status_code, 400)
+        
+        response = self._enviar([self._item(1, email='invalido')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['falhas'], 1)
+    
+    def _alterar(self, metodo, dados):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, metodo)(
+                reverse('steam:streaming_lote'), data=json.dumps(dados), content_type='application/json'
+            )
+    
+    def test_alteracao_em_lote_respeita_permissoes(self):
+        """Ids sem permissão de edição ou inexistentes voltam em negadas"""
+        conta_hbo = ContaStreaming.objects.create(
+            nome="HBO", plataforma="hbo", email="gerente@hbo.com", senha="Hbo123!", proprietario=self.gerente
+        )
+        self.conta_disney.adicionar_compartilhamento(self.admin, 'acesso')
+        conta_hbo.adicionar_compartilhamento(self.admin, 'leitura')
+        antes = ContaStreaming.objects.get(pk=self.conta_disney.pk).data_atualizacao
+        
+        ids = [self.conta_netflix.id, self.conta_disney.id, conta_hbo.id, 99999]
+        response = self._alterar('patch', {'ids': ids, 'alteracoes': {'status': 'pendente', 'data_expiracao': '2030-01-31'}})
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json(), {
+            'atualizadas': [self.conta_netflix.id, self.conta_disney.id],
+            'negadas': [conta_hbo.id, 99999],
+        })
+        disney = ContaStreaming.objects.get(pk=self.conta_disney.pk)
+        self.assertEqual((disney.status, disney.data_expiracao), ('pendente', date(2030, 1, 31)))
+        self.assertGreater(disney.data_atualizacao, antes)
+        self.assertEqual(ContaStreaming.objects.get(pk=conta_hbo.pk).status, 'ativo')
+    
+    def test_desativacao_em_lote(self):
+        self.conta_disney.adicionar_compartilhamento(self.admin, 'acesso')
+        self.client.get(reverse('steam:streaming_list_create'))  # popula o cache
+        
+        response = self._alterar('delete', {'ids': [self.conta_netflix.id, self.conta_disney.id]})
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['desativadas'], [self.conta_netflix.id])
+        self.assertEqual(response.json()['negadas'], [self.conta_disney.id])
+        self.assertFalse(ContaStreaming.objects.get(pk=self.conta_netflix.pk).ativo)
+        
+        nomes = [c['nome'] for c in self.client.get(reverse('steam:streaming_list_create')).json()]
+        self.assertEqual(nomes, ['Disney+ Family'])
+        
+        response = self._alterar('delete', {'ids': [self.conta_disney.id]})
+        self.assertEqual(response.status_code, 403)
+    
+    def test_alteracao_em_lote_atomica(self):
+        """Se o resumo falhar, o update() é desfeito e o cache não é invalidado"""
+        versao = VersaoListagem.objects.get(usuario=self.admin).versao
+        with mock.patch.object(resumo, 'aplicar', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self._alterar('delete', {'ids': [self.conta_netflix.id]})
+        self.assertTrue(ContaStreaming.objects.get(pk=self.conta_netflix.pk).ativo)
+        self.assertEqual(VersaoListagem.objects.get(usuario=self.admin).versao, versao)
+    
+    def test_alteracao_em_lote_invalida(self):
+        self.assertEqual(self._alterar('patch', {'ids': 'todos', 'alteracoes': {'status': 'ativo'}}).status_code, 400)
+        self.assertEqual(self._alterar('patch', {'ids': [1], 'alteracoes': {'nome': 'x'}}).status_code, 400)
+        self.assertEqual(self._alterar('patch', {'ids': [1], 'alteracoes': {'status': 'banido'}}).status_code, 400)
+        self.assertEqual(self._alterar('delete', {'ids': []}).status_code, 400)
+
+
+@override_settings(
+    QUERY_INSPECTOR_MODE='raise', IMPORTACAO_ASSINCRONA=False, IMPORTACAO_LOTE=3,
+    MEDIA_ROOT=tempfile.gettempdir(),
+)
+class SteamImportacaoTest(SteamAppTestCase):
+    """Testes para a importação de contas por CSV"""
+    
+    CSV_BITWARDEN = (
+        '\ufefffolder,name,login_uri,login_username,login_password,notes\n'
+        ',Netflix,https://www.netflix.com/login,imp1@netflix.com,Senha123!,Sala\n'
+        ',Disney,https://www.disneyplus.com,imp2@disney.com,Senha123!,\n'
+        ',Sem senha,https://www.hulu.com,imp3@hulu.com,,\n'
+        ',Duplicada,netflix,admin@netflix.com,Senha123!,\n'
+        ',"Nota, com vírgula",https://www.spotify.com,imp4@spotify.com,Senha123!,"linha 1\nlinha 2"\n'
+        ',Desconhecida,https://exemplo.com,imp5@exemplo.com,Senha123!,\n'
+        ',Email ruim,https://www.tidal.com,nao-e-email,Senha123!,\n'
+    )
+    
+    def setUp(self):
+        super().setUp()
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio, ignore_errors=True)
+        self.armazenamento = FileSystemStorage(location=self.diretorio)
+        campo = ImportacaoStreaming._meta.get_field('arquivo')
+        patcher = mock.patch.object(campo, 'storage', self.armazenamento)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def _enviar(self, conteudo, mapa='bitwarden'):
+        arquivo = SimpleUploadedFile('export.csv', conteudo.encode('utf-8'), content_type='text/csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('steam:streaming_importacao_create'), {'arquivo': arquivo, 'mapa': mapa})
+    
+    def test_importa_em_lotes_com_erros_por_linha(self):
+        """Três lotes; inválidos e duplicados ficam nos erros com o número da linha"""
+        response = self._enviar(self.CSV_BITWARDEN)
+        self.assertEqual(response.status_code, 202)
+        
+        situacao = self.client.get(response['Location']).json()
+        self.assertEqual(situacao['status'], 'concluida')
+        self.assertEqual(situacao['progresso'], 100)
+        self.assertEqual((situacao['linhas_processadas'], situacao['criadas'], situacao['falhas']), (7, 4, 3))
+        self.assertEqual([erro['linha'] for erro in situacao['erros']], [4, 5, 9])
+        self.assertIn('Já existe uma conta com este email nesta plataforma', situacao['erros'][1]['erros'])
+        
+        contas = dict(ContaStreaming.objects.filter(email__startswith='imp').values_list('email', 'plataforma'))
+        self.assertEqual(contas, {
+            'imp1@netflix.com': 'netflix', 'imp2@disney.com': 'disney',
+            'imp4@spotify.com': 'spotify', 'imp5@exemplo.com': 'outros',
+        })
+        conta = ContaStreaming.objects.get(email='imp4@spotify.com')
+        self.assertEqual((conta.nome, conta.descricao), ('Nota, com vírgula', 'linha 1\nlinha 2'))
+        self.assertTrue(conta.verificar_senha('Senha123!'))
+        
+        # O CSV guardado é apagado ao final
+        importacao = ImportacaoStreaming.objects.get(id=situacao['id'])
+        self.assertFalse(importacao.arquivo)
+    
+    def test_csv_fora_de_media_e_apagado_em_qualquer_saida(self):
+        """O CSV fica no diretório privado e é apagado mesmo se o processamento for abortado"""
+        armazenamento = ImportacaoStreaming._meta.get_field('arquivo')._storage_callable()
+        self.assertFalse(os.path.abspath(armazenamento.location).startswith(os.path.abspath(settings.MEDIA_ROOT)))
+        
+        with mock.patch.object(modulo_importacao, 'processar', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self._enviar(self.CSV_BITWARDEN)
+        self.assertEqual(os.listdir(self.diretorio), [])
+    
+    def test_recuperar_importacoes_interrompidas(self):
+        """Importações paradas há mais que o limite falham e perdem o arquivo; as recentes seguem"""
+        parada = ImportacaoStreaming.objects.create(usuario=self.admin, status='processando', mapa={})
+        parada.arquivo.save('parada.csv', ContentFile(b'name\n'))
+        recente = ImportacaoStreaming.objects.create(usuario=self.admin, status='pendente', mapa={})
+        recente.arquivo.save('recente.csv', ContentFile(b'name\n'))
+        ImportacaoStreaming.objects.filter(pk=parada.pk).update(
+            data_atualizacao=timezone.now() - timedelta(hours=2)
+        )
+        # Arquivo antigo sem importação (processo morreu antes de gravá-la)
+        orfao = self.armazenamento.save('orfao.csv', ContentFile(b'name\n'))
+        antigo = time.time() - 7200
+        os.utime(self.armazenamento.path(orfao), (antigo, antigo))
+        
+        saida = StringIO()
+        call_command('recuperar_importacoes', tempo_limite=3600, stdout=saida)
+        self.assertIn('Importações interrompidas: 1', saida.getvalue())
+        
+        parada.refresh_from_db()
+        self.assertEqual(parada.status, 'falhou')
+        self.assertFalse(parada.arquivo)
+        self.assertIsNotNone(parada.data_conclusao)
+        recente.refresh_from_db()
+        self.assertEqual(recente.status, 'pendente')
+        self.assertEqual(os.listdir(self.diretorio), [os.path.basename(recente.arquivo.name)])
+    
+    def test_mapa_personalizado(self):
+        """Colunas e valores de plataforma definidos pelo usuário"""
+        csv_texto = 'titulo,servico,login,pw\nConta A,Tv da sala,a@tv.com,Senha123!\n'
+        mapa = json.dumps({
+            'colunas': {'nome': 'titulo', 'plataforma': 'servico', 'email': 'login', 'senha': 'pw'},
+            'plataformas': {'TV da sala': 'apple'},
+        })
+        response = self._enviar(csv_texto, mapa)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(ContaStreaming.objects.get(email='a@tv.com').plataforma, 'apple')
+    
+    def test_colunas_ausentes_e_mapa_invalido(self):
+        response = self._enviar('nome,email\nA,a@a.com\n', 'padrao')
+        situacao = self.client.get(response['Location']).json()
+        self.assertEqual(situacao['status'], 'falhou')
+        self.assertIn('senha', situacao['mensagem'])
+        
+        response = self._enviar('a\n1\n', json.dumps({'nome': 'a'}))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json()['erro'])
+        response = self._enviar('a\n1\n', 'keepass')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_importacao_de_outro_usuario(self):
+        response = self._enviar(self.CSV_BITWARDEN)
+        self.client.post(reverse('api_logout'))
+        self.client.post(reverse('api_login'), data=json.dumps({
+            'email': 'gerente@teste.com', 'senha': 'Gerente123!'
+        }), content_type='application/json')
+        self.assertEqual(self.client.get(response['Location']).status_code, 404)
+    
+    def test_resolver_plataforma(self):
+        self.assertEqual(resolver_plataforma('Disney+'), 'disney')
+        self.assertEqual(resolver_plataforma('https://play.hbomax.com'), 'hbo')
+        self.assertEqual(resolver_plataforma(''), 'outros')
+        self.assertEqual(resolver_plataforma('Globoplay', {'globoplay': 'outros'}), 'outros')
+    
+    def test_comando(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as arquivo:
+            arquivo.write(self.CSV_BITWARDEN.lstrip('\ufeff'))
+        self.addCleanup(os.remove, arquivo.name)
+        
+        saida = StringIO()
+        call_command('importar_contas', arquivo.name, email='gerente@teste.com', mapa='bitwarden', stdout=saida)
+        # A linha duplicada para o admin é nova para o gerente
+        self.assertIn('5 criadas, 2 com erro', saida.getvalue())
+        self.assertIn('linha 4:', saida.getvalue())
+        self.assertEqual(ContaStreaming.objects.filter(proprietario=self.gerente, email__startswith='imp').count(), 4)
+        self.assertEqual(ImportacaoStreaming.objects.get(usuario=self.gerente).status, 'concluida')
+
+
+@override_settings(QUERY_INSPECTOR_MODE='raise', API_STREAM_LOTE=10)
+class SteamExportacaoTest(SteamAppTestCase):
+    """Testes para a exportação em NDJSON e CSV"""
+    
+    def setUp(self):
+        super().setUp()
+        self.conta_disney.adicionar_compartilhamento(self.admin, 'acesso')
+        ContaStreaming.objects.bulk_create([
+            ContaStreaming(nome=f'Export {i}', plataforma='hbo', email=f'export{i}@hbo.com', senha='x', proprietario=self.admin)
+            for i in range(25)
+        ])
+    
+    def _exportar(self, **params):
+        response = self.client.get(reverse('steam:streaming_exportar'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response
+    
+    def test_ndjson_em_uma_consulta(self):
+        """27 linhas em lotes de 10 com uma única consulta, sem senhas"""
+        response = self._exportar()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('.ndjson"', response['Content-Disposition'])
+        with CaptureQueriesContext(connection) as consultas:
+            pedacos = list(response.streaming_content)
+        self.assertEqual(len(consultas), 1)
+        self.assertEqual(len(pedacos), 3)
+        
+        linhas = [json.loads(linha) for linha in b''.join(pedacos).splitlines()]
+        self.assertEqual(len(linhas), 27)
+        self.assertTrue(all('senha' not in linha for linha in linhas))
+        por_nome = {linha['nome']: linha for linha in linhas}
+        self.assertEqual(por_nome['Disney+ Family']['nivel_acesso'], 'acesso')
+        self.assertEqual(por_nome['Disney+ Family']['proprietario']['email'], 'gerente@teste.com')
+        self.assertEqual(por_nome['Netflix Premium']['nivel_acesso'], 'proprietario')
+    
+    def test_csv_gzip_com_filtros(self):
+        response = self._exportar(formato='csv', gzip='1', plataforma='disney', fields='nome,proprietario,nivel_acesso')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.csv.gz"', response['Content-Disposition'])
+        texto = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        self.assertEqual(list(csv.DictReader(StringIO(texto))), [{
+            'nome': 'Disney+ Family',
+            'proprietario_id': str(self.gerente.id),
+            'proprietario_nome': 'Gerente Teste',
+            'proprietario_email': 'gerente@teste.com',
+            'nivel_acesso': 'acesso',
+        }])
+    
+    def test_csv_completo_e_parametros_invalidos(self):
+        texto = b''.join(self._exportar(formato='csv').streaming_content).decode('utf-8')
+        linhas = list(csv.DictReader(StringIO(texto)))
+        self.assertEqual(len(linhas), 27)
+        self.assertNotIn('senha', linhas[0])
+        self.assertIn(linhas[0]['is_proprietario'], ('true', 'false'))
+        
+        for params in ({'formato': 'xml'}, {'fields': 'senha'}, {'plataforma': 'orkut'}):
+            response = self.client.get(reverse('steam:streaming_exportar'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+@override_settings(QUERY_INSPECTOR_MODE='raise')
+class SteamResumoTest(SteamAppTestCase):
+    """Testes para o resumo materializado do cofre"""
+    
+    def _conferir(self):
+        """As linhas materializadas batem com a agregação sobre as contas"""
+        materializado = {
+            (linha.usuario_id, linha.dimensao, linha.valor): linha.total
+            for linha in ResumoCofre.objects.exclude(total=0)
+        }
+        self.assertEqual(materializado, dict(resumo._contagens()))
+    
+    def _resumo(self):
+        response = self.client.get(reverse('steam:streaming_resumo'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def test_endpoint(self):
+        hoje = date.today()
+        for i, dias in enumerate([-1, 0, 7, 8, 30, 31]):
+            ContaStreaming.objects.create(
+                nome=f'Expira {i}', plataforma='hbo', email=f'expira{i}@hbo.com', senha='x',
+                status='pendente' if i else 'expirado', data_expiracao=hoje + timedelta(days=dias), proprietario=self.admin,
+            )
+        self.conta_disney.adicionar_compartilhamento(self.admin)
+        self.conta_netflix.adicionar_compartilhamento(self.gerente)
+        self.conta_netflix.adicionar_compartilhamento(self.usuario)
+        
+        dados = self._resumo()
+        self.assertEqual(dados['total'], 7)
+        self.assertEqual(dados['por_plataforma'], {'netflix': 1, 'hbo': 6})
+        self.assertEqual(dados['por_status'], {'ativo': 1, 'expirado': 1, 'pendente': 5})
+        self.assertEqual((dados['expiradas'], dados['expirando_7_dias'], dados['expirando_30_dias']), (1, 2, 4))
+        self.assertEqual((dados['compartilhadas_comigo'], dados['compartilhamentos_feitos']), (1, 2))
+        self._conferir()
+    
+    def test_acompanha_api(self):
+        """Criação, edição, soft delete e compartilhamentos pela API"""
+        response = self.client.post(reverse('steam:streaming_list_create'), data=json.dumps({
+            'nome': 'Nova', 'plataforma': 'hbo', 'email': 'nova@hbo.com', 'senha': 'Nova123!',
+            'data_expiracao': str(date.today() + timedelta(days=3)),
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        conta_id = response.json()['id']
+        self.assertEqual(self._resumo()['expirando_7_dias'], 1)
+        self._conferir()
+        
+        url = reverse('steam:streaming_detail', args=[conta_id])
+        self.client.put(url, data=json.dumps({
+            'plataforma': 'prime', 'status': 'pendente', 'data_expiracao': str(date.today() + timedelta(days=20)),
+        }), content_type='application/json')
+        dados = self._resumo()
+        self.assertEqual(dados['por_plataforma'], {'netflix': 1, 'prime': 1})
+        self.assertEqual((dados['expirando_7_dias'], dados['expirando_30_dias']), (0, 1))
+        self._conferir()
+        
+        self.client.post(reverse('steam:streaming_compartilhar', args=[conta_id]), data=json.dumps({
+            'email': 'gerente@teste.com'
+        }), content_type='application/json')
+        self.assertEqual(self._resumo()['compartilhamentos_feitos'], 1)
+        self._conferir()
+        
+        # Soft delete tira a conta e os compartilhamentos dela do resumo
+        self.client.delete(url)
+        dados = self._resumo()
+        self.assertEqual((dados['total'], dados['compartilhamentos_feitos']), (1, 0))
+        self._conferir()
+        
+        self.client.post(reverse('steam:streaming_compartilhar', args=[self.conta_netflix.id]), data=json.dumps({
+            'email': 'usuario@teste.com'
+        }), content_type='application/json')
+        self.client.delete(reverse('steam:streaming_descompartilhar', args=[self.conta_netflix.id, self.usuario.id]))
+        self.assertEqual(self._resumo()['compartilhamentos_feitos'], 0)
+        self._conferir()
+    
+    def test_acompanha_lote(self):
+        """bulk_create e update() do lote, que não disparam sinais"""
+        response = self.client.post(reverse('steam:streaming_lote'), data=json.dumps([
+            {'nome': f'Lote {i}', 'plataforma': 'hbo', 'email': f'resumo{i}@hbo.com', 'senha': 'x', 'data_expiracao': '2030-01-01'}
+            for i in range(3)
+        ]), content_type='application/json')
+        ids = [r['conta']['id'] for r in response.json()['resultados']]
+        ContaStreaming.objects.get(id=ids[0]).adicionar_compartilhamento(self.gerente)
+        self._conferir()
+        
+        self.client.patch(reverse('steam:streaming_lote'), data=json.dumps({
+            'ids': ids, 'alteracoes': {'status': 'inativo', 'data_expiracao': None}
+        }), content_type='application/json')
+        self.assertEqual(self._resumo()['por_status'], {'ativo': 1, 'inativo': 3})
+        self._conferir()
+        
+        self.client.delete(reverse('steam:streaming_lote'), data=json.dumps({'ids': ids[:2]}), content_type='application/json')
+        self.assertEqual(self._resumo()['total'], 2)
+        self._conferir()
+    
+    def test_acompanha_m2m_e_exclusoes(self):
+        """compartilhado_com.add/remove/clear e exclusão de contas e usuários"""
+        self.conta_netflix.compartilhado_com.add(self.gerente, self.usuario)
+        self.usuario.contas_compartilhadas.add(self.conta_disney)
+        self._conferir()
+        self.conta_netflix.compartilhado_com.remove(self.usuario)
+        self._conferir()
+        self.conta_netflix.compartilhado_com.clear()
+        self._conferir()
+        
+        self.conta_netflix.adicionar_compartilhamento(self.usuario)
+        self.conta_disney.adicionar_compartilhamento(self.admin)
+        self.conta_netflix.delete()
+        self._conferir()
+        
+        ContaStreaming.objects.create(nome='Sub', plataforma='hbo', email='sub@hbo.com', senha='x', proprietario=self.usuario)
+        self.conta_disney.adicionar_compartilhamento(self.usuario)
+        self.gerente.delete()
+        self._conferir()
+        self.assertEqual(self._resumo()['compartilhadas_comigo'], 0)
+    
+    def test_reconciliar(self):
+        self.conta_disney.adicionar_compartilhamento(self.admin)
+        ResumoCofre.objects.filter(usuario=self.admin, dimensao='total').update(total=99)
+        ResumoCofre.objects.filter(usuario=self.gerente, dimensao='plataforma').delete()
+        ResumoCofre.objects.create(usuario=self.usuario, dimensao='status', valor='ativo', total=5)
+        
+        saida = StringIO()
+        call_command('reconciliar_resumos', stdout=saida)
+        self.assertIn('1 corrigidas, 1 criadas, 1 apagadas', saida.getvalue())
+        self._conferir()
+        
+        saida = StringIO()
+        call_command('reconciliar_resumos', email=['admin@teste.com'], stdout=saida)
+        self.assertIn('0 corrigidas, 0 criadas, 0 apagadas', saida.getvalue())
@@ -7,6 +7,12 @@ urlpatterns = [
     # APIs principais
     path('api/streaming/', api_views.streaming_list_create, name='streaming_list_create'),
     path('api/streaming/<int:pk>/', api_views.streaming_detail, name='streaming_detail'),
+    path('api/streaming/busca/', api_views.streaming_busca, name='streaming_busca'),
+    path('api/streaming/lote/', api_views.streaming_lote, name='streaming_lote'),
+    path('api/streaming/resumo/', api_views.streaming_resumo, name='streaming_resumo'),
+    path('api/streaming/exportar/', api_views.streaming_exportar, name='streaming_exportar'),
+    path('api/streaming/importacoes/', api_views.streaming_importacao_create, name='streaming_importacao_create'),
+    path('api/streaming/importacoes/<int:pk>/', api_views.streaming_importacao_detail, name='streaming_importacao_detail'),
     
     # APIs de compartilhamento
     path('api/streaming/<int:pk>/compartilhar/', api_views.streaming_compartilhar, name='streaming_compartilhar'),
@@ -3,41 +3,22 @@ from rest_framework.decorators import api_view, parser_classes
 from rest_framework.response import Response
 from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from django.shortcuts import get_object_or_404
-from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.http import JsonResponse
 from functools import wraps
 from .models import Usuario
+from .autenticacao import require_login
+from .campos import CamposInvalidos
+from .fluxo import FluxoInvalido, pedido_em_fluxo, resposta_em_fluxo
+from .consultas import orcamento_consultas
+from .paginacao import CursorInvalido, paginar_por_cursor
+from .serializacao import CAMPOS_CRIACAO, CAMPOS_LOGIN, CAMPOS_PERFIL, CAMPOS_SUBCONTA, CAMPOS_USUARIO
 from .views import _validar_senha
-from django.contrib.auth.hashers import make_password
+from django.views.decorators.csrf import csrf_exempt
+from .hashing import FilaHashCheia, gerar_hash
 import json
 
 
-# Decorator para verificar se usuário está logado
-def require_login(view_func):
-    @wraps(view_func)
-    def wrapper(request, *args, **kwargs):
-        usuario_id = request.session.get('usuario_logado_id')
-        if not usuario_id:
-            return JsonResponse({
-                'error': 'Usuário não autenticado',
-                'message': 'Faça login para acessar este recurso'
-            }, status=401)
-        
-        try:
-            usuario = Usuario.objects.get(id=usuario_id, ativo=True)
-            request.usuario_logado = usuario
-        except Usuario.DoesNotExist:
-            request.session.flush()
-            return JsonResponse({
-                'error': 'Sessão inválida',
-                'message': 'Usuário não encontrado ou inativo'
-            }, status=401)
-        
-        return view_func(request, *args, **kwargs)
-    return wrapper
-
-
 # Decorator para verificar permissões
 def require_permission(permission_type):
     def decorator(view_func):
@@ -67,6 +48,17 @@ def require_permission(permission_type):
     return decorator
 
 
+def _resposta_servidor_ocupado(classe_resposta=Response):
+    """Resposta 503 para quando o executor de hash está lotado"""
+    resposta = classe_resposta({
+        'erro': 'Servidor ocupado',
+        'mensagem': 'Muitas verificações de senha em andamento, tente novamente em instantes'
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    resposta['Retry-After'] = '1'
+    return resposta
+
+
+@orcamento_consultas(4, POST=10)
 @api_view(['GET', 'POST'])
 @parser_classes([JSONParser, MultiPartParser, FormParser])
 @require_login
@@ -74,33 +66,33 @@ def usuario_list_create(request):
     """
     Lista todos os usuários ou cria um novo usuário
     """
+    usuario_logado = request.usuario_logado
+    
     if request.method == 'GET':
-        # Busca usuário logado (simulado)
-        usuario_logado_id = request.session.get('usuario_logado_id')
-        
-        if usuario_logado_id:
-            usuario_logado = get_object_or_404(Usuario, id=usuario_logado_id)
-            if usuario_logado.tipo == 'admin':
-                usuarios = Usuario.objects.filter(ativo=True)
-            else:
-                usuarios = usuario_logado.get_todas_subcontas()
-        else:
+        if usuario_logado.tipo == 'admin':
             usuarios = Usuario.objects.filter(ativo=True)
+        else:
+            usuarios = usuario_logado.get_todas_subcontas()
         
-        data = []
-        for usuario in usuarios:
-            data.append({
-                'id': usuario.id,
-                'nome': usuario.nome,
-                'email': usuario.email,
-                'tipo': usuario.tipo,
-                'tipo_display': usuario.get_tipo_display(),
-                'foto': usuario.foto.url if usuario.foto else None,
-                'conta_principal': usuario.conta_principal.nome if usuario.conta_principal else None,
-                'criado_por': usuario.criado_por.nome if usuario.criado_por else None,
-                'data_criacao': usuario.data_criacao,
-                'nivel_hierarquia': usuario.nivel_hierarquia,
-            })
+        try:
+            campos = CAMPOS_USUARIO.selecionar(request)
+            em_fluxo = pedido_em_fluxo(request)
+        except (CamposInvalidos, FluxoInvalido) as e:
+            return Response({'erro': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        usuarios = CAMPOS_USUARIO.valores(usuarios, campos, extras=['data_criacao'])
+        
+        if em_fluxo:
+            return resposta_em_fluxo(usuarios, lambda linha: CAMPOS_USUARIO.serializar(linha, campos))
+        
+        try:
+            pagina = paginar_por_cursor(request, usuarios)
+        except CursorInvalido as e:
+            return Response({'erro': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = [CAMPOS_USUARIO.serializar(linha, campos) for linha in (pagina.itens if pagina else usuarios)]
+        
+        if pagina:
+            return Response(pagina.envelope(data))
         return Response(data)
     
     elif request.method == 'POST':
@@ -117,15 +109,6 @@ def usuario_list_create(request):
                 'erro': 'Nome, email e senha são obrigatórios'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Verifica se há usuário logado
-        usuario_logado_id = request.session.get('usuario_logado_id')
-        if not usuario_logado_id:
-            return Response({
-                'erro': 'Você precisa estar logado para criar usuários'
-            }, status=status.HTTP_401_UNAUTHORIZED)
-        
-        usuario_logado = get_object_or_404(Usuario, id=usuario_logado_id)
-        
         # Verifica permissões
         if not usuario_logado.pode_criar_subcontas():
             return Response({
@@ -159,17 +142,12 @@ def usuario_list_create(request):
             )
             usuario.save()
             
-            return Response({
-                'id': usuario.id,
-                'nome': usuario.nome,
-                'email': usuario.email,
-                'tipo': usuario.tipo,
-                'tipo_display': usuario.get_tipo_display(),
-                'foto': usuario.foto.url if usuario.foto else None,
-                'conta_principal': usuario.conta_principal.nome,
-                'mensagem': 'Usuário criado com sucesso'
-            }, status=status.HTTP_201_CREATED)
+            dados = CAMPOS_USUARIO.de_objeto(usuario, CAMPOS_CRIACAO)
+            dados['mensagem'] = 'Usuário criado com sucesso'
+            return Response(dados, status=status.HTTP_201_CREATED)
             
+        except FilaHashCheia:
+            return _resposta_servidor_ocupado()
         except Exception as e:
             return Response({
                 'erro': 'Erro ao criar usuário',
@@ -177,6 +155,7 @@ def usuario_list_create(request):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@orcamento_consultas(4, PUT=7, DELETE=6)
 @api_view(['GET', 'PUT', 'DELETE'])
 @parser_classes([JSONParser, MultiPartParser, FormParser])
 @require_login
@@ -192,13 +171,7 @@ def usuario_detail(request, pk):
         }, status=status.HTTP_404_NOT_FOUND)
     
     if request.method == 'GET':
-        data = {
-            'id': usuario.id,
-            'nome': usuario.nome,
-            'email': usuario.email,
-            'foto': usuario.foto.url if usuario.foto else None,
-        }
-        return Response(data)
+        return Response(CAMPOS_USUARIO.de_objeto(usuario, CAMPOS_PERFIL))
     
     elif request.method == 'PUT':
         nome = request.data.get('nome', usuario.nome)
@@ -217,13 +190,9 @@ def usuario_detail(request, pk):
             usuario.foto = foto
         usuario.save()
         
-        return Response({
-            'id': usuario.id,
-            'nome': usuario.nome,
-            'email': usuario.email,
-            'foto': usuario.foto.url if usuario.foto else None,
-            'mensagem': 'Usuário atualizado com sucesso'
-        })
+        dados = CAMPOS_USUARIO.de_objeto(usuario, CAMPOS_PERFIL)
+        dados['mensagem'] = 'Usuário atualizado com sucesso'
+        return Response(dados)
     
     elif request.method == 'DELETE':
         usuario.delete()
@@ -262,7 +231,10 @@ def alterar_senha_api(request, pk):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # Atualiza a senha
-        usuario.senha = make_password(senha)
+        try:
+            usuario.senha = gerar_hash(senha)
+        except FilaHashCheia:
+            return _resposta_servidor_ocupado()
         usuario.save()
         
         return Response({
@@ -284,6 +256,7 @@ def validar_senha_api(request):
     })
 
 
+@orcamento_consultas(2)
 @api_view(['POST'])
 @parser_classes([JSONParser])
 def login_api(request):
@@ -302,14 +275,9 @@ def login_api(request):
         usuario = Usuario.objects.get(email=email, ativo=True)
         if usuario.verificar_senha(senha):
             request.session['usuario_logado_id'] = usuario.id
-            return Response({
-                'id': usuario.id,
-                'nome': usuario.nome,
-                'email': usuario.email,
-                'tipo': usuario.tipo,
-                'tipo_display': usuario.get_tipo_display(),
-                'mensagem': 'Login realizado com sucesso'
-            })
+            dados = CAMPOS_USUARIO.de_objeto(usuario, CAMPOS_LOGIN)
+            dados['mensagem'] = 'Login realizado com sucesso'
+            return Response(dados)
         else:
             return Response({
                 'erro': 'Senha incorreta'
@@ -318,6 +286,52 @@ def login_api(request):
         return Response({
             'erro': 'Usuário não encontrado'
         }, status=status.HTTP_404_NOT_FOUND)
+    except FilaHashCheia:
+        return _resposta_servidor_ocupado()
+
+
+@csrf_exempt
+async def login_api_async(request):
+    """
+    Login de usuário via API para servidores ASGI.
+    Aguarda a verificação da senha sem bloquear o event loop.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'erro': 'Método não permitido'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'erro': 'JSON inválido'}, status=400)
+    
+    email = data.get('email')
+    senha = data.get('senha')
+    
+    if not email or not senha:
+        return JsonResponse({
+            'erro': 'Email e senha são obrigatórios'
+        }, status=400)
+    
+    usuario = await Usuario.objects.filter(email=email, ativo=True).afirst()
+    if usuario is None:
+        return JsonResponse({
+            'erro': 'Usuário não encontrado'
+        }, status=404)
+    
+    try:
+        senha_correta = await usuario.averificar_senha(senha)
+    except FilaHashCheia:
+        return _resposta_servidor_ocupado(JsonResponse)
+    
+    if not senha_correta:
+        return JsonResponse({
+            'erro': 'Senha incorreta'
+        }, status=401)
+    
+    await request.session.aset('usuario_logado_id', usuario.id)
+    dados = CAMPOS_USUARIO.de_objeto(usuario, CAMPOS_LOGIN)
+    dados['mensagem'] = 'Login realizado com sucesso'
+    return JsonResponse(dados)
 
 
 @api_view(['POST'])
@@ -333,39 +347,22 @@ def logout_api(request):
     })
 
 
+@orcamento_consultas(3)
 @api_view(['GET'])
 @require_login
 def subcontas_api(request):
     """
     Lista subcontas do usuário logado
     """
-    usuario_logado_id = request.session.get('usuario_logado_id')
-    if not usuario_logado_id:
-        return Response({
-            'erro': 'Você precisa estar logado'
-        }, status=status.HTTP_401_UNAUTHORIZED)
-    
-    usuario_logado = get_object_or_404(Usuario, id=usuario_logado_id)
+    usuario_logado = request.usuario_logado
     
     if not usuario_logado.pode_criar_subcontas():
         return Response({
             'erro': 'Você não tem permissão para ver subcontas'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    subcontas = usuario_logado.get_subcontas()
-    data = []
-    
-    for subconta in subcontas:
-        data.append({
-            'id': subconta.id,
-            'nome': subconta.nome,
-            'email': subconta.email,
-            'tipo': subconta.tipo,
-            'tipo_display': subconta.get_tipo_display(),
-            'foto': subconta.foto.url if subconta.foto else None,
-            'data_criacao': subconta.data_criacao,
-            'nivel_hierarquia': subconta.nivel_hierarquia,
-        })
+    subcontas = CAMPOS_USUARIO.valores(usuario_logado.get_subcontas(), CAMPOS_SUBCONTA)
+    data = [CAMPOS_USUARIO.serializar(linha, CAMPOS_SUBCONTA) for linha in subcontas]
     
     return Response(data)
 
@@ -405,7 +402,10 @@ def criar_admin_inicial_api(request):
         senha=senha,
         tipo='admin'
     )
-    admin.save()
+    try:
+        admin.save()
+    except FilaHashCheia:
+        return _resposta_servidor_ocupado()
     
     return Response({
         'id': admin.id,
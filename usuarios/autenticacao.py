@@ -0,0 +1,102 @@
+"""
+Resolução do usuário logado
+
+O usuário da sessão é carregado no máximo uma vez por requisição e
+compartilhado entre o middleware, o decorator require_login e as views.
+Opcionalmente (USUARIO_CACHE_TTL > 0) fica também em cache entre
+requisições, invalidado a cada Usuario.save/delete (e, ao mover um
+usuário, para toda a subárvore rebaseada com update()).
+"""
+
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+from .models import Usuario
+
+
+def _chave_cache(usuario_id):
+    return f'usuario_logado:{usuario_id}'
+
+
+def _carregar_usuario(usuario_id):
+    ttl = getattr(settings, 'USUARIO_CACHE_TTL', 0)
+    if ttl:
+        usuario = cache.get(_chave_cache(usuario_id))
+        if usuario is not None:
+            return usuario
+
+    try:
+        usuario = Usuario.objects.get(id=usuario_id, ativo=True)
+    except Usuario.DoesNotExist:
+        return None
+
+    if ttl:
+        cache.set(_chave_cache(usuario_id), usuario, ttl)
+    return usuario
+
+
+def invalidar_cache_usuario(usuario_id):
+    """Remove o usuário do cache entre requisições"""
+    cache.delete(_chave_cache(usuario_id))
+
+
+def invalidar_cache_usuarios(usuario_ids):
+    """
+    Remove vários usuários do cache entre requisições. usuario_ids pode ser
+    um queryset, avaliado só com o cache ativo.
+    """
+    if getattr(settings, 'USUARIO_CACHE_TTL', 0):
+        cache.delete_many([_chave_cache(usuario_id) for usuario_id in usuario_ids])
+
+
+def get_usuario_logado(request):
+    """
+    Retorna o usuário ativo da sessão ou None.
+    O resultado fica guardado na própria requisição.
+    """
+    # Requisições do DRF embrulham o HttpRequest original
+    http_request = getattr(request, '_request', request)
+
+    if not hasattr(http_request, '_usuario_logado_cache'):
+        usuario_id = http_request.session.get('usuario_logado_id')
+        http_request._usuario_logado_cache = _carregar_usuario(usuario_id) if usuario_id else None
+
+    return http_request._usuario_logado_cache
+
+
+def autenticar(request):
+    """
+    Resolve o usuário logado e o coloca em request.usuario_logado.
+    Retorna uma resposta 401 se não houver usuário válido, ou None.
+    """
+    if not request.session.get('usuario_logado_id'):
+        return JsonResponse({
+            'error': 'Usuário não autenticado',
+            'message': 'Faça login para acessar este recurso'
+        }, status=401)
+
+    usuario = get_usuario_logado(request)
+    if usuario is None:
+        # Limpar sessão inválida
+        request.session.flush()
+        return JsonResponse({
+            'error': 'Sessão inválida',
+            'message': 'Usuário não encontrado ou inativo'
+        }, status=401)
+
+    request.usuario_logado = usuario
+    return None
+
+
+# Decorator para verificar se usuário está logado
+def require_login(view_func):
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        resposta = autenticar(request)
+        if resposta is not None:
+            return resposta
+        return view_func(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,106 @@
+"""
+Serialização das respostas a partir de linhas de .values()
+
+Cada campo da resposta declara as colunas que lê (caminhos do .values(),
+ex.: 'proprietario__nome') e como obter o valor da linha. As listagens
+leem só as colunas dos campos pedidos (?fields=id,nome,plataforma) em
+dicionários, sem instanciar modelos; JOINs só aparecem quando um campo
+pedido usa uma coluna relacionada. Respostas de um único objeto já
+carregado usam de_objeto, que monta a mesma linha a partir da instância.
+"""
+
+from django.db.models.fields.files import FieldFile
+
+
+class CamposInvalidos(ValueError):
+    """?fields= com campo desconhecido"""
+
+
+class Campo:
+    """
+    Um campo da resposta: colunas lidas e a função valor(linha, usuario_logado)
+    """
+
+    def __init__(self, valor, colunas=()):
+        self.valor = valor
+        self.colunas = tuple(colunas)
+
+
+def coluna(nome):
+    """Campo que é a própria coluna"""
+    return Campo(lambda linha, usuario: linha[nome], [nome])
+
+
+def exibicao(nome, choices):
+    """Rótulo de um campo com choices, de um mapa montado uma única vez"""
+    rotulos = {valor: str(rotulo) for valor, rotulo in choices}
+    return Campo(lambda linha, usuario: rotulos.get(linha[nome], linha[nome]), [nome])
+
+
+def arquivo(nome, campo_modelo):
+    """URL de um FileField/ImageField a partir do nome gravado na coluna"""
+    def valor(linha, usuario):
+        caminho = linha[nome]
+        return campo_modelo.storage.url(caminho) if caminho else None
+    return Campo(valor, [nome])
+
+
+def linha_de_objeto(objeto, colunas):
+    """Mesma linha que .values(*colunas) devolveria para o objeto"""
+    linha = {}
+    for caminho in colunas:
+        valor = objeto
+        for parte in caminho.split('__'):
+            valor = getattr(valor, parte, None)
+            if valor is None:
+                break
+        if isinstance(valor, FieldFile):
+            valor = valor.name or None
+        linha[caminho] = valor
+    return linha
+
+
+class CamposResposta:
+    """
+    Campos disponíveis de uma resposta, na ordem em que aparecem no corpo
+    """
+
+    def __init__(self, campos):
+        self.campos = campos
+        self.todos = list(campos)
+
+    def selecionar(self, request):
+        """Nomes pedidos em ?fields= (todos se ausente) ou CamposInvalidos"""
+        pedido = request.GET.get('fields')
+        if not pedido:
+            return self.todos
+        nomes = [nome.strip() for nome in pedido.split(',') if nome.strip()]
+        desconhecidos = [nome for nome in nomes if nome not in self.campos]
+        if desconhecidos or not nomes:
+            raise CamposInvalidos(
+                f'fields aceita: {", ".join(self.campos)}' if not desconhecidos
+                else f'Campos inválidos: {", ".join(desconhecidos)}'
+            )
+        return [nome for nome in self.campos if nome in nomes]
+
+    def colunas(self, nomes, extras=()):
+        colunas = dict.fromkeys(['id', *extras])
+        for nome in nomes:
+            colunas.update(dict.fromkeys(self.campos[nome].colunas))
+        return list(colunas)
+
+    def valores(self, queryset, nomes, extras=()):
+        """
+        .values() com as colunas dos campos pedidos.
+        extras são colunas sempre necessárias (ex.: a chave da paginação).
+        """
+        return queryset.values(*self.colunas(nomes, extras))
+
+    def serializar(self, linha, nomes=None, usuario_logado=None):
+        campos = self.campos
+        return {nome: campos[nome].valor(linha, usuario_logado) for nome in (nomes or self.todos)}
+
+    def de_objeto(self, objeto, nomes=None, usuario_logado=None):
+        """Serializa uma instância já carregada"""
+        nomes = nomes or self.todos
+        return self.serializar(linha_de_objeto(objeto, self.colunas(nomes)), nomes, usuario_logado)
@@ -0,0 +1,154 @@
+"""
+Inspetor de consultas para desenvolvimento e testes
+
+Com QUERY_INSPECTOR_MODE em 'log' ou 'raise', InspetorConsultasMiddleware
+grava o SQL de cada requisição e aponta dois problemas:
+
+- N+1: o mesmo formato de consulta repetido QUERY_INSPECTOR_REPETICOES
+  vezes ou mais, com o trecho do código que a disparou;
+- orçamento: a view executou mais consultas do que declarou com
+  @orcamento_consultas(n).
+
+Em 'log' os problemas viram avisos no logger 'consultas'; em 'raise'
+a requisição falha com ConsultasExcessivas, o que derruba o teste.
+
+Um comando que o Django divide em lotes (bulk_create com batch_size) roda
+dentro de consultas_em_lote() e conta como uma consulta só.
+"""
+
+import contextvars
+import logging
+import re
+import traceback
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('consultas')
+
+# Listas de parâmetros de tamanho variável não mudam o formato da consulta
+_LISTA_PARAMETROS = re.compile(r'\((?:%s, )*%s\)')
+_SAVEPOINT = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)', re.IGNORECASE)
+
+
+# Consultas do bloco consultas_em_lote() atual já registradas
+_em_lote = contextvars.ContextVar('consultas_em_lote', default=None)
+
+
+class ConsultasExcessivas(Exception):
+    """A requisição repetiu consultas (N+1) ou estourou o orçamento da view"""
+
+
+@contextmanager
+def consultas_em_lote():
+    """
+    As consultas do bloco contam como uma só no orçamento e no N+1: são o
+    mesmo comando dividido em lotes, cuja quantidade depende do tamanho
+    da entrada e do limite de parâmetros do banco
+    """
+    token = _em_lote.set([])
+    try:
+        yield
+    finally:
+        _em_lote.reset(token)
+
+
+def orcamento_consultas(maximo, **por_metodo):
+    """
+    Declara o número máximo de consultas de uma view, opcionalmente
+    por método HTTP: @orcamento_consultas(4, POST=8).
+    Deve ficar acima de @api_view para marcar a view resolvida pela URL.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(*args, **kwargs):
+            return view_func(*args, **kwargs)
+        wrapper.orcamento_consultas = {'*': maximo, **por_metodo}
+        return wrapper
+    return decorator
+
+
+def formato_consulta(sql):
+    """Normaliza o SQL para comparar consultas com parâmetros diferentes"""
+    return _LISTA_PARAMETROS.sub('(...)', ' '.join(sql.split()))
+
+
+def _origem():
+    """Quadros da pilha que pertencem ao projeto, sem o próprio inspetor"""
+    base = str(settings.BASE_DIR)
+    quadros = [
+        quadro for quadro in traceback.extract_stack()[:-2]
+        if quadro.filename.startswith(base)
+        and '/site-packages/' not in quadro.filename
+        and quadro.filename != __file__
+    ]
+    return ''.join(traceback.format_list(quadros))
+
+
+class RegistroConsultas:
+    """execute_wrapper que guarda o formato e a origem de cada consulta"""
+
+    def __init__(self):
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        bloco = _em_lote.get()
+        if not _SAVEPOINT.match(sql) and not bloco:
+            self.consultas.append((formato_consulta(sql), _origem()))
+            if bloco is not None:
+                bloco.append(sql)
+        return execute(sql, params, many, context)
+
+    def repetidas(self, minimo):
+        """Retorna [(formato, quantidade, origem)] das consultas repetidas"""
+        contagem = {}
+        origens = {}
+        for formato, origem in self.consultas:
+            contagem[formato] = contagem.get(formato, 0) + 1
+            origens.setdefault(formato, origem)
+        return [
+            (formato, quantidade, origens[formato])
+            for formato, quantidade in contagem.items()
+            if quantidade >= minimo
+        ]
+
+
+class InspetorConsultasMiddleware:
+    """
+    Middleware que detecta N+1 e aplica o orçamento de consultas por view
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        modo = settings.QUERY_INSPECTOR_MODE
+        if modo == 'off':
+            return self.get_response(request)
+
+        registro = RegistroConsultas()
+        with connection.execute_wrapper(registro):
+            response = self.get_response(request)
+
+        problemas = []
+        for formato, quantidade, origem in registro.repetidas(settings.QUERY_INSPECTOR_REPETICOES):
+            problemas.append(f'N+1: consulta repetida {quantidade}x: {formato}\n{origem}')
+
+        match = getattr(request, 'resolver_match', None)
+        orcamentos = getattr(match.func, 'orcamento_consultas', {}) if match else {}
+        orcamento = orcamentos.get(request.method, orcamentos.get('*'))
+        if orcamento is not None and len(registro.consultas) > orcamento:
+            problemas.append(
+                f'Orçamento de {orcamento} consultas excedido: {len(registro.consultas)} em {match.view_name}\n'
+                + '\n'.join(formato for formato, _ in registro.consultas)
+            )
+
+        if problemas:
+            mensagem = f'{request.method} {request.path}\n' + '\n\n'.join(problemas)
+            if modo == 'raise':
+                raise ConsultasExcessivas(mensagem)
+            logger.warning(mensagem)
+
+        return response
@@ -0,0 +1,147 @@
+"""
+Listagens em fluxo (?stream=1)
+
+Em vez de montar a lista inteira e renderizá-la de uma vez, percorre o
+queryset com .iterator(chunk_size=API_STREAM_LOTE) e escreve o array JSON
+aos pedaços em uma StreamingHttpResponse. A memória usada fica limitada a
+um lote de linhas, qualquer que seja o tamanho do resultado.
+
+As exportações usam o mesmo percurso para escrever NDJSON (um objeto por
+linha) ou CSV, opcionalmente compactados em gzip à medida que saem.
+"""
+
+import csv
+import datetime
+import io
+import zlib
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .renderers import JSONRapidoRenderer
+
+
+class FluxoInvalido(ValueError):
+    """?stream=1 combinado com paginação"""
+
+
+# Formatos de exportação: tipo de conteúdo de cada um
+FORMATOS_EXPORTACAO = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def pedido_em_fluxo(request):
+    """Indica se a listagem foi pedida em fluxo; recusa ?stream=1 com limit/cursor"""
+    if request.GET.get('stream') not in ('1', 'true'):
+        return False
+    if 'limit' in request.GET or 'cursor' in request.GET:
+        raise FluxoInvalido('stream não pode ser combinado com limit ou cursor')
+    return True
+
+
+def _pedacos(linhas, serializar, lote):
+    codificar = JSONRapidoRenderer().render
+    yield b'['
+    separador = b''
+    pendentes = []
+    for linha in linhas.iterator(chunk_size=lote):
+        pendentes.append(codificar(serializar(linha)))
+        if len(pendentes) >= lote:
+            yield separador + b','.join(pendentes)
+            separador = b','
+            pendentes = []
+    if pendentes:
+        yield separador + b','.join(pendentes)
+    yield b']'
+
+
+def resposta_em_fluxo(linhas, serializar):
+    """
+    StreamingHttpResponse com o array JSON de serializar(linha) para cada
+    linha do queryset
+    """
+    return StreamingHttpResponse(
+        _pedacos(linhas, serializar, settings.API_STREAM_LOTE),
+        content_type='application/json',
+    )
+
+
+def _pedacos_ndjson(linhas, serializar, lote):
+    codificar = JSONRapidoRenderer().render
+    pendentes = []
+    for linha in linhas.iterator(chunk_size=lote):
+        pendentes.append(codificar(serializar(linha)))
+        if len(pendentes) >= lote:
+            yield b'\n'.join(pendentes) + b'\n'
+            pendentes = []
+    if pendentes:
+        yield b'\n'.join(pendentes) + b'\n'
+
+
+def _planificar(objeto, prefixo=''):
+    """{'proprietario': {'id': 1}} -> {'proprietario_id': 1}"""
+    plano = {}
+    for chave, valor in objeto.items():
+        if isinstance(valor, dict):
+            plano.update(_planificar(valor, f'{prefixo}{chave}_'))
+        else:
+            plano[f'{prefixo}{chave}'] = valor
+    return plano
+
+
+def _celula(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def _pedacos_csv(linhas, serializar, lote):
+    buffer = io.StringIO()
+    escritor = None
+    for indice, linha in enumerate(linhas.iterator(chunk_size=lote), 1):
+        plano = _planificar(serializar(linha))
+        if escritor is None:
+            # O cabeçalho sai da primeira linha, já com os objetos planificados
+            escritor = csv.DictWriter(buffer, fieldnames=list(plano))
+            escritor.writeheader()
+        escritor.writerow({chave: _celula(valor) for chave, valor in plano.items()})
+        if indice % lote == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _gzip(pedacos):
+    compactador = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: cabeçalho gzip
+    for pedaco in pedacos:
+        compactado = compactador.compress(pedaco)
+        if compactado:
+            yield compactado
+    yield compactador.flush()
+
+
+def resposta_exportacao(linhas, serializar, formato, nome, compactar=False):
+    """
+    StreamingHttpResponse para download de serializar(linha) de cada linha
+    do queryset em NDJSON ou CSV (formato), compactada em gzip se pedido
+    """
+    lote = settings.API_STREAM_LOTE
+    if formato == 'csv':
+        pedacos = _pedacos_csv(linhas, serializar, lote)
+    else:
+        pedacos = _pedacos_ndjson(linhas, serializar, lote)
+    nome = f'{nome}.{formato}'
+    tipo = FORMATOS_EXPORTACAO[formato]
+    if compactar:
+        pedacos, nome, tipo = _gzip(pedacos), f'{nome}.gz', 'application/gzip'
+    response = StreamingHttpResponse(pedacos, content_type=tipo)
+    response['Content-Disposition'] = f'attachment; filename="{nome}"'
+    return response
@@ -0,0 +1,52 @@
+"""
+Hashers de senha com parâmetros vindos das configurações
+
+Mantêm o mesmo nome de algoritmo dos hashers do Django, então hashes já
+gravados continuam válidos. Quando os parâmetros mudam, must_update passa
+a retornar True e a senha é refeita no próximo login bem-sucedido.
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+)
+
+
+class PBKDF2Ajustado(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 com iterações em PBKDF2_ITERACOES"""
+
+    @property
+    def iterations(self):
+        return settings.PBKDF2_ITERACOES
+
+
+class ScryptAjustado(ScryptPasswordHasher):
+    """Scrypt com custo em SCRYPT_WORK_FACTOR"""
+
+    @property
+    def work_factor(self):
+        return settings.SCRYPT_WORK_FACTOR
+
+    @property
+    def maxmem(self):
+        # Margem sobre a memória usada (128 * n * r) para o limite do OpenSSL
+        return 256 * self.work_factor * self.block_size
+
+
+class Argon2Ajustado(Argon2PasswordHasher):
+    """Argon2id com custos em ARGON2_TIME_COST e ARGON2_MEMORY_COST"""
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
+
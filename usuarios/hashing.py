@@ -0,0 +1,176 @@
+"""
+Executor de hash de senhas
+
+PBKDF2 e afins são caros de propósito. Em vez de rodar no thread da
+requisição sem limite, o trabalho vai para um pool (threads ou processos)
+com um teto de tarefas pendentes. Quando o teto é atingido, o chamador
+espera até HASH_EXECUTOR_ESPERA segundos e então recebe FilaHashCheia.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+
+
+class FilaHashCheia(Exception):
+    """Todas as vagas do executor de hash estão ocupadas"""
+
+
+def _inicializar_processo():
+    # Processos filhos iniciados com "spawn" precisam configurar o Django
+    import django
+    django.setup()
+
+
+class ExecutorHash:
+    """
+    Pool limitado para calcular e verificar hashes de senha
+    """
+
+    def __init__(self, trabalhadores, max_pendentes, espera, tipo='thread'):
+        if tipo == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=trabalhadores, initializer=_inicializar_processo)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix='hash')
+        self.tipo = tipo
+        self.trabalhadores = trabalhadores
+        self.max_pendentes = max_pendentes
+        self.espera = espera
+        self._vagas = threading.BoundedSemaphore(max_pendentes)
+        self._lock = threading.Lock()
+        self._pendentes = 0
+        self._pico_pendentes = 0
+        self._concluidas = 0
+        self._rejeitadas = 0
+
+    def submeter(self, funcao, *args, bloquear=True):
+        """Agenda uma tarefa e retorna o Future correspondente"""
+        if bloquear:
+            conseguiu = self._vagas.acquire(timeout=self.espera)
+        else:
+            conseguiu = self._vagas.acquire(blocking=False)
+        if not conseguiu:
+            with self._lock:
+                self._rejeitadas += 1
+            raise FilaHashCheia('Fila de hash de senhas cheia')
+
+        with self._lock:
+            self._pendentes += 1
+            self._pico_pendentes = max(self._pico_pendentes, self._pendentes)
+
+        try:
+            future = self._executor.submit(funcao, *args)
+        except Exception:
+            self._liberar(None)
+            raise
+        future.add_done_callback(self._liberar)
+        return future
+
+    def _liberar(self, future):
+        with self._lock:
+            self._pendentes -= 1
+            if future is not None:
+                self._concluidas += 1
+        self._vagas.release()
+
+    def metricas(self):
+        """Retorna contadores de uso do executor"""
+        with self._lock:
+            return {
+                'tipo': self.tipo,
+                'trabalhadores': self.trabalhadores,
+                'max_pendentes': self.max_pendentes,
+                'pendentes': self._pendentes,
+                'na_fila': max(0, self._pendentes - self.trabalhadores),
+                'pico_pendentes': self._pico_pendentes,
+                'concluidas': self._concluidas,
+                'rejeitadas': self._rejeitadas,
+            }
+
+    def encerrar(self):
+        self._executor.shutdown(wait=True)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Retorna o executor global, criando-o na primeira chamada"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ExecutorHash(
+                    trabalhadores=settings.HASH_EXECUTOR_TRABALHADORES,
+                    max_pendentes=settings.HASH_EXECUTOR_MAX_PENDENTES,
+                    espera=settings.HASH_EXECUTOR_ESPERA,
+                    tipo=settings.HASH_EXECUTOR_TIPO,
+                )
+    return _executor
+
+
+def reiniciar_executor():
+    """Descarta o executor atual; o próximo uso lê as configurações de novo"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.encerrar()
+        _executor = None
+
+
+def metricas():
+    return get_executor().metricas()
+
+
+def e_hash(valor):
+    """Indica se o valor já é um hash em algum formato conhecido"""
+    if not valor:
+        return False
+    try:
+        identify_hasher(valor)
+    except ValueError:
+        return False
+    return True
+
+
+def precisa_rehash(hash_senha):
+    """Indica se o hash usa outro algoritmo ou parâmetros diferentes do perfil atual"""
+    try:
+        hasher = identify_hasher(hash_senha)
+    except ValueError:
+        return False
+    preferido = get_hasher('default')
+    return hasher.algorithm != preferido.algorithm or preferido.must_update(hash_senha)
+
+
+def gerar_hash(senha):
+    """Calcula o hash da senha fora do thread da requisição"""
+    return get_executor().submeter(make_password, senha).result()
+
+
+def verificar_hash(senha, hash_senha):
+    """Verifica a senha contra o hash fora do thread da requisição"""
+    return get_executor().submeter(check_password, senha, hash_senha).result()
+
+
+def gerar_hashes(senhas):
+    """Calcula vários hashes em paralelo, mantendo a ordem"""
+    executor = get_executor()
+    futures = [executor.submeter(make_password, senha) for senha in senhas]
+    return [future.result() for future in futures]
+
+
+async def agerar_hash(senha):
+    """Versão assíncrona de gerar_hash, sem bloquear o event loop"""
+    future = get_executor().submeter(make_password, senha, bloquear=False)
+    return await asyncio.wrap_future(future)
+
+
+async def averificar_hash(senha, hash_senha):
+    """Versão assíncrona de verificar_hash, sem bloquear o event loop"""
+    future = get_executor().submeter(check_password, senha, hash_senha, bloquear=False)
+    return await asyncio.wrap_future(future)
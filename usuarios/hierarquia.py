@@ -0,0 +1,287 @@
+"""
+Consultas de hierarquia de usuários
+
+Dois backends com a mesma interface, escolhidos por HIERARQUIA_BACKEND:
+
+- 'fechamento': tabela de fechamento (HierarquiaUsuario) com uma linha por
+  par ancestral/descendente, mantida a cada save.
+- 'cte': consultas WITH RECURSIVE sobre conta_principal, sem tabela extra.
+
+Nos dois casos subárvore, cadeia de ancestrais, nível e a pergunta
+"X está abaixo de Y?" custam uma única consulta.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+# Limite de segurança para a subida de ancestrais via CTE
+PROFUNDIDADE_MAXIMA = 1000
+
+
+def _modelos():
+    from .models import HierarquiaUsuario, Usuario
+    return HierarquiaUsuario, Usuario
+
+
+def inserir_no(usuario):
+    """Cria as linhas de fechamento de um usuário recém-criado"""
+    HierarquiaUsuario, _ = _modelos()
+
+    linhas = [HierarquiaUsuario(ancestral_id=usuario.pk, descendente_id=usuario.pk, profundidade=0)]
+    if usuario.conta_principal_id:
+        ancestrais = HierarquiaUsuario.objects.filter(
+            descendente_id=usuario.conta_principal_id
+        ).values_list('ancestral_id', 'profundidade')
+        for ancestral_id, profundidade in ancestrais:
+            linhas.append(HierarquiaUsuario(
+                ancestral_id=ancestral_id,
+                descendente_id=usuario.pk,
+                profundidade=profundidade + 1,
+            ))
+
+    HierarquiaUsuario.objects.bulk_create(linhas)
+
+
+def mover_subarvore(usuario):
+    """Religa a subárvore do usuário abaixo da nova conta principal"""
+    HierarquiaUsuario, _ = _modelos()
+
+    subarvore = list(
+        HierarquiaUsuario.objects.filter(ancestral_id=usuario.pk)
+        .values_list('descendente_id', 'profundidade')
+    )
+    ids_subarvore = [descendente_id for descendente_id, _ in subarvore]
+
+    if usuario.conta_principal_id in ids_subarvore:
+        raise ValidationError('Uma conta não pode ficar abaixo de uma de suas próprias subcontas.')
+
+    with transaction.atomic():
+        # Desliga a subárvore dos ancestrais antigos
+        HierarquiaUsuario.objects.filter(
+            descendente_id__in=ids_subarvore
+        ).exclude(ancestral_id__in=ids_subarvore).delete()
+
+        if not usuario.conta_principal_id:
+            return
+
+        # Liga cada nó da subárvore a cada ancestral da nova conta principal
+        novos_ancestrais = HierarquiaUsuario.objects.filter(
+            descendente_id=usuario.conta_principal_id
+        ).values_list('ancestral_id', 'profundidade')
+        HierarquiaUsuario.objects.bulk_create([
+            HierarquiaUsuario(
+                ancestral_id=ancestral_id,
+                descendente_id=descendente_id,
+                profundidade=profundidade_ancestral + profundidade + 1,
+            )
+            for ancestral_id, profundidade_ancestral in novos_ancestrais
+            for descendente_id, profundidade in subarvore
+        ])
+
+
+def calcular_fechamento(pais):
+    """
+    Gera as tuplas (ancestral, descendente, profundidade) a partir de um
+    dicionário {id: id_da_conta_principal}
+    """
+    for usuario_id in pais:
+        atual = usuario_id
+        profundidade = 0
+        visitados = set()
+        while atual is not None and atual not in visitados:
+            visitados.add(atual)
+            yield atual, usuario_id, profundidade
+            atual = pais.get(atual)
+            profundidade += 1
+
+
+def calcular_posicoes(pais):
+    """
+    Calcula {id: (nivel, id_da_raiz)} a partir de um dicionário
+    {id: id_da_conta_principal}
+    """
+    posicoes = {}
+    # O ancestral mais distante de cada usuário é a raiz
+    for ancestral_id, usuario_id, profundidade in calcular_fechamento(pais):
+        posicoes[usuario_id] = (profundidade, ancestral_id)
+    return posicoes
+
+
+def reconstruir(tamanho_lote=1000):
+    """Recria a tabela de fechamento, o nível e a raiz a partir de conta_principal"""
+    HierarquiaUsuario, Usuario = _modelos()
+
+    pais = dict(Usuario.objects.values_list('id', 'conta_principal_id'))
+
+    with transaction.atomic():
+        posicoes = calcular_posicoes(pais)
+        usuarios = list(Usuario.objects.only('id', 'nivel', 'raiz'))
+        for usuario in usuarios:
+            usuario.nivel, usuario.raiz_id = posicoes.get(usuario.id, (0, usuario.id))
+        Usuario.objects.bulk_update(usuarios, ['nivel', 'raiz'], batch_size=tamanho_lote)
+
+        HierarquiaUsuario.objects.all().delete()
+        lote = []
+        total = 0
+        for ancestral_id, descendente_id, profundidade in calcular_fechamento(pais):
+            lote.append(HierarquiaUsuario(
+                ancestral_id=ancestral_id,
+                descendente_id=descendente_id,
+                profundidade=profundidade,
+            ))
+            if len(lote) >= tamanho_lote:
+                HierarquiaUsuario.objects.bulk_create(lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            HierarquiaUsuario.objects.bulk_create(lote)
+            total += len(lote)
+
+    return total
+
+
+class HierarquiaFechamento:
+    """
+    Backend baseado na tabela de fechamento
+    """
+    
+    def subcontas(self, usuario):
+        HierarquiaUsuario, Usuario = _modelos()
+        # Subcontas abaixo de uma subconta inativa ficam de fora,
+        # como na busca recursiva por subcontas ativas
+        inativas = HierarquiaUsuario.objects.filter(
+            ancestral=usuario, profundidade__gt=0, descendente__ativo=False
+        ).values('descendente')
+        return Usuario.objects.filter(
+            hierarquia_ancestrais__ancestral=usuario,
+            hierarquia_ancestrais__profundidade__gt=0,
+            ativo=True,
+        ).exclude(hierarquia_ancestrais__ancestral__in=inativas)
+    
+    def ancestrais(self, usuario):
+        _, Usuario = _modelos()
+        return list(
+            Usuario.objects.filter(hierarquia_descendentes__descendente=usuario)
+            .order_by('-hierarquia_descendentes__profundidade')
+        )
+    
+    def nivel(self, usuario):
+        HierarquiaUsuario, _ = _modelos()
+        return HierarquiaUsuario.objects.filter(descendente=usuario).count() - 1
+    
+    def subarvore_ids(self, usuario):
+        """Ids de todos os descendentes, ativos ou não"""
+        HierarquiaUsuario, _ = _modelos()
+        return HierarquiaUsuario.objects.filter(
+            ancestral=usuario, profundidade__gt=0
+        ).values('descendente')
+    
+    def e_descendente(self, usuario, outro):
+        HierarquiaUsuario, _ = _modelos()
+        return HierarquiaUsuario.objects.filter(
+            ancestral=outro, descendente=usuario, profundidade__gt=0
+        ).exists()
+    
+    def no_criado(self, usuario):
+        inserir_no(usuario)
+    
+    def no_movido(self, usuario):
+        mover_subarvore(usuario)
+
+
+class HierarquiaCTE:
+    """
+    Backend baseado em WITH RECURSIVE (SQLite e PostgreSQL)
+    """
+    
+    def _tabela(self):
+        _, Usuario = _modelos()
+        return connection.ops.quote_name(Usuario._meta.db_table)
+    
+    def _sql_descendentes(self, apenas_ativos):
+        filtro = ' AND ativo = %s' if apenas_ativos else ''
+        filtro_recursivo = ' WHERE u.ativo = %s' if apenas_ativos else ''
+        return (
+            f'WITH RECURSIVE arvore(id) AS ('
+            f'SELECT id FROM {self._tabela()} WHERE conta_principal_id = %s{filtro} '
+            f'UNION '
+            f'SELECT u.id FROM {self._tabela()} u JOIN arvore a ON u.conta_principal_id = a.id'
+            f'{filtro_recursivo}'
+            f') SELECT id FROM arvore'
+        )
+    
+    def _sql_ancestrais(self, colunas):
+        return (
+            f'WITH RECURSIVE cadeia(id, conta_principal_id, profundidade) AS ('
+            f'SELECT id, conta_principal_id, 0 FROM {self._tabela()} WHERE id = %s '
+            f'UNION ALL '
+            f'SELECT u.id, u.conta_principal_id, c.profundidade + 1 FROM {self._tabela()} u'
+            f' JOIN cadeia c ON u.id = c.conta_principal_id WHERE c.profundidade < %s'
+            f') SELECT {colunas} FROM cadeia'
+        )
+    
+    def subcontas(self, usuario):
+        _, Usuario = _modelos()
+        sql = self._sql_descendentes(apenas_ativos=True)
+        return Usuario.objects.filter(
+            id__in=RawSQL(sql, [usuario.pk, True, True]),
+            ativo=True,
+        )
+    
+    def subarvore_ids(self, usuario):
+        """Ids de todos os descendentes, ativos ou não"""
+        with connection.cursor() as cursor:
+            cursor.execute(self._sql_descendentes(apenas_ativos=False), [usuario.pk])
+            return [linha[0] for linha in cursor.fetchall()]
+    
+    def ancestrais(self, usuario):
+        _, Usuario = _modelos()
+        sql = self._sql_ancestrais('id')
+        por_id = {
+            u.pk: u for u in Usuario.objects.filter(id__in=RawSQL(sql, [usuario.pk, PROFUNDIDADE_MAXIMA]))
+        }
+        # Ordena da raiz até o próprio usuário seguindo conta_principal
+        cadeia = []
+        atual = por_id.get(usuario.pk)
+        while atual is not None and len(cadeia) <= PROFUNDIDADE_MAXIMA:
+            cadeia.append(atual)
+            atual = por_id.get(atual.conta_principal_id)
+        return list(reversed(cadeia))
+    
+    def nivel(self, usuario):
+        with connection.cursor() as cursor:
+            cursor.execute(self._sql_ancestrais('MAX(profundidade)'), [usuario.pk, PROFUNDIDADE_MAXIMA])
+            linha = cursor.fetchone()
+        return linha[0] or 0
+    
+    def e_descendente(self, usuario, outro):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                self._sql_ancestrais('1') + ' WHERE id = %s AND profundidade > 0',
+                [usuario.pk, PROFUNDIDADE_MAXIMA, outro.pk],
+            )
+            return cursor.fetchone() is not None
+    
+    def no_criado(self, usuario):
+        pass
+    
+    def no_movido(self, usuario):
+        if usuario.conta_principal_id in [usuario.pk, *self.subarvore_ids(usuario)]:
+            raise ValidationError('Uma conta não pode ficar abaixo de uma de suas próprias subcontas.')
+
+
+BACKENDS = {
+    'fechamento': HierarquiaFechamento,
+    'cte': HierarquiaCTE,
+}
+
+
+def get_backend():
+    """Retorna o backend configurado em HIERARQUIA_BACKEND"""
+    nome = getattr(settings, 'HIERARQUIA_BACKEND', 'fechamento')
+    try:
+        return BACKENDS[nome]()
+    except KeyError:
+        raise ValueError(f'HIERARQUIA_BACKEND inválido: {nome}')
@@ -0,0 +1,128 @@
+"""
+Log estruturado em lotes
+
+LoteJSONHandler só enfileira o registro no thread da requisição. Um thread
+em segundo plano formata cada registro como uma linha JSON e grava o lote
+de uma vez quando atinge tamanho_lote registros ou intervalo segundos.
+"""
+
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+# Atributos de todo LogRecord; o que sobrar veio de extra=
+_ATRIBUTOS_PADRAO = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class FormatadorJSON(logging.Formatter):
+    """Formata o registro como um objeto JSON em uma linha"""
+
+    def format(self, record):
+        dados = {
+            'timestamp': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensagem': record.getMessage(),
+        }
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO:
+                dados[chave] = valor
+        if record.exc_info:
+            dados['excecao'] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class LoteJSONHandler(logging.Handler):
+    """
+    Handler não bloqueante que grava registros JSON em lotes
+    """
+
+    def __init__(self, tamanho_lote=100, intervalo=1.0, max_fila=10000, stream=None):
+        super().__init__()
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.stream = stream or sys.stdout
+        self.descartados = 0
+        self.setFormatter(FormatadorJSON())
+        self._fila = queue.Queue(maxsize=max_fila)
+        self._thread = None
+        self._pid = None
+        self._thread_lock = threading.Lock()
+
+    def _garantir_thread(self):
+        # Depois de um fork o thread do processo pai não existe no filho
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._thread_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._consumir, name='log-lote', daemon=True)
+                self._thread.start()
+
+    def emit(self, record):
+        self._garantir_thread()
+        try:
+            self._fila.put_nowait(record)
+        except queue.Full:
+            # Melhor perder log do que travar a requisição
+            self.descartados += 1
+
+    def _gravar(self, lote):
+        if not lote:
+            return
+        linhas = []
+        for record in lote:
+            try:
+                linhas.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        try:
+            self.stream.write('\n'.join(linhas) + '\n')
+            self.stream.flush()
+        except Exception:
+            self.handleError(lote[-1])
+
+    def _consumir(self):
+        lote = []
+        limite = time.monotonic() + self.intervalo
+        while True:
+            try:
+                item = self._fila.get(timeout=max(0, limite - time.monotonic()))
+            except queue.Empty:
+                item = False
+
+            if isinstance(item, logging.LogRecord):
+                lote.append(item)
+                if len(lote) < self.tamanho_lote and time.monotonic() < limite:
+                    continue
+            elif item is False and not lote:
+                limite = time.monotonic() + self.intervalo
+                continue
+
+            self._gravar(lote)
+            lote = []
+            limite = time.monotonic() + self.intervalo
+
+            # Marcadores de flush() e close()
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    def flush(self):
+        """Espera os registros já enfileirados serem gravados"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        gravado = threading.Event()
+        self._fila.put(gravado)
+        gravado.wait(timeout=5)
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._fila.put(None)
+            self._thread.join(timeout=5)
+        super().close()
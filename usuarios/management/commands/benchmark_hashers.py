@@ -0,0 +1,148 @@
+import math
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from usuarios.hashers import Argon2Ajustado, PBKDF2Ajustado, ScryptAjustado
+
+SENHA_TESTE = 'Benchmark123!'
+
+# Mínimos seguros (os padrões do Django). Abaixo deles, must_update faria
+# os logins regravarem os hashes existentes com um custo menor.
+PISO_PBKDF2 = PBKDF2PasswordHasher.iterations
+PISO_SCRYPT = ScryptPasswordHasher.work_factor
+PISO_ARGON2 = Argon2PasswordHasher.time_cost
+
+
+def _p99(tempos):
+    if len(tempos) < 2:
+        return tempos[0]
+    return statistics.quantiles(tempos, n=100, method='inclusive')[98]
+
+
+class Command(BaseCommand):
+    help = 'Mede cada hasher de senha nesta máquina e recomenda parâmetros para um p99 alvo de login'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--alvo-p99-ms',
+            type=float,
+            default=250,
+            help='Latência p99 desejada para verificar uma senha, em milissegundos',
+        )
+        parser.add_argument(
+            '--amostras',
+            type=int,
+            default=20,
+            help='Quantidade de hashes medidos por hasher',
+        )
+        parser.add_argument(
+            '--concorrencia',
+            type=int,
+            default=1,
+            help='Hashes simultâneos durante a medição (simula rajadas de login)',
+        )
+        parser.add_argument(
+            '--perfis',
+            default='pbkdf2,scrypt,argon2',
+            help='Perfis a medir, separados por vírgula',
+        )
+
+    def _medir(self, hasher, amostras, concorrencia):
+        """Retorna os tempos (ms) de cada hash"""
+        def medir_um(_):
+            inicio = time.perf_counter()
+            hasher.encode(SENHA_TESTE, hasher.salt())
+            return (time.perf_counter() - inicio) * 1000
+
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            return list(executor.map(medir_um, range(amostras)))
+
+    def _relatar(self, nome, parametros, tempos):
+        self.stdout.write(
+            f'{nome:<8} {parametros:<32} '
+            f'p50={statistics.median(tempos):8.1f}ms  p99={_p99(tempos):8.1f}ms'
+        )
+
+    def _com_piso(self, parametro, recomendado, piso):
+        """O recomendado, ou o piso com um aviso quando o alvo pede menos"""
+        if recomendado is not None and recomendado >= piso:
+            return recomendado
+        self.stderr.write(self.style.WARNING(
+            f'{parametro}: o alvo pede menos que o mínimo seguro ({piso}); recomendando o mínimo. '
+            'Aumente --alvo-p99-ms ou a capacidade do servidor em vez de reduzir o custo.'
+        ))
+        return piso
+
+    def _pbkdf2(self, alvo, amostras, concorrencia):
+        iteracoes = settings.PBKDF2_ITERACOES
+        tempos = self._medir(PBKDF2Ajustado(), amostras, concorrencia)
+        self._relatar('pbkdf2', f'iteracoes={iteracoes}', tempos)
+        # O custo do PBKDF2 cresce linearmente com as iterações
+        recomendado = int(iteracoes * alvo / _p99(tempos)) // 10000 * 10000
+        return f'PBKDF2_ITERACOES={self._com_piso("PBKDF2_ITERACOES", recomendado, PISO_PBKDF2)}'
+
+    def _scrypt(self, alvo, amostras, concorrencia):
+        melhor = None
+        # O work factor precisa ser potência de 2; mede cada candidato a partir do piso
+        for expoente in range(PISO_SCRYPT.bit_length() - 1, 18):
+            work_factor = 2 ** expoente
+            with override_settings(SCRYPT_WORK_FACTOR=work_factor):
+                tempos = self._medir(ScryptAjustado(), amostras, concorrencia)
+            self._relatar('scrypt', f'work_factor=2**{expoente}', tempos)
+            if _p99(tempos) > alvo:
+                break
+            melhor = work_factor
+        return f'SCRYPT_WORK_FACTOR={self._com_piso("SCRYPT_WORK_FACTOR", melhor, PISO_SCRYPT)}'
+
+    def _argon2(self, alvo, amostras, concorrencia):
+        hasher = Argon2Ajustado()
+        try:
+            hasher._load_library()
+        except ValueError:
+            self.stderr.write(self.style.WARNING('argon2 ignorado: argon2-cffi não instalado (pip install argon2-cffi)'))
+            return None
+        time_cost = settings.ARGON2_TIME_COST
+        tempos = self._medir(hasher, amostras, concorrencia)
+        self._relatar(
+            'argon2',
+            f'time_cost={time_cost} memory_cost={settings.ARGON2_MEMORY_COST}',
+            tempos,
+        )
+        # O tempo cresce linearmente com time_cost para a mesma memória
+        recomendado = self._com_piso('ARGON2_TIME_COST', math.floor(time_cost * alvo / _p99(tempos)), PISO_ARGON2)
+        return f'ARGON2_TIME_COST={recomendado} (ARGON2_MEMORY_COST={settings.ARGON2_MEMORY_COST})'
+
+    def handle(self, *args, **options):
+        alvo = options['alvo_p99_ms']
+        amostras = options['amostras']
+        concorrencia = options['concorrencia']
+        medidores = {
+            'pbkdf2': self._pbkdf2,
+            'scrypt': self._scrypt,
+            'argon2': self._argon2,
+        }
+
+        self.stdout.write(
+            f'Alvo p99: {alvo:.0f}ms, {amostras} amostras, concorrência {concorrencia}, '
+            f'perfil atual: {settings.PASSWORD_HASHER_PERFIL}\n'
+        )
+
+        recomendacoes = {}
+        for perfil in options['perfis'].split(','):
+            perfil = perfil.strip()
+            if perfil not in medidores:
+                self.stderr.write(f'Perfil desconhecido: {perfil}')
+                continue
+            recomendacao = medidores[perfil](alvo, amostras, concorrencia)
+            if recomendacao:
+                recomendacoes[perfil] = recomendacao
+
+        self.stdout.write('\nRecomendações:')
+        for perfil, recomendacao in recomendacoes.items():
+            self.stdout.write(self.style.SUCCESS(f'  {perfil}: PASSWORD_HASHER_PERFIL={perfil} {recomendacao}'))
@@ -0,0 +1,156 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from steam.models import ContaStreaming
+from steam.serializacao import CAMPOS_CONTA
+from usuarios.models import Usuario
+from usuarios.renderers import JSONRapidoRenderer, orjson
+from usuarios.serializacao import CAMPOS_USUARIO
+
+
+def _conta_por_instancia(conta, usuario_logado):
+    """Serialização anterior: um dicionário montado a partir de cada instância"""
+    is_proprietario, pode_editar, pode_deletar = conta.permissoes_para(usuario_logado)
+    return {
+        'id': conta.id,
+        'nome': conta.nome,
+        'plataforma': conta.plataforma,
+        'plataforma_display': conta.get_plataforma_display(),
+        'email': conta.email,
+        'usuario': conta.usuario,
+        'foto': conta.foto.url if conta.foto else None,
+        'descricao': conta.descricao,
+        'status': conta.status,
+        'status_display': conta.get_status_display(),
+        'data_criacao': conta.data_criacao,
+        'data_expiracao': conta.data_expiracao,
+        'ultimo_acesso': conta.ultimo_acesso,
+        'proprietario': {
+            'id': conta.proprietario.id,
+            'nome': conta.proprietario.nome,
+            'email': conta.proprietario.email,
+        },
+        'is_proprietario': is_proprietario,
+        'pode_editar': pode_editar,
+        'pode_deletar': pode_deletar,
+    }
+
+
+def _usuario_por_instancia(usuario):
+    return {
+        'id': usuario.id,
+        'nome': usuario.nome,
+        'email': usuario.email,
+        'tipo': usuario.tipo,
+        'tipo_display': usuario.get_tipo_display(),
+        'foto': usuario.foto.url if usuario.foto else None,
+        'conta_principal': usuario.conta_principal.nome if usuario.conta_principal else None,
+        'criado_por': usuario.criado_por.nome if usuario.criado_por else None,
+        'data_criacao': usuario.data_criacao,
+        'nivel_hierarquia': usuario.nivel,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede linhas por segundo das listagens de contas e usuários: serialização por '
+        'instância x por .values() e JSONRenderer x JSONRapidoRenderer'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--linhas',
+            type=int,
+            default=5000,
+            help='Contas e usuários temporários criados para a medição (desfeitos ao final)',
+        )
+        parser.add_argument(
+            '--repeticoes',
+            type=int,
+            default=3,
+            help='Repetições de cada medição; vale a mais rápida',
+        )
+
+    def _medir(self, funcao, repeticoes):
+        melhor = None
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            resultado = funcao()
+            duracao = time.perf_counter() - inicio
+            melhor = duracao if melhor is None else min(melhor, duracao)
+        return melhor, resultado
+
+    def _relatar(self, nome, linhas, antes, depois):
+        self.stdout.write(
+            f'{nome:<28} antes={linhas / antes:>10,.0f} linhas/s  '
+            f'depois={linhas / depois:>10,.0f} linhas/s  ({antes / depois:4.1f}x)'
+        )
+
+    def _comparar(self, nome, linhas, antes, depois, repeticoes):
+        tempo_antes, dados_antes = self._medir(antes, repeticoes)
+        tempo_depois, dados_depois = self._medir(depois, repeticoes)
+        self._relatar(f'{nome} (serialização)', linhas, tempo_antes, tempo_depois)
+
+        padrao, rapido = JSONRenderer(), JSONRapidoRenderer()
+        tempo_antes_json, _ = self._medir(lambda: padrao.render(dados_antes), repeticoes)
+        tempo_depois_json, _ = self._medir(lambda: rapido.render(dados_depois), repeticoes)
+        self._relatar(f'{nome} (JSON)', linhas, tempo_antes_json, tempo_depois_json)
+        self._relatar(f'{nome} (total)', linhas, tempo_antes + tempo_antes_json, tempo_depois + tempo_depois_json)
+
+    def _criar_dados(self, linhas):
+        sufixo = uuid.uuid4().hex[:8]
+        dono = Usuario.objects.create(
+            nome='Benchmark', email=f'benchmark-{sufixo}@exemplo.com', senha='Benchmark123!', tipo='admin'
+        )
+        # bulk_create não passa por save(): as senhas ficam como estão
+        ContaStreaming.objects.bulk_create([
+            ContaStreaming(
+                nome=f'Conta {i}', plataforma='netflix', email=f'conta{i}-{sufixo}@exemplo.com',
+                senha='x', descricao='Conta de benchmark', proprietario=dono,
+            )
+            for i in range(linhas)
+        ], batch_size=1000)
+        Usuario.objects.bulk_create([
+            Usuario(
+                nome=f'Sub {i}', email=f'sub{i}-{sufixo}@exemplo.com', senha='x',
+                conta_principal=dono, criado_por=dono, nivel=1, raiz=dono,
+            )
+            for i in range(linhas)
+        ], batch_size=1000)
+        return dono
+
+    def handle(self, *args, **options):
+        linhas = options['linhas']
+        repeticoes = options['repeticoes']
+        self.stdout.write(
+            f'{linhas} linhas, melhor de {repeticoes}, '
+            f'orjson {"disponível" if orjson else "ausente (JSONRapidoRenderer usa o JSONRenderer)"}\n'
+        )
+
+        with transaction.atomic():
+            dono = self._criar_dados(linhas)
+
+            def contas_antes():
+                contas = ContaStreaming.objects.visiveis_para(dono)
+                return [_conta_por_instancia(conta, dono) for conta in contas]
+
+            def contas_depois():
+                contas = CAMPOS_CONTA.valores(ContaStreaming.objects.visiveis_para(dono), CAMPOS_CONTA.todos)
+                return [CAMPOS_CONTA.serializar(linha, usuario_logado=dono) for linha in contas]
+
+            def usuarios_antes():
+                usuarios = dono.get_subcontas().select_related('conta_principal', 'criado_por')
+                return [_usuario_por_instancia(usuario) for usuario in usuarios]
+
+            def usuarios_depois():
+                usuarios = CAMPOS_USUARIO.valores(dono.get_subcontas(), CAMPOS_USUARIO.todos)
+                return [CAMPOS_USUARIO.serializar(linha) for linha in usuarios]
+
+            self._comparar('contas', linhas, contas_antes, contas_depois, repeticoes)
+            self._comparar('usuarios', linhas, usuarios_antes, usuarios_depois, repeticoes)
+
+            transaction.set_rollback(True)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from usuarios import hierarquia
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de hierarquia, o nível e a raiz dos usuários a partir de conta_principal'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamanho-lote',
+            type=int,
+            default=1000,
+            help='Quantidade de linhas inseridas por lote',
+        )
+
+    def handle(self, *args, **options):
+        total = hierarquia.reconstruir(tamanho_lote=options['tamanho_lote'])
+        self.stdout.write(self.style.SUCCESS(f'Hierarquia reconstruída: {total} linhas de fechamento'))
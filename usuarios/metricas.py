@@ -0,0 +1,425 @@
+"""
+Métricas de desempenho no formato de texto do Prometheus
+
+MetricasMiddleware registra, por nome de URL resolvido (ex.:
+'steam:streaming_list_create', 'api_login'), um histograma de latência, o
+total de requisições por status e o número e o tempo das consultas ao banco.
+
+Com METRICAS_DIRETORIO configurado, cada processo (worker do gunicorn)
+grava periodicamente um instantâneo em METRICAS_DIRETORIO/<pid>-<início>.json
+e o endpoint soma os arquivos de todos os processos na exportação. O
+início do processo entra no nome para que um pid reaproveitado não
+sobrescreva o arquivo de um worker encerrado. Os contadores e histogramas
+dos encerrados são somados em encerrados.json, e os arquivos deles
+apagados, para não voltarem para trás; os medidores só vêm de processos
+vivos.
+"""
+
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.urls import Resolver404, resolve
+
+PREFIXO = 'gerenciador_'
+
+# Limites (segundos) dos buckets do histograma de latência
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Soma dos contadores e histogramas dos processos encerrados
+ARQUIVO_ENCERRADOS = 'encerrados.json'
+
+DESCRICOES = {
+    'http_requisicoes_total': 'Requisições atendidas por view, método e status',
+    'http_duracao_segundos': 'Latência das requisições por view e método',
+    'db_consultas_total': 'Consultas ao banco executadas por view',
+    'db_duracao_segundos_total': 'Tempo gasto em consultas ao banco por view',
+    'cache_listagem_contas_total': 'Consultas ao cache da listagem de contas por resultado',
+}
+
+
+class RegistroMetricas:
+    """
+    Contadores e histogramas do processo atual
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._histogramas = {}
+
+    @staticmethod
+    def _chave(nome, rotulos):
+        return nome, tuple(sorted(rotulos.items()))
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        """Soma valor ao contador nome com os rótulos dados"""
+        chave = self._chave(nome, rotulos)
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def observar(self, nome, valor, **rotulos):
+        """Registra uma observação no histograma nome"""
+        chave = self._chave(nome, rotulos)
+        indice = next((i for i, limite in enumerate(BUCKETS) if valor <= limite), len(BUCKETS))
+        with self._lock:
+            histograma = self._histogramas.get(chave)
+            if histograma is None:
+                histograma = self._histogramas[chave] = {'buckets': [0] * (len(BUCKETS) + 1), 'soma': 0.0}
+            histograma['buckets'][indice] += 1
+            histograma['soma'] += valor
+
+    def instantaneo(self):
+        """Retorna uma cópia serializável em JSON do estado atual"""
+        with self._lock:
+            return {
+                'contadores': [
+                    [nome, dict(rotulos), valor]
+                    for (nome, rotulos), valor in self._contadores.items()
+                ],
+                'histogramas': [
+                    [nome, dict(rotulos), list(h['buckets']), h['soma']]
+                    for (nome, rotulos), h in self._histogramas.items()
+                ],
+                'medidores': _medidores_processo(),
+            }
+
+    def zerar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+
+
+registro = RegistroMetricas()
+_ultima_gravacao = 0.0
+
+
+def incrementar(nome, valor=1, **rotulos):
+    registro.incrementar(nome, valor, **rotulos)
+
+
+def observar(nome, valor, **rotulos):
+    registro.observar(nome, valor, **rotulos)
+
+
+def _medidores_processo():
+    """Estado do executor de hash, se já tiver sido criado neste processo"""
+    from . import hashing
+    if hashing._executor is None:
+        return {}
+    dados = hashing.metricas()
+    return {
+        f'hash_executor_{chave}': valor
+        for chave, valor in dados.items()
+        if isinstance(valor, int)
+    }
+
+
+def _inicio_processo(pid):
+    """Início do processo (em ticks desde o boot, de /proc), ou None fora do Linux"""
+    try:
+        with open(f'/proc/{pid}/stat') as arquivo:
+            # O nome do executável (2º campo) pode ter espaços: os campos seguem o último ')'
+            return arquivo.read().rsplit(')', 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+_identidade = None
+
+
+def _arquivo_processo(diretorio):
+    """<pid>-<início>.json deste processo (refeito após um fork)"""
+    global _identidade
+    pid = os.getpid()
+    if _identidade is None or _identidade[0] != pid:
+        _identidade = (pid, f'{pid}-{_inicio_processo(pid) or time.time_ns()}.json')
+    return os.path.join(diretorio, _identidade[1])
+
+
+def _gravar_json(destino, dados):
+    # Um temporário por gravação: a periódica e a do coletar podem coincidir
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(destino), prefix=f'{os.getpid()}.', suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'w') as arquivo:
+            json.dump(dados, arquivo)
+        # Troca atômica: o leitor nunca vê um arquivo pela metade
+        os.replace(temporario, destino)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def _ler_json(caminho):
+    try:
+        with open(caminho) as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+def gravar_instantaneo(forcar=False):
+    """Grava o instantâneo deste processo em METRICAS_DIRETORIO"""
+    global _ultima_gravacao
+    diretorio = settings.METRICAS_DIRETORIO
+    if not diretorio:
+        return
+    agora = time.monotonic()
+    if not forcar and agora - _ultima_gravacao < settings.METRICAS_INTERVALO_GRAVACAO:
+        return
+    _ultima_gravacao = agora
+
+    os.makedirs(diretorio, exist_ok=True)
+    _gravar_json(_arquivo_processo(diretorio), registro.instantaneo())
+
+
+def _processo_vivo(pid):
+    """Se o processo ainda existe (o sinal 0 só verifica, não entrega nada)"""
+    if os.name == 'nt':
+        # No Windows os.kill encerraria o processo
+        return True
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _arquivo_vivo(nome):
+    """Se o processo que grava o arquivo <pid>-<início> ainda é o mesmo"""
+    pid, _, inicio = nome.split('.', 1)[0].partition('-')
+    if not (pid.isdigit() and _processo_vivo(int(pid))):
+        return False
+    atual = _inicio_processo(int(pid))
+    # Sem /proc (ou arquivo antigo, só com o pid) fica valendo o pid
+    return atual is None or not inicio or atual == inicio
+
+
+@contextmanager
+def _trava(diretorio):
+    """Lock exclusivo entre os processos; entrega False onde não há fcntl"""
+    if fcntl is None:
+        yield False
+        return
+    with open(os.path.join(diretorio, '.trava'), 'a') as arquivo:
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            yield True
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def _incorporar_encerrados(diretorio, encerrados):
+    """
+    Soma os instantâneos dos processos encerrados em ARQUIVO_ENCERRADOS e
+    apaga os arquivos deles (e temporários que tenham deixado). Os nomes
+    somados ficam registrados até serem apagados, para que uma coleta
+    interrompida entre a gravação e a remoção não os some de novo.
+    Chamar com a trava.
+    """
+    caminho = os.path.join(diretorio, ARQUIVO_ENCERRADOS)
+    total = _ler_json(caminho) or {}
+    incorporados = set(total.get('incorporados', []))
+    instantaneos = [total]
+    for nome in encerrados:
+        if nome not in incorporados:
+            dados = _ler_json(os.path.join(diretorio, nome))
+            if dados is not None:
+                instantaneos.append(dados)
+    contadores, histogramas, _ = agregar(instantaneos)
+    _gravar_json(caminho, {
+        'contadores': [[nome, dict(rotulos), valor] for (nome, rotulos), valor in contadores.items()],
+        'histogramas': [[nome, dict(rotulos), h['buckets'], h['soma']] for (nome, rotulos), h in histogramas.items()],
+        'medidores': {},
+        'incorporados': sorted(encerrados),
+    })
+
+    temporarios = [
+        caminho for caminho in glob.glob(os.path.join(diretorio, '*.tmp'))
+        if not _arquivo_vivo(os.path.basename(caminho))
+    ]
+    for caminho in [os.path.join(diretorio, nome) for nome in encerrados] + temporarios:
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+
+
+def agregar(instantaneos):
+    """Soma instantâneos de vários processos"""
+    contadores = {}
+    histogramas = {}
+    medidores = {}
+    for dados in instantaneos:
+        for nome, rotulos, valor in dados.get('contadores', []):
+            chave = RegistroMetricas._chave(nome, rotulos)
+            contadores[chave] = contadores.get(chave, 0) + valor
+        for nome, rotulos, buckets, soma in dados.get('histogramas', []):
+            chave = RegistroMetricas._chave(nome, rotulos)
+            if chave not in histogramas:
+                histogramas[chave] = {'buckets': [0] * len(buckets), 'soma': 0.0}
+            acumulado = histogramas[chave]
+            acumulado['buckets'] = [a + b for a, b in zip(acumulado['buckets'], buckets)]
+            acumulado['soma'] += soma
+        for nome, valor in dados.get('medidores', {}).items():
+            medidores[nome] = medidores.get(nome, 0) + valor
+    return contadores, histogramas, medidores
+
+
+def coletar():
+    """Instantâneos de todos os processos (ou só deste, sem diretório)"""
+    diretorio = settings.METRICAS_DIRETORIO
+    if not diretorio:
+        return [registro.instantaneo()]
+
+    gravar_instantaneo(forcar=True)
+    # Com a trava, nenhum arquivo lido aqui é somado em encerrados.json por outra coleta
+    with _trava(diretorio) as travado:
+        vivos, encerrados = [], []
+        for caminho in sorted(glob.glob(os.path.join(diretorio, '*.json'))):
+            nome = os.path.basename(caminho)
+            if nome != ARQUIVO_ENCERRADOS:
+                (vivos if _arquivo_vivo(nome) else encerrados).append(nome)
+        if travado and encerrados:
+            _incorporar_encerrados(diretorio, encerrados)
+            encerrados = []
+
+        instantaneos = []
+        for nome in vivos + encerrados + [ARQUIVO_ENCERRADOS]:
+            dados = _ler_json(os.path.join(diretorio, nome))
+            if dados is None:
+                continue
+            if nome in encerrados:
+                # Medidores de um worker encerrado não descrevem mais nada
+                dados['medidores'] = {}
+            instantaneos.append(dados)
+    return instantaneos
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_rotulos(rotulos, extra=()):
+    pares = list(rotulos) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{chave}="{_escapar(valor)}"' for chave, valor in pares) + '}'
+
+
+def _cabecalho(linhas, nome, tipo):
+    if nome in DESCRICOES:
+        linhas.append(f'# HELP {PREFIXO}{nome} {DESCRICOES[nome]}')
+    linhas.append(f'# TYPE {PREFIXO}{nome} {tipo}')
+
+
+def formatar_prometheus(contadores, histogramas, medidores):
+    """Gera o texto de exposição (versão 0.0.4)"""
+    linhas = []
+
+    ultimo = None
+    for (nome, rotulos), valor in sorted(contadores.items()):
+        if nome != ultimo:
+            _cabecalho(linhas, nome, 'counter')
+            ultimo = nome
+        linhas.append(f'{PREFIXO}{nome}{_formatar_rotulos(rotulos)} {valor}')
+
+    ultimo = None
+    for (nome, rotulos), histograma in sorted(histogramas.items()):
+        if nome != ultimo:
+            _cabecalho(linhas, nome, 'histogram')
+            ultimo = nome
+        acumulado = 0
+        limites = [str(limite) for limite in BUCKETS] + ['+Inf']
+        for limite, quantidade in zip(limites, histograma['buckets']):
+            acumulado += quantidade
+            linhas.append(f'{PREFIXO}{nome}_bucket{_formatar_rotulos(rotulos, [("le", limite)])} {acumulado}')
+        linhas.append(f'{PREFIXO}{nome}_sum{_formatar_rotulos(rotulos)} {histograma["soma"]}')
+        linhas.append(f'{PREFIXO}{nome}_count{_formatar_rotulos(rotulos)} {acumulado}')
+
+    for nome, valor in sorted(medidores.items()):
+        _cabecalho(linhas, nome, 'gauge')
+        linhas.append(f'{PREFIXO}{nome} {valor}')
+
+    return '\n'.join(linhas) + '\n'
+
+
+def metricas_view(request):
+    """
+    Exporta as métricas para o Prometheus.
+    Só responde para os IPs em METRICAS_IPS_PERMITIDOS.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICAS_IPS_PERMITIDOS:
+        raise Http404()
+
+    texto = formatar_prometheus(*agregar(coletar()))
+    return HttpResponse(texto, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class _ContadorConsultas:
+    """execute_wrapper que conta e cronometra as consultas da requisição"""
+
+    def __init__(self):
+        self.quantidade = 0
+        self.duracao = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.quantidade += 1
+            self.duracao += time.perf_counter() - inicio
+
+
+class MetricasMiddleware:
+    """
+    Middleware que mede latência e consultas ao banco por view
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _nome_view(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            # Respostas de middleware (401, 429) não passam pela resolução
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                return 'nao_resolvida'
+        return match.view_name
+
+    def __call__(self, request):
+        if not settings.METRICAS_ATIVAS:
+            return self.get_response(request)
+
+        consultas = _ContadorConsultas()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(consultas):
+            response = self.get_response(request)
+        duracao = time.perf_counter() - inicio
+
+        view = self._nome_view(request)
+
+        registro.incrementar('http_requisicoes_total', view=view, metodo=request.method, status=response.status_code)
+        registro.observar('http_duracao_segundos', duracao, view=view, metodo=request.method)
+        registro.incrementar('db_consultas_total', consultas.quantidade, view=view)
+        registro.incrementar('db_duracao_segundos_total', consultas.duracao, view=view)
+
+        gravar_instantaneo()
+        return response
@@ -3,8 +3,17 @@ Middleware para autenticação automática
 Verifica se o usuário está logado em todas as requisições
 """
 
+import logging
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
 from django.http import JsonResponse
-from .models import Usuario
+from .autenticacao import autenticar
+
+logger = logging.getLogger('api_access')
 
 
 class AuthenticationMiddleware:
@@ -21,30 +30,16 @@ class AuthenticationMiddleware:
             # APIs públicas que não precisam de autenticação
             public_apis = [
                 '/api/login/',
+                '/api/login/async/',
                 '/api/criar-admin-inicial/',
                 '/api/validar-senha/',
             ]
             
             # Se não for API pública, verificar autenticação
             if request.path not in public_apis:
-                usuario_id = request.session.get('usuario_logado_id')
-                
-                if not usuario_id:
-                    return JsonResponse({
-                        'error': 'Usuário não autenticado',
-                        'message': 'Faça login para acessar este recurso'
-                    }, status=401)
-                
-                try:
-                    usuario = Usuario.objects.get(id=usuario_id, ativo=True)
-                    request.usuario_logado = usuario
-                except Usuario.DoesNotExist:
-                    # Limpar sessão inválida
-                    request.session.flush()
-                    return JsonResponse({
-                        'error': 'Sessão inválida',
-                        'message': 'Usuário não encontrado ou inativo'
-                    }, status=401)
+                resposta = autenticar(request)
+                if resposta is not None:
+                    return resposta
         
         response = self.get_response(request)
         return response
@@ -53,39 +48,80 @@ class AuthenticationMiddleware:
 class RateLimitMiddleware:
     """
     Middleware para limitar taxa de requisições
+
+    Janela deslizante aproximada: um contador por janela fixa no cache,
+    incrementado de forma atômica, e o contador da janela anterior
+    ponderado pelo tempo que ainda se sobrepõe à janela atual. Os
+    contadores são separados por identidade (usuário logado ou IP) e por
+    classe de endpoint (auth, leitura, escrita).
     """
     
+    # Endpoints de autenticação têm contador próprio
+    apis_auth = (
+        '/api/login/',
+        '/api/login/async/',
+        '/api/criar-admin-inicial/',
+        '/api/validar-senha/',
+    )
+    metodos_leitura = ('GET', 'HEAD', 'OPTIONS')
+    
     def __init__(self, get_response):
         self.get_response = get_response
     
+    def _classe_endpoint(self, request):
+        if request.path in self.apis_auth:
+            return 'auth'
+        if request.method in self.metodos_leitura:
+            return 'leitura'
+        return 'escrita'
+    
+    def _identidade(self, request):
+        usuario_id = request.session.get('usuario_logado_id')
+        if usuario_id:
+            return f'u{usuario_id}'
+        return f"ip{request.META.get('REMOTE_ADDR', '')}"
+    
+    def _incrementar(self, chave, periodo):
+        # add não sobrescreve um contador existente; incr é atômico no backend
+        cache.add(chave, 0, timeout=periodo * 2)
+        try:
+            return cache.incr(chave)
+        except ValueError:
+            # A chave expirou entre o add e o incr
+            cache.set(chave, 1, timeout=periodo * 2)
+            return 1
+    
     def __call__(self, request):
-        # Implementação básica de rate limiting
-        # Em produção, use Redis ou similar
+        if not request.path.startswith('/api/'):
+            return self.get_response(request)
         
-        if request.path.startswith('/api/'):
-            # Contar requisições por sessão
-            request_count = request.session.get('request_count', 0)
-            last_request = request.session.get('last_request_time', 0)
-            
-            import time
-            current_time = time.time()
-            
-            # Reset se passou 1 hora
-            if current_time - last_request > 3600:
-                request_count = 0
-            
-            # Limite de 100 requisições por hora
-            if request_count >= 100:
-                return JsonResponse({
-                    'error': 'Rate limit exceeded',
-                    'message': 'Máximo de 100 requisições por hora'
-                }, status=429)
-            
-            # Incrementar contador
-            request.session['request_count'] = request_count + 1
-            request.session['last_request_time'] = current_time
+        limite = settings.API_RATE_LIMIT
+        periodo = settings.API_RATE_LIMIT_PERIOD
+        agora = time.time()
+        janela = int(agora // periodo)
+        decorrido = agora - janela * periodo
         
-        response = self.get_response(request)
+        prefixo = f'ratelimit:{self._classe_endpoint(request)}:{self._identidade(request)}'
+        atual = self._incrementar(f'{prefixo}:{janela}', periodo)
+        anterior = cache.get(f'{prefixo}:{janela - 1}', 0)
+        estimado = anterior * (1 - decorrido / periodo) + atual
+        
+        restantes = max(0, limite - math.ceil(estimado))
+        reset = max(1, math.ceil(periodo - decorrido))
+        
+        if estimado > limite:
+            response = JsonResponse({
+                'error': 'Rate limit exceeded',
+                'message': f'Máximo de {limite} requisições a cada {periodo} segundos'
+            }, status=429)
+            response['Retry-After'] = str(reset)
+        else:
+            response = self.get_response(request)
+        
+        response['RateLimit-Limit'] = str(limite)
+        response['RateLimit-Remaining'] = str(restantes)
+        response['RateLimit-Reset'] = str(reset)
+        response['RateLimit-Policy'] = f'{limite};w={periodo}'
         return response
 
 
@@ -98,20 +134,22 @@ class LoggingMiddleware:
         self.get_response = get_response
     
     def __call__(self, request):
-        # Log da requisição
-        if request.path.startswith('/api/'):
-            import logging
-            logger = logging.getLogger('api_access')
-            
-            usuario_id = request.session.get('usuario_logado_id', 'anonymous')
-            logger.info(f"API Request: {request.method} {request.path} by user {usuario_id}")
+        if not request.path.startswith('/api/'):
+            return self.get_response(request)
         
+        inicio = time.perf_counter()
         response = self.get_response(request)
+        duracao_ms = (time.perf_counter() - inicio) * 1000
         
-        # Log da resposta
-        if request.path.startswith('/api/'):
-            import logging
-            logger = logging.getLogger('api_access')
-            logger.info(f"API Response: {response.status_code} for {request.path}")
+        # Respostas 2xx podem ser amostradas para não inundar o pipeline de logs
+        if 200 <= response.status_code < 300 and random.random() >= settings.API_LOG_AMOSTRAGEM_2XX:
+            return response
         
+        logger.info('api_request', extra={
+            'metodo': request.method,
+            'caminho': request.path,
+            'usuario': request.session.get('usuario_logado_id'),
+            'status': response.status_code,
+            'duracao_ms': round(duracao_ms, 2),
+        })
         return response
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from usuarios.hierarquia import calcular_fechamento
+
+
+def popular_hierarquia(apps, schema_editor):
+    Usuario = apps.get_model('usuarios', 'Usuario')
+    HierarquiaUsuario = apps.get_model('usuarios', 'HierarquiaUsuario')
+    pais = dict(Usuario.objects.values_list('id', 'conta_principal_id'))
+    HierarquiaUsuario.objects.bulk_create(
+        [
+            HierarquiaUsuario(ancestral_id=ancestral_id, descendente_id=descendente_id, profundidade=profundidade)
+            for ancestral_id, descendente_id, profundidade in calcular_fechamento(pais)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0002_alter_usuario_options_usuario_ativo_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HierarquiaUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profundidade', models.PositiveIntegerField()),
+                ('ancestral', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hierarquia_descendentes', to='usuarios.usuario')),
+                ('descendente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hierarquia_ancestrais', to='usuarios.usuario')),
+            ],
+            options={
+                'verbose_name': 'Hierarquia de Usuário',
+                'verbose_name_plural': 'Hierarquia de Usuários',
+                'unique_together': {('ancestral', 'descendente')},
+            },
+        ),
+        migrations.RunPython(popular_hierarquia, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from usuarios.hierarquia import calcular_posicoes
+
+
+def popular_posicoes(apps, schema_editor):
+    Usuario = apps.get_model('usuarios', 'Usuario')
+    pais = dict(Usuario.objects.values_list('id', 'conta_principal_id'))
+    posicoes = calcular_posicoes(pais)
+    usuarios = list(Usuario.objects.only('id'))
+    for usuario in usuarios:
+        usuario.nivel, usuario.raiz_id = posicoes.get(usuario.id, (0, usuario.id))
+    Usuario.objects.bulk_update(usuarios, ['nivel', 'raiz'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0003_hierarquiausuario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='nivel',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='raiz',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='usuarios.usuario'),
+        ),
+        migrations.RunPython(popular_posicoes, migrations.RunPython.noop),
+    ]
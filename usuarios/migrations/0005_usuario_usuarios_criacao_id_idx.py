@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0004_usuario_nivel_raiz'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['-data_criacao', '-id'], name='usuarios_criacao_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0005_usuario_usuarios_criacao_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['conta_principal', '-data_criacao', '-id'], name='usuarios_principal_ativo_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0006_usuario_principal_ativo_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usuario',
+            name='raiz',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='usuarios.usuario'),
+        ),
+    ]
@@ -1,6 +1,7 @@
-from django.db import models
-from django.contrib.auth.hashers import make_password, check_password
+from django.db import models, transaction
+from django.db.models import Q
 from django.utils import timezone
+from . import hashing, hierarquia
 # Create your models here.
 class Usuario(models.Model):
     TIPO_CHOICES = [
@@ -21,23 +22,127 @@ class Usuario(models.Model):
     data_criacao = models.DateTimeField(default=timezone.now)
     ativo = models.BooleanField(default=True)
     
+    # Posição na hierarquia, mantida a cada mudança de conta_principal
+    nivel = models.PositiveIntegerField(default=0, editable=False)
+    # Ponteiro desnormalizado: nunca deve apagar usuários em cascata
+    raiz = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
+    
     class Meta:
         verbose_name = 'Usuário'
         verbose_name_plural = 'Usuários'
         ordering = ['-data_criacao']
+        indexes = [
+            # Paginação por cursor em (data_criacao, id)
+            models.Index(fields=['-data_criacao', '-id'], name='usuarios_criacao_id_idx'),
+            # Subcontas diretas ativas (get_subcontas) na ordem do Meta
+            models.Index(fields=['conta_principal', '-data_criacao', '-id'], name='usuarios_principal_ativo_idx', condition=Q(ativo=True)),
+        ]
     
     def __str__(self):
         return f"{self.nome} ({self.get_tipo_display()})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda a conta principal carregada para detectar mudanças de hierarquia
+        instance._conta_principal_original_id = instance.__dict__.get('conta_principal_id')
+        return instance
+    
     def save(self, *args, **kwargs):
+        # Campos de .only()/.defer() não são lidos (cada um seria uma consulta) nem gravados
+        adiados = self.get_deferred_fields()
+        
         # Hash da senha se não estiver hasheada
-        if not self.senha.startswith('pbkdf2_sha256$'):
-            self.senha = make_password(self.senha)
-        super().save(*args, **kwargs)
+        if 'senha' not in adiados and not hashing.e_hash(self.senha):
+            self.senha = hashing.gerar_hash(self.senha)
+        
+        novo = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        if 'conta_principal_id' in adiados:
+            alterou_conta_principal = False
+        else:
+            original_id = getattr(self, '_conta_principal_original_id', None)
+            alterou_conta_principal = self.conta_principal_id != original_id or not hasattr(self, '_conta_principal_original_id')
+        
+        if not novo:
+            # nivel e raiz só são gravados por quem os recalcula (abaixo, com
+            # update()); conta_principal só quando esta instância a alterou.
+            # Assim uma instância carregada antes de um ancestral mudar de
+            # lugar não desfaz o rebase nem a mudança feita por outro save.
+            if update_fields is None:
+                update_fields = [
+                    campo.name for campo in self._meta.concrete_fields
+                    if not campo.primary_key and campo.attname not in adiados
+                ]
+            omitidos = {'nivel', 'raiz'} if alterou_conta_principal else {'nivel', 'raiz', 'conta_principal'}
+            update_fields = {campo for campo in update_fields if campo not in omitidos}
+            kwargs['update_fields'] = update_fields
+        
+        with transaction.atomic():
+            mudou_conta_principal = False
+            if not novo and 'conta_principal' in update_fields:
+                # Posição atual vem do banco, não da instância (que pode estar desatualizada)
+                banco = Usuario.objects.select_for_update().filter(pk=self.pk).values_list('conta_principal_id', 'nivel').first()
+                if banco is not None:
+                    conta_principal_banco, nivel_anterior = banco
+                    mudou_conta_principal = self.conta_principal_id != conta_principal_banco
+            
+            if novo or mudou_conta_principal:
+                self.nivel, self.raiz_id = self._posicao_na_hierarquia()
+            
+            super().save(*args, **kwargs)
+            
+            if novo and self.raiz_id is None:
+                # Conta raiz: ela mesma é a raiz do seu grupo
+                self.raiz_id = self.pk
+                Usuario.objects.filter(pk=self.pk).update(raiz=self.pk)
+            
+            # Mantém o índice de hierarquia sincronizado
+            backend = hierarquia.get_backend()
+            if novo:
+                backend.no_criado(self)
+            elif mudou_conta_principal:
+                backend.no_movido(self)
+                # Rebaseia o próprio usuário e a subárvore movida de uma vez
+                subarvore = backend.subarvore_ids(self)
+                Usuario.objects.filter(Q(pk=self.pk) | Q(id__in=subarvore)).update(
+                    nivel=models.F('nivel') + (self.nivel - nivel_anterior),
+                    raiz=self.raiz_id,
+                )
+                # update() não dispara post_save: a subárvore sai do cache do usuário logado
+                from .autenticacao import invalidar_cache_usuarios
+                descendentes = Usuario.objects.filter(id__in=subarvore).values_list('id', flat=True)
+                transaction.on_commit(lambda: invalidar_cache_usuarios(descendentes))
+        
+        if 'conta_principal_id' not in adiados:
+            self._conta_principal_original_id = self.conta_principal_id
+    
+    def _posicao_na_hierarquia(self):
+        """Calcula (nivel, raiz) a partir da conta principal"""
+        if not self.conta_principal_id:
+            return 0, self.pk
+        nivel_pai, raiz_pai = Usuario.objects.filter(
+            pk=self.conta_principal_id
+        ).values_list('nivel', 'raiz_id').get()
+        return nivel_pai + 1, raiz_pai or self.conta_principal_id
     
     def verificar_senha(self, senha_plana):
-        """Verifica se a senha está correta"""
-        return check_password(senha_plana, self.senha)
+        """Verifica se a senha está correta, refazendo o hash se o perfil mudou"""
+        if not hashing.verificar_hash(senha_plana, self.senha):
+            return False
+        if hashing.precisa_rehash(self.senha):
+            self.senha = hashing.gerar_hash(senha_plana)
+            self.save(update_fields=['senha'])
+        return True
+    
+    async def averificar_senha(self, senha_plana):
+        """Verifica a senha sem bloquear o event loop (ASGI)"""
+        if not await hashing.averificar_hash(senha_plana, self.senha):
+            return False
+        if hashing.precisa_rehash(self.senha):
+            self.senha = await hashing.agerar_hash(senha_plana)
+            await self.asave(update_fields=['senha'])
+        return True
     
     def pode_criar_subcontas(self):
         """Verifica se o usuário pode criar subcontas"""
@@ -58,20 +163,35 @@ class Usuario(models.Model):
     
     def get_todas_subcontas(self):
         """Retorna todas as subcontas (recursivo)"""
-        subcontas = self.get_subcontas()
-        for subconta in subcontas:
-            subcontas = subcontas.union(subconta.get_todas_subcontas())
-        return subcontas
+        return hierarquia.get_backend().subcontas(self)
     
     def get_hierarquia_completa(self):
         """Retorna a hierarquia completa do usuário"""
-        if self.conta_principal:
-            return self.conta_principal.get_hierarquia_completa() + [self]
-        return [self]
+        return hierarquia.get_backend().ancestrais(self)
+    
+    def e_subconta_de(self, outro):
+        """Verifica se o usuário está abaixo de outro na hierarquia"""
+        return hierarquia.get_backend().e_descendente(self, outro)
     
     @property
     def nivel_hierarquia(self):
         """Retorna o nível na hierarquia (0 = raiz)"""
-        if self.conta_principal:
-            return self.conta_principal.nivel_hierarquia + 1
-        return 0
\ No newline at end of file
+        return self.nivel
+
+
+class HierarquiaUsuario(models.Model):
+    """
+    Tabela de fechamento da hierarquia de usuários
+    """
+    
+    ancestral = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='hierarquia_descendentes')
+    descendente = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='hierarquia_ancestrais')
+    profundidade = models.PositiveIntegerField()
+    
+    class Meta:
+        verbose_name = 'Hierarquia de Usuário'
+        verbose_name_plural = 'Hierarquia de Usuários'
+        unique_together = ['ancestral', 'descendente']
+    
+    def __str__(self):
+        return f"{self.ancestral_id} -> {self.descendente_id} ({self.profundidade})"
@@ -0,0 +1,180 @@
+"""
+Paginação por cursor (keyset)
+
+Em vez de OFFSET, cada página parte da chave de ordenação da última linha
+vista, ex.: (data_criacao, id) < (cursor). Com um índice na mesma ordem,
+a página 1000 custa o mesmo que a primeira.
+
+O cursor é opaco para o cliente: JSON com os valores da chave e a direção,
+codificado em base64 url-safe.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db.models import F, Q
+
+ORDENACAO_PADRAO = ('-data_criacao', '-id')
+
+
+class CursorInvalido(ValueError):
+    """Cursor ou limite malformado na query string"""
+
+
+def _serializar(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def codificar_cursor(valores, direcao):
+    dados = json.dumps({'v': [_serializar(valor) for valor in valores], 'd': direcao})
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, model, campos):
+    """Retorna (valores, direcao) já convertidos para os tipos dos campos"""
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        valores, direcao = dados['v'], dados['d']
+        if direcao not in ('n', 'p') or len(valores) != len(campos):
+            raise ValueError
+        return [
+            None if valor is None else model._meta.get_field(campo).to_python(valor)
+            for campo, valor in zip(campos, valores)
+        ], direcao
+    except Exception:
+        raise CursorInvalido('Cursor inválido')
+
+
+def _valor(item, campo):
+    # Aceita instâncias de modelo e dicionários de .values()
+    if isinstance(item, dict):
+        return item[campo]
+    return getattr(item, campo)
+
+
+def filtro_keyset(ordenacao, valores, para_frente=True, anulaveis=()):
+    """
+    Q com as linhas depois (ou antes) da chave dada na ordenação dada:
+    (a > x) OR (a = x AND b > y) OR ...
+    Nulos dos campos em anulaveis ficam sempre no fim da ordenação.
+    """
+    filtro = Q(pk__in=[])
+    iguais = Q()
+    for campo, valor in zip(ordenacao, valores):
+        descendente = campo.startswith('-')
+        nome = campo.lstrip('-')
+        operador = 'lt' if descendente == para_frente else 'gt'
+        if valor is None:
+            # Depois de um nulo só há outros nulos; antes dele, todos os não nulos
+            if not para_frente:
+                filtro |= iguais & Q(**{f'{nome}__isnull': False})
+            iguais &= Q(**{f'{nome}__isnull': True})
+            continue
+        depois = Q(**{f'{nome}__{operador}': valor})
+        if para_frente and nome in anulaveis:
+            depois |= Q(**{f'{nome}__isnull': True})
+        filtro |= iguais & depois
+        iguais &= Q(**{nome: valor})
+    return filtro
+
+
+def campos_anulaveis(modelo, ordenacao):
+    """Campos da ordenação que aceitam nulo no modelo"""
+    return {campo.lstrip('-') for campo in ordenacao if modelo._meta.get_field(campo.lstrip('-')).null}
+
+
+def expressoes_ordenacao(ordenacao, para_frente=True, anulaveis=()):
+    """
+    order_by com nulos dos campos em anulaveis no fim (ou no início, ao
+    percorrer para trás). Os demais campos ficam sem NULLS FIRST/LAST, que
+    impediria o PostgreSQL de usar os índices btree da ordenação.
+    """
+    expressoes = []
+    for campo in ordenacao:
+        descendente = campo.startswith('-') == para_frente
+        nome = campo.lstrip('-')
+        expressao = F(nome)
+        if nome not in anulaveis:
+            expressoes.append(expressao.desc() if descendente else expressao.asc())
+        elif para_frente:
+            expressoes.append(expressao.desc(nulls_last=True) if descendente else expressao.asc(nulls_last=True))
+        else:
+            expressoes.append(expressao.desc(nulls_first=True) if descendente else expressao.asc(nulls_first=True))
+    return expressoes
+
+
+class PaginaCursor:
+    """
+    Uma página de resultados e os cursores vizinhos
+    """
+
+    def __init__(self, itens, ordenacao, proximo, anterior):
+        self.itens = itens
+        self.ordenacao = ordenacao
+        self._proximo = proximo
+        self._anterior = anterior
+
+    def _cursor(self, item, direcao):
+        campos = [campo.lstrip('-') for campo in self.ordenacao]
+        return codificar_cursor([_valor(item, campo) for campo in campos], direcao)
+
+    @property
+    def proximo(self):
+        return self._cursor(self.itens[-1], 'n') if self._proximo and self.itens else None
+
+    @property
+    def anterior(self):
+        return self._cursor(self.itens[0], 'p') if self._anterior and self.itens else None
+
+    def envelope(self, resultados):
+        """Corpo da resposta paginada"""
+        return {
+            'resultados': resultados,
+            'proximo': self.proximo,
+            'anterior': self.anterior,
+        }
+
+
+def ler_limite(request):
+    try:
+        limite = int(request.GET.get('limit', settings.API_PAGINA_PADRAO))
+    except ValueError:
+        raise CursorInvalido('limit deve ser um número inteiro')
+    if limite < 1:
+        raise CursorInvalido('limit deve ser maior que zero')
+    return min(limite, settings.API_PAGINA_MAXIMA)
+
+
+def paginar_por_cursor(request, queryset, ordenacao=ORDENACAO_PADRAO):
+    """
+    Pagina o queryset se a requisição pedir (?limit= ou ?cursor=).
+    Retorna None quando a paginação não foi pedida.
+    """
+    if 'limit' not in request.GET and 'cursor' not in request.GET:
+        return None
+
+    limite = ler_limite(request)
+    campos = [campo.lstrip('-') for campo in ordenacao]
+    cursor = request.GET.get('cursor')
+    anulaveis = campos_anulaveis(queryset.model, ordenacao)
+
+    if cursor:
+        valores, direcao = decodificar_cursor(cursor, queryset.model, campos)
+        para_frente = direcao == 'n'
+        queryset = queryset.filter(filtro_keyset(ordenacao, valores, para_frente, anulaveis))
+    else:
+        para_frente = True
+
+    ordem = expressoes_ordenacao(ordenacao, para_frente, anulaveis)
+    itens = list(queryset.order_by(*ordem)[:limite + 1])
+    tem_mais = len(itens) > limite
+    itens = itens[:limite]
+
+    if para_frente:
+        return PaginaCursor(itens, ordenacao, proximo=tem_mais, anterior=bool(cursor))
+    itens.reverse()
+    return PaginaCursor(itens, ordenacao, proximo=True, anterior=tem_mais)
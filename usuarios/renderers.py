@@ -0,0 +1,39 @@
+"""
+Renderer JSON da API
+
+Usa orjson quando instalado (serialização em C, várias vezes mais rápida
+que json.dumps) e o JSONRenderer do DRF caso contrário. A saída é a mesma
+do DRF: compacta, UTF-8 e datas em ISO 8601 com 'Z' para UTC.
+"""
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+
+class JSONRapidoRenderer(JSONRenderer):
+    """
+    JSONRenderer com orjson. Indentação (?format=json; indent=N), saída
+    ASCII e tipos que o orjson não conhece caem no encoder do DRF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data,
+            default=self.encoder_class().default,
+            option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS,
+        )
+        # Mesmo escape de \u2028/\u2029 do DRF (JSON como subconjunto de JavaScript)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,26 @@
+"""
+Serialização de usuários (ver campos.py)
+"""
+
+from .campos import CamposResposta, arquivo, coluna, exibicao
+from .models import Usuario
+
+# Campos de um usuário, aceitos em ?fields=
+CAMPOS_USUARIO = CamposResposta({
+    'id': coluna('id'),
+    'nome': coluna('nome'),
+    'email': coluna('email'),
+    'tipo': coluna('tipo'),
+    'tipo_display': exibicao('tipo', Usuario.TIPO_CHOICES),
+    'foto': arquivo('foto', Usuario._meta.get_field('foto')),
+    'conta_principal': coluna('conta_principal__nome'),
+    'criado_por': coluna('criado_por__nome'),
+    'data_criacao': coluna('data_criacao'),
+    'nivel_hierarquia': coluna('nivel'),
+})
+
+# Subconjuntos usados nas respostas de um único usuário
+CAMPOS_PERFIL = ['id', 'nome', 'email', 'foto']
+CAMPOS_LOGIN = ['id', 'nome', 'email', 'tipo', 'tipo_display']
+CAMPOS_CRIACAO = ['id', 'nome', 'email', 'tipo', 'tipo_display', 'foto', 'conta_principal']
+CAMPOS_SUBCONTA = ['id', 'nome', 'email', 'tipo', 'tipo_display', 'foto', 'data_criacao', 'nivel_hierarquia']
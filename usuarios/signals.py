@@ -0,0 +1,16 @@
+"""
+Sinais do app usuarios
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .autenticacao import invalidar_cache_usuario
+from .models import Usuario
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_usuario_logado(sender, instance, **kwargs):
+    """Descarta o usuário do cache de autenticação quando ele muda"""
+    invalidar_cache_usuario(instance.pk)
@@ -1,12 +1,21 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, AsyncClient, RequestFactory, override_settings
 from django.urls import reverse
 from django.contrib.auth.hashers import make_password, check_password
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.utils import timezone
-from .models import Usuario
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from .models import Usuario, HierarquiaUsuario
+from .autenticacao import get_usuario_logado
+from . import hashing, metricas, paginacao
+from .serializacao import CAMPOS_USUARIO
 from .forms import UsuarioForm, LoginForm, AlterarSenhaForm, CriarAdminInicialForm
 import json
 import os
+import threading
 
 
 class UsuarioModelTest(TestCase):
@@ -114,6 +123,13 @@ class UsuarioModelTest(TestCase):
         self.assertEqual(self.gerente.nivel_hierarquia, 1)
         self.assertEqual(self.usuario.nivel_hierarquia, 2)
 
+    def test_e_subconta_de(self):
+        """Testa verificação de posição na hierarquia"""
+        self.assertTrue(self.usuario.e_subconta_de(self.admin))
+        self.assertTrue(self.usuario.e_subconta_de(self.gerente))
+        self.assertFalse(self.admin.e_subconta_de(self.usuario))
+        self.assertFalse(self.admin.e_subconta_de(self.admin))
+
     def test_str_representation(self):
         """Testa representação string do modelo"""
         self.assertEqual(str(self.admin), "Admin Teste (Administrador)")
@@ -179,6 +195,7 @@ class UsuarioFormTest(TestCase):
         self.assertIn('__all__', form.errors)
 
 
+@override_settings(QUERY_INSPECTOR_MODE='raise')
 class APITest(TestCase):
     """Testes para as APIs"""
     
@@ -483,6 +500,7 @@ class ViewTest(TestCase):
         self.assertTrue(self.admin.verificar_senha('NovaSenha123!'))
 
 
+@override_settings(QUERY_INSPECTOR_MODE='raise')
 class IntegrationTest(TestCase):
     """Testes de integração para fluxos completos"""
     
@@ -636,6 +654,7 @@ class IntegrationTest(TestCase):
             self.assertFalse(data['valida'], f"Senha '{senha}' deveria ser inválida")
 
 
+@override_settings(QUERY_INSPECTOR_MODE='raise')
 class PerformanceTest(TestCase):
     """Testes de performance para grandes volumes de dados"""
     
@@ -708,3 +727,1030 @@ class PerformanceTest(TestCase):
         # Verificar se admin consegue ver todos
         todas_subcontas = admin.get_todas_subcontas()
         self.assertEqual(todas_subcontas.count(), 11)  # 10 gerentes + 1 usuário
+
+    def test_plano_subcontas_usa_indice(self):
+        """get_subcontas lê o índice parcial já na ordem, sem ordenar em memória"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Verificação de plano específica do SQLite')
+        admin = Usuario.objects.create(nome="Admin Plano", email="admin@plano.com", senha="Admin123!", tipo="admin")
+        plano = admin.get_subcontas().explain()
+        self.assertIn('usuarios_principal_ativo_idx', plano, plano)
+        self.assertNotIn('TEMP B-TREE', plano, plano)
+
+
+class HierarquiaUsuarioTest(TestCase):
+    """Testes para o índice de hierarquia (tabela de fechamento)"""
+    
+    def setUp(self):
+        """Cria a árvore admin -> gerente -> usuario e um segundo admin"""
+        self.admin = Usuario.objects.create(
+            nome="Admin Hierarquia",
+            email="admin@fechamento.com",
+            senha="Admin123!",
+            tipo="admin"
+        )
+        self.outro_admin = Usuario.objects.create(
+            nome="Outro Admin",
+            email="outro@fechamento.com",
+            senha="Admin123!",
+            tipo="admin"
+        )
+        self.gerente = Usuario.objects.create(
+            nome="Gerente Hierarquia",
+            email="gerente@fechamento.com",
+            senha="Gerente123!",
+            tipo="gerente",
+            conta_principal=self.admin
+        )
+        self.usuario = Usuario.objects.create(
+            nome="Usuário Hierarquia",
+            email="usuario@fechamento.com",
+            senha="Usuario123!",
+            tipo="usuario",
+            conta_principal=self.gerente
+        )
+
+    def _linhas(self):
+        return set(HierarquiaUsuario.objects.values_list('ancestral_id', 'descendente_id', 'profundidade'))
+
+    def test_consultas_em_uma_query(self):
+        """Subárvore, ancestrais e nível usam uma única consulta"""
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(self.admin.get_todas_subcontas())), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.usuario.get_hierarquia_completa()), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.usuario.nivel_hierarquia, 2)
+
+    def test_mover_subarvore(self):
+        """Mudar a conta principal move a subárvore inteira"""
+        self.gerente.conta_principal = self.outro_admin
+        self.gerente.save()
+        
+        self.assertTrue(self.usuario.e_subconta_de(self.outro_admin))
+        self.assertFalse(self.usuario.e_subconta_de(self.admin))
+        self.assertEqual(self.admin.get_todas_subcontas().count(), 0)
+        self.assertEqual(self.outro_admin.get_todas_subcontas().count(), 2)
+
+    def test_save_desatualizado_nao_desfaz_rebase(self):
+        """Instância carregada antes de um ancestral mudar não volta nivel/raiz"""
+        desatualizado = Usuario.objects.get(pk=self.usuario.pk)
+        self.gerente.conta_principal = self.outro_admin
+        self.gerente.save()
+        
+        desatualizado.nome = "Renomeado"
+        desatualizado.save()
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.nome, "Renomeado")
+        self.assertEqual((self.usuario.nivel, self.usuario.raiz_id), (2, self.outro_admin.id))
+        
+        # A raiz antiga não leva o usuário junto ao ser apagada
+        self.admin.delete()
+        self.assertTrue(Usuario.objects.filter(pk=self.usuario.pk).exists())
+        self.assertTrue(self.usuario.e_subconta_de(self.outro_admin))
+    
+    def test_save_desatualizado_nao_desfaz_mudanca(self):
+        """Quem não alterou conta_principal não a grava de volta"""
+        desatualizado = Usuario.objects.get(pk=self.gerente.pk)
+        self.gerente.conta_principal = self.outro_admin
+        self.gerente.save()
+        
+        desatualizado.nome = "Outro nome"
+        desatualizado.save()
+        self.gerente.refresh_from_db()
+        self.assertEqual(self.gerente.conta_principal_id, self.outro_admin.id)
+        self.assertTrue(self.usuario.e_subconta_de(self.outro_admin))
+    
+    def test_save_de_instancia_parcial(self):
+        """Instâncias de .only()/.defer() gravam só os campos carregados, sem consultas extras"""
+        parcial = Usuario.objects.only('id', 'nome').get(pk=self.usuario.pk)
+        Usuario.objects.filter(pk=self.usuario.pk).update(email="novo@fechamento.com", ativo=False)
+        
+        parcial.nome = "Só o nome"
+        with CaptureQueriesContext(connection) as consultas:
+            parcial.save()
+        leituras = [
+            q['sql'] for q in consultas.captured_queries
+            if q['sql'].startswith('SELECT') and 'FROM "usuarios_usuario"' in q['sql']
+        ]
+        self.assertEqual(leituras, [])
+        
+        self.usuario.refresh_from_db()
+        self.assertEqual(
+            (self.usuario.nome, self.usuario.email, self.usuario.ativo, self.usuario.conta_principal_id),
+            ("Só o nome", "novo@fechamento.com", False, self.gerente.id),
+        )
+        self.assertTrue(self.usuario.verificar_senha("Usuario123!"))
+        
+        # Sem update_fields e com conta_principal carregada, a mudança ainda rebaseia
+        adiado = Usuario.objects.defer('senha', 'foto').get(pk=self.gerente.pk)
+        adiado.conta_principal = self.outro_admin
+        adiado.save()
+        self.assertTrue(self.usuario.e_subconta_de(self.outro_admin))
+    
+    def test_delta_do_rebase_vem_do_banco(self):
+        """Mover uma instância desatualizada usa o nível atual do banco"""
+        folha = Usuario.objects.create(nome="Folha", email="folha@fechamento.com", senha="Folha123!", conta_principal=self.usuario)
+        desatualizado = Usuario.objects.get(pk=self.usuario.pk)
+        self.gerente.conta_principal = None
+        self.gerente.save()
+        
+        desatualizado.conta_principal = self.outro_admin
+        desatualizado.save()
+        folha.refresh_from_db()
+        self.assertEqual((folha.nivel, folha.raiz_id), (2, self.outro_admin.id))
+        self.assertEqual(len(folha.get_hierarquia_completa()), 3)
+    
+    def test_nivel_e_raiz_persistidos(self):
+        """Nível e raiz são gravados na criação e rebaseados ao mover"""
+        self.assertEqual((self.admin.nivel, self.admin.raiz_id), (0, self.admin.id))
+        self.assertEqual((self.usuario.nivel, self.usuario.raiz_id), (2, self.admin.id))
+        
+        # Move o gerente para baixo do usuário de outro grupo
+        folha = Usuario.objects.create(
+            nome="Folha",
+            email="folha@fechamento.com",
+            senha="Folha123!",
+            conta_principal=self.outro_admin
+        )
+        self.gerente.conta_principal = folha
+        self.gerente.save()
+        
+        self.usuario.refresh_from_db()
+        self.assertEqual((self.gerente.nivel, self.gerente.raiz_id), (2, self.outro_admin.id))
+        self.assertEqual((self.usuario.nivel, self.usuario.raiz_id), (3, self.outro_admin.id))
+        
+        # Promove o gerente a raiz
+        self.gerente.conta_principal = None
+        self.gerente.save()
+        
+        self.usuario.refresh_from_db()
+        self.assertEqual((self.gerente.nivel, self.gerente.raiz_id), (0, self.gerente.id))
+        self.assertEqual((self.usuario.nivel, self.usuario.raiz_id), (1, self.gerente.id))
+
+    def test_ciclo_rejeitado(self):
+        """Uma conta não pode ficar abaixo das próprias subcontas"""
+        self.gerente.conta_principal = self.usuario
+        with self.assertRaises(ValidationError):
+            self.gerente.save()
+
+    def test_subconta_inativa_oculta_descendentes(self):
+        """Descendentes de subconta inativa não aparecem na subárvore"""
+        self.gerente.ativo = False
+        self.gerente.save()
+        self.assertEqual(self.admin.get_todas_subcontas().count(), 0)
+
+    def test_exclusao_remove_linhas(self):
+        """Excluir um usuário remove suas linhas do índice"""
+        self.gerente.delete()
+        self.assertFalse(HierarquiaUsuario.objects.filter(descendente_id=self.usuario.id).exists())
+        self.assertEqual(self.admin.get_todas_subcontas().count(), 0)
+
+    def test_comando_reconstruir_hierarquia(self):
+        """O comando de backfill recria o índice a partir de conta_principal"""
+        esperado = self._linhas()
+        HierarquiaUsuario.objects.all().delete()
+        Usuario.objects.update(nivel=0, raiz=None)
+        
+        call_command('reconstruir_hierarquia', stdout=open(os.devnull, 'w'))
+        
+        self.assertEqual(self._linhas(), esperado)
+        self.usuario.refresh_from_db()
+        self.assertEqual((self.usuario.nivel, self.usuario.raiz_id), (2, self.admin.id))
+
+
+@override_settings(HIERARQUIA_BACKEND='cte')
+class HierarquiaCTETest(HierarquiaUsuarioTest):
+    """Os mesmos cenários usando o backend WITH RECURSIVE"""
+    
+    def test_subcontas_e_queryset(self):
+        """O resultado continua filtrável e paginável"""
+        subcontas = self.admin.get_todas_subcontas()
+        self.assertEqual(subcontas.filter(tipo='usuario').count(), 1)
+        self.assertEqual(list(subcontas.order_by('id')[:1]), [self.gerente])
+
+    def test_exclusao_remove_linhas(self):
+        """Excluir um usuário remove sua subárvore das consultas"""
+        self.gerente.delete()
+        self.assertEqual(self.admin.get_todas_subcontas().count(), 0)
+
+    def test_comando_reconstruir_hierarquia(self):
+        """O backend CTE não depende da tabela de fechamento"""
+        HierarquiaUsuario.objects.all().delete()
+        self.assertEqual(self.admin.get_todas_subcontas().count(), 2)
+        self.assertEqual(self.usuario.nivel_hierarquia, 2)
+        self.assertTrue(self.usuario.e_subconta_de(self.admin))
+
+
+class ResolucaoUsuarioTest(TestCase):
+    """Testes para a resolução única do usuário logado"""
+    
+    def setUp(self):
+        cache.clear()
+        self.admin = Usuario.objects.create(
+            nome="Admin Resolução",
+            email="admin@resolucao.com",
+            senha="Admin123!",
+            tipo="admin"
+        )
+        Usuario.objects.create(
+            nome="Gerente Resolução",
+            email="gerente@resolucao.com",
+            senha="Gerente123!",
+            tipo="gerente",
+            conta_principal=self.admin
+        )
+        session = self.client.session
+        session['usuario_logado_id'] = self.admin.id
+        session.save()
+        self.endpoints = [
+            reverse('api_usuarios'),
+            reverse('api_subcontas'),
+            reverse('steam:streaming_list_create'),
+            reverse('steam:streaming_plataformas'),
+        ]
+
+    def _buscas_do_usuario(self, url):
+        """Conta as consultas que carregam o usuário logado pelo id"""
+        filtro = f'"usuarios_usuario"."id" = {self.admin.id}'
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return sum(
+            1 for query in contexto.captured_queries
+            if 'FROM "usuarios_usuario"' in query['sql'] and filtro in query['sql']
+        )
+
+    def test_uma_busca_por_requisicao(self):
+        """Cada endpoint carrega o usuário logado uma única vez"""
+        for url in self.endpoints:
+            self.assertEqual(self._buscas_do_usuario(url), 1, url)
+
+    @override_settings(USUARIO_CACHE_TTL=30)
+    def test_cache_entre_requisicoes(self):
+        """Com cache ativo, só a primeira requisição consulta o banco"""
+        self.assertEqual(self._buscas_do_usuario(self.endpoints[0]), 1)
+        for url in self.endpoints:
+            self.assertEqual(self._buscas_do_usuario(url), 0, url)
+
+    @override_settings(USUARIO_CACHE_TTL=30)
+    def test_cache_invalidado_ao_salvar(self):
+        """Desativar o usuário invalida o cache e encerra a sessão"""
+        self.client.get(self.endpoints[0])
+        
+        self.admin.ativo = False
+        self.admin.save()
+        
+        response = self.client.get(self.endpoints[0])
+        self.assertEqual(response.status_code, 401)
+
+
+    @override_settings(USUARIO_CACHE_TTL=30)
+    def test_cache_invalidado_ao_mover_ancestral(self):
+        """Mover a conta principal tira do cache a subárvore rebaseada com update()"""
+        gerente = Usuario.objects.get(email="gerente@resolucao.com")
+        subconta = Usuario.objects.create(
+            nome="Subconta Resolução", email="sub@resolucao.com", senha="Sub123!",
+            conta_principal=gerente,
+        )
+        session = self.client.session
+        session['usuario_logado_id'] = subconta.id
+        session.save()
+        self.client.get(self.endpoints[0])
+        
+        outro_admin = Usuario.objects.create(
+            nome="Outro Resolução", email="outro@resolucao.com", senha="Admin123!", tipo="admin"
+        )
+        gerente.conta_principal = outro_admin
+        with self.captureOnCommitCallbacks(execute=True):
+            gerente.save()
+        
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        self.assertEqual(get_usuario_logado(request).raiz_id, outro_admin.id)
+
+
+class ExecutorHashTest(TestCase):
+    """Testes para o executor de hash de senhas"""
+    
+    def setUp(self):
+        self.usuario = Usuario.objects.create(
+            nome="Usuário Hash",
+            email="usuario@hash.com",
+            senha="Usuario123!",
+            tipo="usuario"
+        )
+        self.addCleanup(hashing.reiniciar_executor)
+
+    def _login(self, url='api_login', client=None):
+        return (client or self.client).post(
+            reverse(url),
+            data=json.dumps({'email': 'usuario@hash.com', 'senha': 'Usuario123!'}),
+            content_type='application/json'
+        )
+
+    def test_login_usa_executor(self):
+        """O login verifica a senha no executor"""
+        hashing.reiniciar_executor()
+        response = self._login()
+        
+        self.assertEqual(response.status_code, 200)
+        metricas = hashing.metricas()
+        self.assertEqual(metricas['concluidas'], 1)
+        self.assertEqual(metricas['pendentes'], 0)
+
+    @override_settings(HASH_EXECUTOR_TRABALHADORES=1, HASH_EXECUTOR_MAX_PENDENTES=1, HASH_EXECUTOR_ESPERA=0)
+    def test_fila_cheia_retorna_503(self):
+        """Com todas as vagas ocupadas o login responde 503"""
+        hashing.reiniciar_executor()
+        liberar = threading.Event()
+        ocupada = hashing.get_executor().submeter(liberar.wait)
+        try:
+            response = self._login()
+        finally:
+            liberar.set()
+            ocupada.result()
+        
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(hashing.metricas()['rejeitadas'], 1)
+
+    @override_settings(HASH_EXECUTOR_TRABALHADORES=1, HASH_EXECUTOR_MAX_PENDENTES=1, HASH_EXECUTOR_ESPERA=0)
+    def test_fila_cheia_na_alteracao_de_senha(self):
+        """Alterar a senha com a fila cheia também responde 503, sem gravar"""
+        senha_antes = self.usuario.senha
+        sessao = self.client.session
+        sessao['usuario_logado_id'] = self.usuario.id
+        sessao.save()
+        hashing.reiniciar_executor()
+        liberar = threading.Event()
+        ocupada = hashing.get_executor().submeter(liberar.wait)
+        try:
+            response = self.client.post(
+                reverse('api_alterar_senha', args=[self.usuario.id]),
+                data=json.dumps({'senha': 'NovaSenha123!'}),
+                content_type='application/json'
+            )
+        finally:
+            liberar.set()
+            ocupada.result()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.senha, senha_antes)
+
+    def test_gerar_hashes_em_paralelo(self):
+        """Hashes em lote mantêm a ordem das senhas"""
+        senhas = ['Primeira1!', 'Segunda2@', 'Terceira3#']
+        hashes = hashing.gerar_hashes(senhas)
+        for senha, hash_senha in zip(senhas, hashes):
+            self.assertTrue(check_password(senha, hash_senha))
+
+    async def test_login_assincrono(self):
+        """A variante ASGI aguarda o executor e grava a sessão"""
+        response = await AsyncClient().post(
+            reverse('api_login_async'),
+            data=json.dumps({'email': 'usuario@hash.com', 'senha': 'Usuario123!'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], self.usuario.id)
+
+
+HASHERS_AJUSTADOS = [
+    'usuarios.hashers.PBKDF2Ajustado',
+    'usuarios.hashers.ScryptAjustado',
+    'usuarios.hashers.Argon2Ajustado',
+]
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_AJUSTADOS, PBKDF2_ITERACOES=1000, SCRYPT_WORK_FACTOR=2 ** 10)
+class PerfilHashTest(TestCase):
+    """Testes para o perfil de hash configurável e o rehash no login"""
+    
+    def setUp(self):
+        self.usuario = Usuario.objects.create(
+            nome="Usuário Perfil",
+            email="usuario@perfil.com",
+            senha="Usuario123!",
+            tipo="usuario"
+        )
+        self.addCleanup(hashing.reiniciar_executor)
+
+    def test_hash_usa_parametros_das_configuracoes(self):
+        """O hash gravado usa as iterações configuradas"""
+        self.assertTrue(self.usuario.senha.startswith('pbkdf2_sha256$1000$'))
+        self.assertFalse(hashing.precisa_rehash(self.usuario.senha))
+
+    def test_rehash_quando_iteracoes_mudam(self):
+        """Um login bem-sucedido refaz o hash com as novas iterações"""
+        with self.settings(PBKDF2_ITERACOES=2000):
+            self.assertTrue(self.usuario.verificar_senha('Usuario123!'))
+        
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.senha.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(self.usuario.verificar_senha('Usuario123!'))
+
+    def test_rehash_quando_perfil_muda(self):
+        """Trocar o perfil para scrypt migra a senha no próximo login"""
+        with self.settings(PASSWORD_HASHERS=[HASHERS_AJUSTADOS[1], HASHERS_AJUSTADOS[0]]):
+            self.assertTrue(self.usuario.verificar_senha('Usuario123!'))
+            self.usuario.refresh_from_db()
+            self.assertTrue(self.usuario.senha.startswith('scrypt$'))
+            self.assertTrue(self.usuario.verificar_senha('Usuario123!'))
+
+    def test_senha_errada_nao_refaz_hash(self):
+        """Uma tentativa inválida não altera o hash gravado"""
+        senha_antiga = self.usuario.senha
+        with self.settings(PBKDF2_ITERACOES=2000):
+            self.assertFalse(self.usuario.verificar_senha('Errada123!'))
+        
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.senha, senha_antiga)
+
+    def test_hash_de_outro_perfil_nao_e_refeito_no_save(self):
+        """Hashes scrypt são reconhecidos e não recebem um segundo hash"""
+        with self.settings(PASSWORD_HASHERS=[HASHERS_AJUSTADOS[1]]):
+            hash_scrypt = hashing.gerar_hash('Outra123!')
+        self.assertTrue(hashing.e_hash(hash_scrypt))
+        
+        self.usuario.senha = hash_scrypt
+        self.usuario.save()
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.senha, hash_scrypt)
+        self.assertFalse(hashing.e_hash('Usuario123!'))
+
+    def test_benchmark_hashers(self):
+        """O comando de benchmark mede e recomenda parâmetros"""
+        from io import StringIO
+        saida = StringIO()
+        call_command('benchmark_hashers', '--amostras', '2', '--perfis', 'pbkdf2', stdout=saida)
+        
+        self.assertIn('p99=', saida.getvalue())
+        self.assertIn('PBKDF2_ITERACOES=', saida.getvalue())
+
+    def test_benchmark_nao_recomenda_abaixo_do_minimo(self):
+        """Um alvo impossível recomenda o mínimo seguro e avisa"""
+        from io import StringIO
+        from django.contrib.auth.hashers import PBKDF2PasswordHasher
+        saida, erros = StringIO(), StringIO()
+        call_command(
+            'benchmark_hashers', '--amostras', '2', '--perfis', 'pbkdf2', '--alvo-p99-ms', '0.0001',
+            stdout=saida, stderr=erros,
+        )
+
+        self.assertIn(f'PBKDF2_ITERACOES={PBKDF2PasswordHasher.iterations}', saida.getvalue())
+        self.assertIn('mínimo seguro', erros.getvalue())
+
+
+@override_settings(API_RATE_LIMIT=3, API_RATE_LIMIT_PERIOD=60)
+class RateLimitTest(TestCase):
+    """Testes para o limite de requisições por janela deslizante"""
+    
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create(
+            nome="Usuário Limite",
+            email="usuario@limite.com",
+            senha="Usuario123!",
+            tipo="usuario"
+        )
+
+    def _validar_senha(self, client=None):
+        return (client or self.client).get(reverse('api_validar_senha'), {'senha': 'Teste123!'})
+
+    def test_cabecalhos_ratelimit(self):
+        """As respostas informam limite, restantes e reset"""
+        response = self._validar_senha()
+        
+        self.assertEqual(response['RateLimit-Limit'], '3')
+        self.assertEqual(response['RateLimit-Remaining'], '2')
+        self.assertLessEqual(int(response['RateLimit-Reset']), 60)
+
+    def test_excesso_retorna_429(self):
+        """Acima do limite a API responde 429 com Retry-After"""
+        for _ in range(3):
+            self.assertNotEqual(self._validar_senha().status_code, 429)
+        
+        response = self._validar_senha()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['RateLimit-Remaining'], '0')
+        self.assertIn('Retry-After', response)
+
+    def test_limite_nao_depende_do_cookie(self):
+        """Descartar a sessão não zera o contador de um mesmo IP"""
+        for _ in range(3):
+            self._validar_senha(Client())
+        
+        self.assertEqual(self._validar_senha(Client()).status_code, 429)
+
+    def test_classes_de_endpoint_separadas(self):
+        """Esgotar o limite de autenticação não bloqueia a leitura"""
+        sessao = self.client.session
+        sessao['usuario_logado_id'] = self.usuario.id
+        sessao.save()
+        for _ in range(4):
+            self._validar_senha()
+        
+        response = self.client.get(reverse('api_usuarios'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['RateLimit-Remaining'], '2')
+
+    def test_nao_grava_contadores_na_sessao(self):
+        """O limite não depende de escrita na sessão"""
+        self._validar_senha()
+        self.assertNotIn('request_count', self.client.session)
+
+
+class LogAcessoTest(TestCase):
+    """Testes para o log de acesso estruturado da API"""
+    
+    def setUp(self):
+        cache.clear()
+
+    def test_handler_grava_lote_json(self):
+        """O handler grava uma linha JSON por registro ao completar o lote"""
+        import io
+        import logging
+        from .logs import LoteJSONHandler
+        
+        saida = io.StringIO()
+        handler = LoteJSONHandler(tamanho_lote=2, intervalo=60, stream=saida)
+        self.addCleanup(handler.close)
+        logger = logging.getLogger('teste_lote')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        
+        logger.warning('primeiro', extra={'status': 200})
+        logger.warning('segundo', extra={'status': 404})
+        handler.flush()
+        
+        linhas = [json.loads(linha) for linha in saida.getvalue().splitlines()]
+        self.assertEqual([linha['mensagem'] for linha in linhas], ['primeiro', 'segundo'])
+        self.assertEqual(linhas[1]['status'], 404)
+
+    def test_handler_grava_por_tempo(self):
+        """Registros parados na fila são gravados após o intervalo"""
+        import io
+        import logging
+        import time
+        from .logs import LoteJSONHandler
+        
+        saida = io.StringIO()
+        handler = LoteJSONHandler(tamanho_lote=100, intervalo=0.05, stream=saida)
+        self.addCleanup(handler.close)
+        handler.emit(logging.makeLogRecord({'msg': 'sozinho', 'levelname': 'INFO'}))
+        
+        for _ in range(100):
+            if saida.getvalue():
+                break
+            time.sleep(0.01)
+        self.assertIn('sozinho', saida.getvalue())
+
+    def test_middleware_registra_campos(self):
+        """Cada requisição gera um registro com método, caminho, status e duração"""
+        with self.assertLogs('api_access', level='INFO') as logs:
+            self.client.get(reverse('api_validar_senha'), {'senha': 'Teste123!'})
+        
+        self.assertEqual(len(logs.records), 1)
+        registro = logs.records[0]
+        self.assertEqual(registro.metodo, 'GET')
+        self.assertEqual(registro.caminho, reverse('api_validar_senha'))
+        self.assertEqual(registro.status, 200)
+        self.assertIsNone(registro.usuario)
+        self.assertGreaterEqual(registro.duracao_ms, 0)
+
+    @override_settings(API_LOG_AMOSTRAGEM_2XX=0)
+    def test_amostragem_2xx(self):
+        """Com amostragem zero só respostas de erro são registradas"""
+        with self.assertLogs('api_access', level='INFO') as logs:
+            self.client.get(reverse('api_validar_senha'), {'senha': 'Teste123!'})
+            self.client.get(reverse('api_usuarios'))
+        
+        self.assertEqual([registro.status for registro in logs.records], [401])
+
+
+class MetricasTest(TestCase):
+    """Testes para as métricas de desempenho por view"""
+    
+    def setUp(self):
+        cache.clear()
+        metricas.registro.zerar()
+        Usuario.objects.create(
+            nome="Usuário Métricas",
+            email="usuario@metricas.com",
+            senha="Usuario123!",
+            tipo="usuario"
+        )
+
+    def _login(self):
+        return self.client.post(
+            reverse('api_login'),
+            data=json.dumps({'email': 'usuario@metricas.com', 'senha': 'Usuario123!'}),
+            content_type='application/json'
+        )
+
+    def test_exporta_metricas_por_view(self):
+        """Latência, requisições e consultas são agrupadas pelo nome da URL"""
+        self._login()
+        texto = self.client.get(reverse('metricas')).content.decode()
+        
+        self.assertIn('gerenciador_http_requisicoes_total{metodo="POST",status="200",view="api_login"} 1', texto)
+        self.assertIn('gerenciador_http_duracao_segundos_bucket{metodo="POST",view="api_login",le="+Inf"} 1', texto)
+        self.assertIn('# TYPE gerenciador_http_duracao_segundos histogram', texto)
+        linha_consultas = next(
+            linha for linha in texto.splitlines()
+            if linha.startswith('gerenciador_db_consultas_total{view="api_login"}')
+        )
+        self.assertGreater(float(linha_consultas.split()[-1]), 0)
+
+    def test_view_com_namespace(self):
+        """Views de apps com namespace usam o nome completo"""
+        self.client.get(reverse('steam:streaming_list_create'))
+        texto = self.client.get(reverse('metricas')).content.decode()
+        
+        self.assertIn('view="steam:streaming_list_create"', texto)
+
+    def test_acesso_restrito_por_ip(self):
+        """IPs fora da lista não enxergam o endpoint"""
+        response = Client(REMOTE_ADDR='10.0.0.5').get(reverse('metricas'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_agregacao_entre_processos(self):
+        """Instantâneos de outros workers são somados na exportação"""
+        import tempfile
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(__import__('shutil').rmtree, diretorio)
+        outro = {
+            'contadores': [['http_requisicoes_total', {'metodo': 'POST', 'status': 200, 'view': 'api_login'}, 4]],
+            'histogramas': [],
+            'medidores': {},
+        }
+        with open(os.path.join(diretorio, '1.json'), 'w') as arquivo:
+            json.dump(outro, arquivo)
+        
+        with self.settings(METRICAS_DIRETORIO=diretorio):
+            self._login()
+            texto = self.client.get(reverse('metricas')).content.decode()
+        
+        self.assertIn('gerenciador_http_requisicoes_total{metodo="POST",status="200",view="api_login"} 5', texto)
+        self.assertTrue(os.path.exists(metricas._arquivo_processo(diretorio)))
+
+    def test_medidores_so_de_processos_vivos(self):
+        """Workers encerrados mantêm os contadores, mas não os medidores"""
+        import tempfile
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(__import__('shutil').rmtree, diretorio)
+        encerrado = {
+            'contadores': [['cache_listagem_contas_total', {'resultado': 'acerto'}, 4]],
+            'histogramas': [],
+            'medidores': {'teste_pendentes': 7},
+        }
+        vivo = {'contadores': [], 'histogramas': [], 'medidores': {'teste_pendentes': 2}}
+        # Um pid que não existe (acima do pid_max do Linux) e o do processo pai
+        for pid, dados in ((2 ** 23, encerrado), (os.getppid(), vivo)):
+            with open(os.path.join(diretorio, f'{pid}.json'), 'w') as arquivo:
+                json.dump(dados, arquivo)
+
+        with self.settings(METRICAS_DIRETORIO=diretorio):
+            texto = self.client.get(reverse('metricas')).content.decode()
+
+        self.assertIn('gerenciador_cache_listagem_contas_total{resultado="acerto"} 4', texto)
+        self.assertIn('gerenciador_teste_pendentes 2\n', texto)
+        self.assertEqual([nome for nome in os.listdir(diretorio) if nome.endswith('.tmp')], [])
+    
+    def test_contadores_de_pid_reaproveitado(self):
+        """Um pid reaproveitado não herda o arquivo; os contadores dos encerrados vão para o total"""
+        if metricas._inicio_processo(os.getpid()) is None:
+            self.skipTest('Início do processo só é lido do /proc')
+        import tempfile
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(__import__('shutil').rmtree, diretorio)
+        # O processo pai está vivo, mas com outro início: o arquivo é de um worker encerrado
+        antigo = f'{os.getppid()}-1.json'
+        with open(os.path.join(diretorio, antigo), 'w') as arquivo:
+            json.dump({
+                'contadores': [['cache_listagem_contas_total', {'resultado': 'acerto'}, 4]],
+                'histogramas': [],
+                'medidores': {'teste_pendentes': 7},
+            }, arquivo)
+        
+        with self.settings(METRICAS_DIRETORIO=diretorio):
+            for _ in range(2):
+                texto = self.client.get(reverse('metricas')).content.decode()
+                self.assertIn('gerenciador_cache_listagem_contas_total{resultado="acerto"} 4', texto)
+                self.assertNotIn('teste_pendentes', texto)
+            self.assertFalse(os.path.exists(os.path.join(diretorio, antigo)))
+            
+            # Coleta interrompida depois de somar e antes de apagar: não soma de novo
+            with open(os.path.join(diretorio, metricas.ARQUIVO_ENCERRADOS)) as arquivo:
+                total = json.load(arquivo)
+            self.assertEqual(total['incorporados'], [antigo])
+            with open(os.path.join(diretorio, antigo), 'w') as arquivo:
+                json.dump({'contadores': [['cache_listagem_contas_total', {'resultado': 'acerto'}, 4]]}, arquivo)
+            texto = self.client.get(reverse('metricas')).content.decode()
+            self.assertIn('gerenciador_cache_listagem_contas_total{resultado="acerto"} 4', texto)
+            self.assertFalse(os.path.exists(os.path.join(diretorio, antigo)))
+
+
+@override_settings(QUERY_INSPECTOR_MODE='raise')
+class InspetorConsultasTest(TestCase):
+    """Testes para o detector de N+1 e os orçamentos de consultas"""
+    
+    def setUp(self):
+        cache.clear()
+        self.admin = Usuario.objects.create(
+            nome="Admin Consultas",
+            email="admin@consultas.com",
+            senha="Admin123!",
+            tipo="admin"
+        )
+        for i in range(4):
+            Usuario.objects.create(
+                nome=f"Sub {i}",
+                email=f"sub{i}@consultas.com",
+                senha="Sub123!@",
+                conta_principal=self.admin,
+                criado_por=self.admin
+            )
+        sessao = self.client.session
+        sessao['usuario_logado_id'] = self.admin.id
+        sessao.save()
+
+    def test_detecta_consultas_repetidas(self):
+        """Acessar uma FK por linha gera o mesmo formato de consulta várias vezes"""
+        from .consultas import RegistroConsultas
+        
+        registro = RegistroConsultas()
+        with connection.execute_wrapper(registro):
+            for usuario in Usuario.objects.filter(conta_principal=self.admin):
+                usuario.criado_por.nome
+        
+        repetidas = registro.repetidas(3)
+        self.assertEqual(len(repetidas), 1)
+        formato, quantidade, origem = repetidas[0]
+        self.assertEqual(quantidade, 4)
+        self.assertIn('test_detecta_consultas_repetidas', origem)
+
+    def test_listagem_dentro_do_orcamento(self):
+        """A listagem de usuários não cresce com o número de linhas"""
+        response = self.client.get(reverse('api_usuarios'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 5)
+
+    def test_orcamento_excedido(self):
+        """Uma view acima do orçamento declarado falha em modo raise"""
+        from unittest import mock
+        from . import api_views
+        from .consultas import ConsultasExcessivas
+        
+        with mock.patch.dict(api_views.usuario_list_create.orcamento_consultas, {'*': 1}):
+            with self.assertRaises(ConsultasExcessivas):
+                self.client.get(reverse('api_usuarios'))
+
+    @override_settings(QUERY_INSPECTOR_MODE='log')
+    def test_modo_log(self):
+        """Em modo log a violação vira aviso e a resposta segue normal"""
+        from unittest import mock
+        from . import api_views
+        
+        with mock.patch.dict(api_views.usuario_list_create.orcamento_consultas, {'*': 1}):
+            with self.assertLogs('consultas', level='WARNING') as logs:
+                response = self.client.get(reverse('api_usuarios'))
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Orçamento de 1 consultas excedido', logs.output[0])
+
+
+@override_settings(QUERY_INSPECTOR_MODE='raise')
+class PaginacaoCursorTest(TestCase):
+    """Testes para a paginação por cursor da listagem de usuários"""
+    
+    def setUp(self):
+        cache.clear()
+        self.admin = Usuario.objects.create(
+            nome="Admin Paginação",
+            email="admin@paginacao.com",
+            senha="Admin123!",
+            tipo="admin"
+        )
+        for i in range(6):
+            Usuario.objects.create(
+                nome=f"Sub {i}",
+                email=f"sub{i}@paginacao.com",
+                senha="Sub123!@",
+                conta_principal=self.admin,
+                criado_por=self.admin
+            )
+        # Empates em data_criacao são desfeitos pelo id
+        Usuario.objects.filter(email__in=['sub2@paginacao.com', 'sub3@paginacao.com']).update(
+            data_criacao=Usuario.objects.get(email='sub1@paginacao.com').data_criacao
+        )
+        self.esperado = list(Usuario.objects.order_by('-data_criacao', '-id').values_list('id', flat=True))
+        sessao = self.client.session
+        sessao['usuario_logado_id'] = self.admin.id
+        sessao.save()
+
+    def _pagina(self, **params):
+        response = self.client.get(reverse('api_usuarios'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_sem_parametros_mantem_lista(self):
+        """Sem limit/cursor a resposta continua sendo a lista completa"""
+        self.assertEqual(len(self._pagina()), 7)
+
+    def test_percorre_paginas_para_frente_e_para_tras(self):
+        """Os cursores percorrem todas as linhas sem repetir nem pular"""
+        ids = []
+        paginas = []
+        pagina = self._pagina(limit=3)
+        self.assertIsNone(pagina['anterior'])
+        while True:
+            paginas.append([usuario['id'] for usuario in pagina['resultados']])
+            ids.extend(paginas[-1])
+            if not pagina['proximo']:
+                break
+            pagina = self._pagina(limit=3, cursor=pagina['proximo'])
+        
+        self.assertEqual(ids, self.esperado)
+        self.assertEqual([len(p) for p in paginas], [3, 3, 1])
+        
+        # Voltando a partir da última página
+        anterior = self._pagina(limit=3, cursor=pagina['anterior'])
+        self.assertEqual([usuario['id'] for usuario in anterior['resultados']], paginas[1])
+        primeira = self._pagina(limit=3, cursor=anterior['anterior'])
+        self.assertEqual([usuario['id'] for usuario in primeira['resultados']], paginas[0])
+        self.assertIsNone(primeira['anterior'])
+
+    def test_consultas_constantes_em_paginas_profundas(self):
+        """A última página custa o mesmo número de consultas que a primeira"""
+        with CaptureQueriesContext(connection) as primeira:
+            pagina = self._pagina(limit=2)
+        while pagina['proximo']:
+            with CaptureQueriesContext(connection) as profunda:
+                pagina = self._pagina(limit=2, cursor=pagina['proximo'])
+        
+        self.assertEqual(len(profunda), len(primeira))
+        self.assertNotIn('OFFSET', profunda[-1]['sql'])
+        # data_criacao e id não aceitam nulo: ordenação simples, como o índice
+        self.assertNotIn('NULL', profunda[-1]['sql'].split('ORDER BY')[1])
+
+    def test_nulos_so_nos_campos_anulaveis(self):
+        ordenacao = ['-conta_principal', '-id']
+        anulaveis = paginacao.campos_anulaveis(Usuario, ordenacao)
+        self.assertEqual(anulaveis, {'conta_principal'})
+
+        sql = str(Usuario.objects.order_by(*paginacao.expressoes_ordenacao(ordenacao, anulaveis=anulaveis)).query)
+        ordem = sql.split('ORDER BY')[1]
+        self.assertIn('NULL', ordem.split(',')[0])
+        self.assertNotIn('NULL', ordem.split(',')[1])
+
+        # Percorrendo para trás os nulos vêm primeiro
+        sql = str(Usuario.objects.order_by(*paginacao.expressoes_ordenacao(ordenacao, False, anulaveis)).query)
+        self.assertIn('NULL', sql.split('ORDER BY')[1].split(',')[0])
+
+    def test_cursor_invalido(self):
+        """Cursor malformado responde 400"""
+        response = self.client.get(reverse('api_usuarios'), {'cursor': 'nao-e-um-cursor'})
+        self.assertEqual(response.status_code, 400)
+        
+        response = self.client.get(reverse('api_usuarios'), {'limit': 'muitos'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_fields_limita_colunas_e_relacoes(self):
+        """?fields= reduz o SELECT e as chaves, sem juntar conta_principal e criado_por"""
+        with CaptureQueriesContext(connection) as consultas:
+            pagina = self._pagina(fields='id,nome', limit=3)
+        self.assertEqual(set(pagina['resultados'][0]), {'id', 'nome'})
+        sql = consultas[-1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"email"', sql)
+        
+        # Os cursores continuam funcionando com a seleção de campos
+        ids = [usuario['id'] for usuario in pagina['resultados']]
+        pagina = self._pagina(fields='id,nome', limit=3, cursor=pagina['proximo'])
+        ids += [usuario['id'] for usuario in pagina['resultados']]
+        self.assertEqual(ids, self.esperado[:6])
+        
+        usuarios = self._pagina(fields='nome,criado_por')
+        self.assertIn('Admin Paginação', [usuario['criado_por'] for usuario in usuarios])
+
+    def test_fields_invalido(self):
+        response = self.client.get(reverse('api_usuarios'), {'fields': 'id,senha'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SerializacaoTest(TestCase):
+    """Testes para a serialização por .values() e o renderer JSON"""
+    
+    def test_linha_e_instancia_geram_o_mesmo_dicionario(self):
+        admin = Usuario.objects.create(nome="Admin", email="admin@serializacao.com", senha="Admin123!", tipo="admin")
+        sub = Usuario.objects.create(
+            nome="Sub", email="sub@serializacao.com", senha="Sub123!@",
+            conta_principal=admin, criado_por=admin, foto='fotos/sub.png'
+        )
+        linha = CAMPOS_USUARIO.valores(Usuario.objects.filter(pk=sub.pk), CAMPOS_USUARIO.todos).get()
+        dados = CAMPOS_USUARIO.serializar(linha)
+        
+        self.assertEqual(dados, CAMPOS_USUARIO.de_objeto(sub))
+        self.assertEqual(dados['tipo_display'], 'Usuário')
+        self.assertEqual(dados['conta_principal'], 'Admin')
+        self.assertEqual(dados['foto'], sub.foto.url)
+        self.assertIsNone(CAMPOS_USUARIO.de_objeto(admin)['conta_principal'])
+    
+    def _dados(self):
+        from datetime import date, datetime, timezone as tz
+        from decimal import Decimal
+        from django.utils.translation import gettext_lazy
+        return {
+            'data': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=tz.utc),
+            'dia': date(2024, 5, 1),
+            'valor': Decimal('1.50'),
+            'texto': 'ação\u2028fim\u2029',
+            'lazy': gettext_lazy('Usuário'),
+            'lista': [1, None, True, {'chave': 'valor'}],
+        }
+    
+    def test_renderer_igual_ao_drf(self):
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import JSONRapidoRenderer
+        
+        self.assertEqual(JSONRapidoRenderer().render(self._dados()), JSONRenderer().render(self._dados()))
+        self.assertEqual(JSONRapidoRenderer().render(None), b'')
+        self.assertEqual(
+            JSONRapidoRenderer().render([1], 'application/json; indent=2'),
+            JSONRenderer().render([1], 'application/json; indent=2'),
+        )
+    
+    def test_renderer_sem_orjson(self):
+        from unittest import mock
+        from rest_framework.renderers import JSONRenderer
+        from . import renderers
+        
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.JSONRapidoRenderer().render(self._dados()), JSONRenderer().render(self._dados()))
+
+
+@override_settings(API_STREAM_LOTE=100)
+class ListagemEmFluxoTest(TestCase):
+    """Testes para as listagens com ?stream=1"""
+    
+    def setUp(self):
+        self.admin = Usuario.objects.create(nome="Admin Fluxo", email="admin@fluxo.com", senha="Admin123!", tipo="admin")
+        sessao = self.client.session
+        sessao['usuario_logado_id'] = self.admin.id
+        sessao.save()
+    
+    def _criar(self, quantidade, inicio=0):
+        Usuario.objects.bulk_create([
+            Usuario(nome=f"Fluxo {i}", email=f"fluxo{i}@fluxo.com", senha="x", conta_principal=self.admin, nivel=1)
+            for i in range(inicio, inicio + quantidade)
+        ])
+    
+    def _consumir(self, response):
+        """Percorre a resposta pedaço a pedaço e retorna o maior pedaço"""
+        maior = 0
+        for pedaco in response.streaming_content:
+            maior = max(maior, len(pedaco))
+        return maior
+    
+    def test_mesmo_conteudo_da_lista(self):
+        self._criar(250)
+        response = self.client.get(reverse('api_usuarios'), {'stream': '1', 'fields': 'id,nome'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        em_fluxo = json.loads(b''.join(response.streaming_content))
+        
+        lista = self.client.get(reverse('api_usuarios'), {'fields': 'id,nome'}).json()
+        self.assertEqual(em_fluxo, lista)
+        self.assertEqual(len(em_fluxo), 251)
+    
+    def test_lista_vazia_e_paginacao(self):
+        Usuario.objects.filter(pk=self.admin.pk).update(tipo='usuario')
+        response = self.client.get(reverse('api_usuarios'), {'stream': '1'})
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+        
+        response = self.client.get(reverse('api_usuarios'), {'stream': '1', 'limit': 10})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_memoria_nao_cresce_com_o_resultado(self):
+        """Pedaços e pico de memória ficam no tamanho de um lote"""
+        import tracemalloc
+        
+        def medir():
+            response = self.client.get(reverse('api_usuarios'), {'stream': '1'})
+            tracemalloc.start()
+            maior = self._consumir(response)
+            pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return maior, pico
+        
+        self._criar(300)
+        maior_pequeno, pico_pequeno = medir()
+        self._criar(2700, inicio=300)
+        maior_grande, pico_grande = medir()
+        
+        self.assertLess(maior_grande, maior_pequeno * 1.5)
+        self.assertLess(pico_grande, pico_pequeno * 3)
@@ -2,6 +2,7 @@
 from django.urls import path
 from . import views
 from . import api_views
+from . import metricas
 
 urlpatterns = [
     # rotas de template (para interface web)
@@ -21,7 +22,11 @@ urlpatterns = [
     path("api/usuarios/<int:pk>/alterar-senha/", api_views.alterar_senha_api, name="api_alterar_senha"),
     path("api/validar-senha/", api_views.validar_senha_api, name="api_validar_senha"),
     path("api/login/", api_views.login_api, name="api_login"),
+    path("api/login/async/", api_views.login_api_async, name="api_login_async"),
     path("api/logout/", api_views.logout_api, name="api_logout"),
     path("api/subcontas/", api_views.subcontas_api, name="api_subcontas"),
     path("api/criar-admin-inicial/", api_views.criar_admin_inicial_api, name="api_criar_admin_inicial"),
+    
+    # métricas internas (Prometheus)
+    path("metrics/", metricas.metricas_view, name="metricas"),
 ]
@@ -3,7 +3,7 @@ from .models import Usuario
 from .forms import UsuarioForm, LoginForm, AlterarSenhaForm, CriarAdminInicialForm, FiltroUsuarioForm
 from django.core.exceptions import ValidationError
 from django.contrib import messages
-from django.contrib.auth.hashers import make_password
+from .hashing import FilaHashCheia
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
@@ -94,7 +94,16 @@ def create(requests):
             conta_principal=usuario_logado,
             criado_por=usuario_logado
         )
-        usuario.save()
+        try:
+            usuario.save()
+        except FilaHashCheia:
+            return render(requests, 'create.html', {
+                'Usuarios': usuario_logado.get_todas_subcontas(),
+                'erros': ['Servidor ocupado. Tente novamente em instantes.'],
+                'val_nome': nome,
+                'val_email': email,
+                'usuario_logado': usuario_logado
+            })
         
         messages.success(requests, f'Usuário {nome} criado com sucesso!')
         return redirect('create')
@@ -118,7 +127,11 @@ def alterar_senha(request, id):
             return render(request, 'alterar_senha.html', {'usuario': usuario, 'erros': erros})
 
         usuario.senha = senha
-        usuario.save()
+        try:
+            usuario.save()
+        except FilaHashCheia:
+            erros = ['Servidor ocupado. Tente novamente em instantes.']
+            return render(request, 'alterar_senha.html', {'usuario': usuario, 'erros': erros})
         messages.success(request, 'Senha alterada com sucesso!')
         return redirect('create')
 
@@ -145,6 +158,8 @@ def login(request):
                     messages.error(request, 'Senha incorreta.')
             except Usuario.DoesNotExist:
                 messages.error(request, 'Usuário não encontrado.')
+            except FilaHashCheia:
+                messages.error(request, 'Servidor ocupado. Tente novamente em instantes.')
         
         return render(request, 'login.html', {'form': form})
 
@@ -215,6 +230,10 @@ def criar_admin_inicial(request):
             
         except json.JSONDecodeError:
             return JsonResponse({'erro': 'JSON inválido'}, status=400)
+        except FilaHashCheia:
+            resposta = JsonResponse({'erro': 'Servidor ocupado, tente novamente em instantes'}, status=503)
+            resposta['Retry-After'] = '1'
+            return resposta
         except Exception as e:
             return JsonResponse({'erro': str(e)}, status=500)
     